@@ -9,9 +9,22 @@ const TASK_COUNT = 5;     // 每日任务固定 5
 const MAX_RECORDS = 3;
 let __syncingAll = false;
 
+// 学习者 id：页面地址中的 ?kid= 会记在本机（一台设备对应一个学习者），未设置时为服务端的默认学习者
+const LEARNER_KEY = 'ww4k.learner';
+const LEARNER_RE = /^[A-Za-z0-9_-]{1,64}$/;
+function resolveKidId(){
+  try{
+    const fromUrl = new URLSearchParams(location.search).get('kid');
+    if(fromUrl && LEARNER_RE.test(fromUrl)){ localStorage.setItem(LEARNER_KEY, fromUrl); return fromUrl; }
+    const stored = localStorage.getItem(LEARNER_KEY);
+    if(stored && LEARNER_RE.test(stored)) return stored;
+  }catch{}
+  return 'default';
+}
+
 const state = {
   route: 'task',
-  kidId: 'kid1',
+  kidId: resolveKidId(),
   todayKey: formatDateKey(),
   allSearch: '',
   learnBatchIds: [],
@@ -22,6 +35,13 @@ const state = {
 const IMG_DIR_HANDLE_KEY = 'ww4k.imagesDirHandle';
 const CSV_FILE_HANDLE_KEY = 'ww4k.csvFileHandle';
 const REC_DIR_HANDLE_KEY = 'ww4k.recordsDirHandle';
+// 增量同步的起点，按学习者保存 { version, epoch }：version 作为 ?since= 参数，
+// epoch 是服务端数据的标识，变化（数据被替换/重置）时放弃 since 做全量同步
+const PROGRESS_SYNC_KEY = 'ww4k.progressSync';
+// 进度、上传、统计、导出请求都带上学习者 id，服务端按学习者分片存储，不同学生的写入互不等待
+function withLearner(url){
+  return `${url}${url.includes('?') ? '&' : '?'}learner=${encodeURIComponent(state.kidId)}`;
+}
 let imagesDirHandle = null;
 let csvFileHandle = null;
 let recordsDirHandle = null;
@@ -130,6 +150,8 @@ async function init(){
       if(confirm('确认清空本地缓存并重置所有进度吗？此操作不可恢复。')){
         localStorage.clear();
         sessionStorage.clear();
+        // 保留本机对应的学习者，否则之后的进度会写到默认学习者
+        try{ if(state.kidId !== 'default') localStorage.setItem(LEARNER_KEY, state.kidId); }catch{}
         alert('已清理完成，页面将刷新。');
         location.reload();
       }
@@ -553,26 +575,22 @@ function renderWordModule(root, mode){
     submitBtn.disabled = true;
     let ok = true;
     try{
-      // 保障录音也同步：将本地该词的录音逐条上报并等待完成
+      // 录音与提交合并为一次批量请求：服务端按顺序应用，一次落盘
+      const kind = isLearn ? 'learn' : 'task';
       const recs = (branch3[word.id] || []).filter(Boolean);
-      await Promise.all(recs.map(r=>{
+      const mutations = [];
+      recs.forEach(r=>{
         const url = r.url || r.localUrl || '';
-        if(!url) return Promise.resolve();
-        return fetch('/api/progress/recording', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ day: state.todayKey, wordId: String(word.id), url, score: Number(r.score||0), ts: Number(r.ts||Date.now()), transcript: r.transcript||'', kind: isLearn ? 'learn' : 'task' })
-        }).then(res=> res.ok ? res.json().catch(()=>({ok:true})) : Promise.reject()).then(j=>{ if(!(j&&j.ok)) ok=false; }).catch(()=>{ ok=false; });
-      }));
-      // 上报提交
-      if(ok){
-        const resp = await fetch('/api/progress/submit-word', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ day: state.todayKey, wordId: String(word.id), ts: Date.now(), kind: isLearn ? 'learn' : 'task' })
-        });
-        ok = resp.ok && !!(await resp.json().catch(()=>({ok:false}))).ok;
-      }
+        if(!url) return;
+        mutations.push({ op: 'recording', day: state.todayKey, wordId: String(word.id), url, score: Number(r.score||0), ts: Number(r.ts||Date.now()), transcript: r.transcript||'', kind });
+      });
+      mutations.push({ op: 'submit-word', day: state.todayKey, wordId: String(word.id), ts: Date.now(), kind });
+      const resp = await fetch(withLearner('/api/progress/batch'), {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ mutations })
+      });
+      ok = resp.ok && !!(await resp.json().catch(()=>({ok:false}))).ok;
     }catch{ ok = false; }
     if(ok){
       submitWord('single', word.id, state.todayKey, isLearn ? 'learn' : 'task');
@@ -646,7 +664,7 @@ async function addRecordingUI(card, word, blob, score, transcript, localUrl=''){
   saveRecording(kidId, word.id, idx, { url, localUrl, score, ts: Date.now(), transcript, blobKey }, formatDateKey(), isLearn ? 'learn' : 'task');
   // 同步到服务器（追加一条）
   try{
-    await fetch('/api/progress/recording', {
+    await fetch(withLearner('/api/progress/recording'), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ day: formatDateKey(), wordId: String(word.id), url, score, ts: Date.now(), transcript, kind: isLearn ? 'learn' : 'task' })
@@ -678,14 +696,58 @@ async function addRecordingUI(card, word, blob, score, transcript, localUrl=''){
   document.dispatchEvent(new CustomEvent('ww4k:record-updated'));
 }
 
+// 小录音直接流式上传；大录音走断点续传，网络抖动时只重传失败的分块
+const STREAM_UPLOAD_MAX = 256 * 1024;
+async function uploadRecordingToServer(blob, word){
+  const wordName = word.en || String(word.id||'word');
+  if(blob.size <= STREAM_UPLOAD_MAX){
+    const resp = await fetch(withLearner(`/api/recordings/stream?word=${encodeURIComponent(wordName)}&ext=webm`), {
+      method: 'POST', headers: { 'Content-Type': blob.type || 'audio/webm' }, body: blob
+    });
+    const data = resp.ok ? await resp.json() : null;
+    return (data && data.ok && data.url) ? data.url : '';
+  }
+  const created = await (await fetch(withLearner('/api/recordings/uploads'), {
+    method: 'POST', headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ word: wordName, ext: 'webm', size: blob.size })
+  })).json();
+  if(!created || !created.ok) return '';
+  const id = created.uploadId;
+  const chunkSize = created.chunkSize || STREAM_UPLOAD_MAX;
+  let offset = 0;
+  let failures = 0;
+  while(offset < blob.size){
+    try{
+      const resp = await fetch(`/api/recordings/uploads/${id}?offset=${offset}`, {
+        method: 'PUT', body: blob.slice(offset, offset + chunkSize)
+      });
+      const j = await resp.json();
+      if(resp.ok && j.ok){ offset = j.offset; failures = 0; continue; }
+      if(resp.status === 409 && typeof j.offset === 'number'){ offset = j.offset; continue; }
+      throw new Error(j.error || 'upload_failed');
+    }catch(e){
+      if(++failures > 5) return '';
+      await new Promise(r=> setTimeout(r, 500 * failures));
+      // 以服务端实际收到的字节数为准继续
+      try{ const j = await (await fetch(`/api/recordings/uploads/${id}`)).json(); if(j && j.ok) offset = j.offset; }catch{}
+    }
+  }
+  const done = await (await fetch(`/api/recordings/uploads/${id}/complete`, { method: 'POST' })).json();
+  return (done && done.ok && done.url) ? done.url : '';
+}
+
 async function maybeSaveRecordingToLocalDir(blob, word){
   // 优先走后端保存，无需前端授权
+  try{
+    const url = await uploadRecordingToServer(blob, word);
+    if(url) return url;
+  }catch{}
   try{
     const form = new FormData();
     const ext = 'webm';
     form.append('audio', blob, `${(word.en||'record').toLowerCase()}.${ext}`);
     form.append('word', word.en || String(word.id||'word'));
-    const resp = await fetch('/api/recordings', { method: 'POST', body: form });
+    const resp = await fetch(withLearner('/api/recordings'), { method: 'POST', body: form });
     if(resp.ok){
       const data = await resp.json();
       if(data && data.ok && data.url){
@@ -935,29 +997,42 @@ async function renderProgress(root){
       <div class="page-subtitle">加载中…</div>
       <div class="card">请稍候</div>
     </section>`;
-  let serverDays = null;
+  const tab = state.progressKind === 'learn' ? 'learn' : 'task';
+  // 优先使用服务端增量维护的每日汇总（/api/stats），不必下载并遍历全部录音
+  let summaries = null;
   try{
-    const resp = await fetch('/api/progress', { cache: 'no-store' });
-    if(resp.ok){ const d = await resp.json(); if(d && d.ok) serverDays = d.days || {}; }
+    const resp = await fetch(withLearner(`/api/stats?kind=${tab}`), { cache: 'no-cache' });
+    if(resp.ok){ const d = await resp.json(); if(d && d.ok) summaries = d.days || []; }
   }catch{}
-  const useDays = serverDays || (getGlobal().days || {});
-  const tab = state.progressKind === 'learn' ? 'learn' : 'task';
+  if(!summaries){
+    let serverDays = null;
+    try{
+      const resp = await fetch(withLearner('/api/progress'), { cache: 'no-cache' });
+      if(resp.ok){ const d = await resp.json(); if(d && d.ok) serverDays = d.days || {}; }
+    }catch{}
+    const useDays = serverDays || (getGlobal().days || {});
+    summaries = Object.keys(useDays).sort().map(dayKey=>{
+      const d = (useDays[dayKey]||{})[tab] || {};
+      // 计算均分：遍历录音
+      const scores=[];
+      Object.values(d.recordings||{}).forEach(arr=>{ (arr||[]).forEach(r=>{ if(r && typeof r.score==='number') scores.push(Number(r.score)||0); }); });
+      return { day: dayKey, submitted: (d.submittedWordIds||[]).length,
+        avgScore: scores.length ? (scores.reduce((a,b)=>a+b,0)/scores.length) : 0,
+        taskCompleted: !!d.taskCompleted, taskAvgScore: d.taskAvgScore||0 };
+    });
+  }
   const tabsHtml = `
     <div style="display:flex;gap:8px;justify-content:center;margin:8px 0">
       <button class="btn small ${tab==='task'?'':'secondary'}" id="btnTabTask">每日任务进度</button>
       <button class="btn small ${tab==='learn'?'':'secondary'}" id="btnTabLearn">学习新词进度</button>
     </div>`;
-  const dayKeys = Object.keys(useDays).sort();
   let totalLearned = 0;
-  const rows = dayKeys.map(dayKey=>{
-    const d = (useDays[dayKey]||{})[tab] || {};
-    const submittedCount = (d.submittedWordIds||[]).length;
+  const rows = summaries.map(s=>{
+    const dayKey = s.day;
+    const submittedCount = s.submitted || 0;
     totalLearned += submittedCount;
-    // 计算均分：遍历录音
-    const scores=[];
-    Object.values(d.recordings||{}).forEach(arr=>{ (arr||[]).forEach(r=>{ if(r && typeof r.score==='number') scores.push(Number(r.score)||0); }); });
-    const passed = scores.length ? (scores.reduce((a,b)=>a+b,0)/scores.length) : 0;
-    const taskInfo = d.taskCompleted ? `<span class=\"badge\">任务完成 ✓</span><span class=\"badge\">任务均分 ${Math.round((d.taskAvgScore||0)*100)}</span>` : `<span class=\"badge\">任务未完成</span>`;
+    const passed = Number(s.avgScore) || 0;
+    const taskInfo = s.taskCompleted ? `<span class=\"badge\">任务完成 ✓</span><span class=\"badge\">任务均分 ${Math.round((s.taskAvgScore||0)*100)}</span>` : `<span class=\"badge\">任务未完成</span>`;
     return `<div class=\"progress-row\"><div>${dayKey}</div><div class=\"stat\"><span class=\"badge\">${submittedCount} 词</span><span class=\"badge\">平均得分 ${Math.round(passed*100)}</span>${taskInfo}<button data-detail=\"${dayKey}\" class=\"btn small secondary\">查看详情</button></div></div>`;
   }).join('');
   root.innerHTML = `
@@ -966,6 +1041,7 @@ async function renderProgress(root){
       <div class="page-subtitle">累计已认识 <b>${totalLearned}</b> 个单词</div>
       ${tabsHtml}
       <div class="card">${rows || '暂无记录'}</div>
+      <div style="margin-top:12px;text-align:center"><a class="btn small secondary" href="${exportUrl(tab)}" download>导出全部录音记录 CSV</a></div>
     </section>`;
   // bind detail links
   $all('[data-detail]').forEach(a=>{
@@ -989,7 +1065,7 @@ async function renderProgressDetail(root, dayKey){
     </section>`;
   let d = null;
   try{
-    const resp = await fetch(`/api/progress/${encodeURIComponent(dayKey)}`, { cache: 'no-store' });
+    const resp = await fetch(withLearner(`/api/progress/${encodeURIComponent(dayKey)}`), { cache: 'no-cache' });
     if(resp.ok){ const j = await resp.json(); if(j && j.ok) d = j.day || null; }
   }catch{}
   if(!d){
@@ -1014,7 +1090,7 @@ async function renderProgressDetail(root, dayKey){
       <div class=\"page-title\">${dayKey} 详情</div>
       <div class=\"page-subtitle\">可查看每个录音与得分</div>
       <div class=\"grid\">${items || '无录音'}</div>
-      <div style=\"margin-top:16px;text-align:center\"><a href=\"#progress\" class=\"btn small\" id=\"btnBackProgress\">返回</a></div>
+      <div style=\"margin-top:16px;text-align:center\"><a href=\"#progress\" class=\"btn small\" id=\"btnBackProgress\">返回</a> <a class=\"btn small secondary\" href=\"${exportUrl(tab, dayKey, dayKey)}\" download>导出 CSV</a></div>
     </section>`;
 
   const backBtn = document.getElementById('btnBackProgress');
@@ -1028,17 +1104,12 @@ async function renderProgressDetail(root, dayKey){
   }
 }
 
-function buildDayCsv(dayKey, d){
-  const header = ['kid','day','wordId','word','score','transcript','audioUrl'];
-  const lines = [header.join(',')];
-  Object.entries(d?.recordings || {}).forEach(([wid, recs])=>{
-    const w = window.__WORDS__.find(x=> String(x.id)===String(wid));
-    (recs||[]).forEach(r=>{
-      if(!r) return;
-      lines.push([state.kidId, dayKey, wid, (w?.en||''), (r.score||0), JSON.stringify(r.transcript||''), r.url].join(','));
-    });
-  });
-  return lines.join('\n');
+// 导出由服务端流式生成（/api/export），浏览器直接下载，不在内存中拼接
+function exportUrl(kind, from='', to=''){
+  const q = new URLSearchParams({ format: 'csv', kind, learner: state.kidId });
+  if(from) q.set('from', from);
+  if(to) q.set('to', to);
+  return `/api/export?${q}`;
 }
 
 function parseWordsText(text){
@@ -1162,7 +1233,7 @@ async function autoCheckCompleteTask(){
   setTaskAvgScore(avg, state.todayKey);
   markTaskCompleted(state.todayKey);
   try{
-    fetch('/api/progress/complete-task', {
+    fetch(withLearner('/api/progress/complete-task'), {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ day: state.todayKey, taskAvgScore: avg })
@@ -1192,14 +1263,24 @@ function preferJpgUrl(src){
   }
 }
 
+// 本地单词图改走 /api/images，按显示宽度与设备像素比取合适尺寸的派生图
+function responsiveImageUrl(src, img){
+  const m = /^assets\/words\/([^?#]+)/i.exec(src || '');
+  if(!m) return '';
+  const px = Math.round((img.clientWidth || 320) * (window.devicePixelRatio || 1));
+  return `/api/images/${encodeURIComponent(m[1])}?w=${px}`;
+}
+
 function setupLazyImages(root){
   const imgs = root.querySelectorAll('img.lazy[data-src]');
   const loadImg = (img)=>{
     if(img.dataset.loaded) return;
     const src = img.getAttribute('data-src') || '';
     const fallback = img.getAttribute('data-fallback-src') || '';
-    img.src = src;
-    img.onerror = ()=>{ if(fallback && img.src !== fallback){ img.src = fallback; } };
+    const chain = [responsiveImageUrl(fallback || src, img), src, fallback].filter((u, i, a)=> u && a.indexOf(u) === i);
+    let idx = 0;
+    img.src = chain[0] || '';
+    img.onerror = ()=>{ if(++idx < chain.length){ img.src = chain[idx]; } };
     img.dataset.loaded = '1';
   };
   const io = new IntersectionObserver((entries)=>{
@@ -1232,7 +1313,7 @@ function debounceSyncAll(){
 
 async function syncProgressFromServer(dayKey){
   try{
-    const resp = await fetch(`/api/progress/${encodeURIComponent(dayKey)}`, { cache: 'no-store' });
+    const resp = await fetch(withLearner(`/api/progress/${encodeURIComponent(dayKey)}`), { cache: 'no-cache' });
     if(!resp.ok) return;
     const data = await resp.json();
     if(!data || !data.ok) return;
@@ -1260,14 +1341,28 @@ async function syncProgressFromServer(dayKey){
   }catch{}
 }
 
+function readSyncPoints(){
+  try{ return JSON.parse(localStorage.getItem(PROGRESS_SYNC_KEY) || '{}') || {}; }catch{ return {}; }
+}
+
 async function syncAllProgressFromServer(){
   if(__syncingAll) return;
   __syncingAll = true;
   try{
-    const resp = await fetch('/api/progress', { cache: 'no-store' });
+    // 只拉取上次同步之后有变化的天
+    const saved = readSyncPoints()[state.kidId] || {};
+    const since = Number(saved.version || 0);
+    let resp = await fetch(withLearner(`/api/progress?since=${since}`), { cache: 'no-cache' });
     if(!resp.ok) return;
-    const data = await resp.json();
+    let data = await resp.json();
     if(!data || !data.ok) return;
+    if(since && (Number(data.version||0) < since || (data.epoch||'') !== (saved.epoch||''))){
+      // 服务端数据被替换或重置过，旧版本号没有意义，退回全量同步
+      resp = await fetch(withLearner('/api/progress'), { cache: 'no-cache' });
+      if(!resp.ok) return;
+      data = await resp.json();
+      if(!data || !data.ok) return;
+    }
     const days = data.days || {};
     const local = getGlobal();
     if(!local.days) local.days = {};
@@ -1287,6 +1382,10 @@ async function syncAllProgressFromServer(){
       local.days[dayKey] = d;
     }
     setGlobal(local);
+    const points = readSyncPoints();
+    points[state.kidId] = { version: Number(data.version||0), epoch: data.epoch || '' };
+    localStorage.setItem(PROGRESS_SYNC_KEY, JSON.stringify(points));
+    localStorage.removeItem('ww4k.progressVersion');  // 早期版本的全局同步点
   }catch{}
   finally{ __syncingAll = false; }
 }
@@ -1,15 +1,41 @@
 import os
 import re
 import argparse
+import bisect
+import contextlib
+import copy
+import csv
 from datetime import datetime
+import gzip
+import hashlib
+import io
 import json
+import math
+import mimetypes
+import queue
+import shutil
+import signal
+import socket
+import subprocess
 import threading
 import time
-import secrets
 import random
+from collections import Counter, OrderedDict
+import sqlite3
 import string
 import secrets
-from flask import Flask, request, jsonify, send_from_directory, abort, redirect, url_for, make_response
+import unicodedata
+import zipfile
+from flask import Flask, request, jsonify, send_file, abort, redirect, url_for, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,6 +43,7 @@ ASSETS_DIR = os.path.join(ROOT_DIR, 'assets')
 RECORDS_DIR = os.path.join(ASSETS_DIR, 'records')
 DATA_DIR = os.path.join(ROOT_DIR, 'data')
 PROGRESS_FILE = os.path.join(DATA_DIR, 'progress.json')
+PROGRESS_LOCK_FILE = os.path.join(DATA_DIR, 'progress.lock')
 
 os.makedirs(RECORDS_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -31,7 +58,277 @@ def sanitize_basename(name: str) -> str:
 
 app = Flask(__name__, static_folder='.', static_url_path='')
 _progress_lock = threading.RLock()
-_recent_events = {}
+
+
+# ---- 运行指标：请求延迟直方图 + 内部阶段耗时，/metrics 输出 Prometheus 文本格式 ----
+
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_HELP = {
+    'ww_http_request_duration_seconds': ('histogram', 'Request handling time by endpoint, method and status.'),
+    'ww_phase_duration_seconds': ('histogram', 'Time spent in internal phases (lock_wait, load, parse, serialize, fsync, replace, commit, upload, archive_read).'),
+    'ww_replace_retries_total': ('counter', 'os.replace attempts retried while writing progress files.'),
+    'ww_upload_bytes_total': ('counter', 'Recording bytes received.'),
+    'ww_throttled_total': ('counter', 'Requests rejected by the rate limiter.'),
+}
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+    __slots__ = ('metrics', 'name', 't0')
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record_phase(self.name, time.perf_counter() - self.t0)
+
+
+class Metrics:
+    """进程内的计数器与直方图（不依赖 prometheus_client）。
+
+    默认关闭，关闭时 observe/inc/phase 只做一次布尔判断。打开后（--metrics）：
+    - observe(name, seconds, **labels)：写入直方图；inc(name, value, **labels)：累加计数器
+    - phase(name)：上下文管理器，记录一个内部阶段的耗时（锁等待、解析、序列化、fsync……）；
+      --server-timing 时同一请求内的阶段耗时按名称累加，写入响应的 Server-Timing 头
+    多进程部署时每个工作进程各自计数，一次抓取只反映接受该连接的进程。
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.enabled = False
+        self.server_timing = False
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._hist = {}             # (name, labels) -> [各桶计数..., 超出最大桶的计数, 总和]
+        self._counters = Counter()  # (name, labels) -> 累计值
+        self._local = threading.local()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0] * (len(self.buckets) + 2)
+            h[i] += 1
+            h[-1] += seconds
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def phase(self, name: str):
+        return _Phase(self, name) if self.enabled else _NULL_PHASE
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        self.observe('ww_phase_duration_seconds', seconds, phase=name)
+        phases = getattr(self._local, 'phases', None)
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + seconds
+
+    def begin_request(self) -> None:
+        self._local.start = time.perf_counter()
+        self._local.phases = {} if self.server_timing else None
+
+    def finish_request(self, endpoint: str, method: str, resp) -> None:
+        start = getattr(self._local, 'start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self.observe('ww_http_request_duration_seconds', elapsed,
+                     endpoint=endpoint or 'none', method=method, status=str(resp.status_code))
+        phases = self._local.phases
+        if phases is not None:
+            parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+            parts.append(f'total;dur={elapsed * 1000:.2f}')
+            resp.headers['Server-Timing'] = ', '.join(parts)
+        self._local.start = self._local.phases = None
+
+    @staticmethod
+    def _labels(labels, extra=()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        def esc(v):
+            return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in items) + '}'
+
+    def render(self, counters=()) -> str:
+        """counters：额外的 (name, labels, value)，如限流器自己维护的计数。"""
+        with self._lock:
+            hist = {k: list(v) for k, v in self._hist.items()}
+            values = list(self._counters.items())
+        families = {}
+        for (name, labels), h in hist.items():
+            families.setdefault(name, []).append((labels, h))
+        for (name, labels), value in values:
+            families.setdefault(name, []).append((labels, value))
+        for name, labels, value in counters:
+            families.setdefault(name, []).append((tuple(sorted(labels.items())), value))
+        lines = []
+        for name in sorted(families):
+            kind, text = METRICS_HELP.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(families[name], key=lambda x: x[0]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{self._labels(labels)} {value:g}')
+                    continue
+                cumulative = 0
+                for bound, n in zip(self.buckets, value):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{self._labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+                cumulative += value[-2]
+                lines.append(f'{name}_bucket{self._labels(labels, [("le", "+Inf")])} {cumulative}')
+                lines.append(f'{name}_sum{self._labels(labels)} {value[-1]:.6f}')
+                lines.append(f'{name}_count{self._labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+# 先于限流注册，被限流（429）的请求同样计时
+@app.before_request
+def _metrics_begin():
+    if metrics.enabled:
+        metrics.begin_request()
+
+
+@app.after_request
+def _metrics_finish(resp):
+    if metrics.enabled:
+        metrics.finish_request(request.endpoint, request.method, resp)
+    return resp
+
+
+# ---- 限流：重复提交去重 + 每客户端令牌桶 ----
+
+class RateLimiter:
+    """线程安全的限流器，所有写接口共用。
+
+    - dedup(key)：同一 key 在 dedup_ttl 秒内只放行第一次（如同一单词 1 秒内重复提交）
+    - acquire(client)：每个客户端一个令牌桶，每秒补充 rate 个，最多积攒 burst 个
+    两类条目都存放在按最后更新时间排序的 OrderedDict 中，过期条目总在队首，
+    每次操作顺带弹出过期项（均摊 O(1)）；条目数超过 max_entries 时直接淘汰最旧的。
+    令牌桶空闲 burst/rate 秒后必然已满，等同于没有记录，因此可以安全淘汰。
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 40.0, dedup_ttl: float = 1.0, max_entries: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.dedup_ttl = dedup_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()     # key -> (放行时间,)
+        self._buckets = OrderedDict()  # client -> (更新时间, 剩余令牌)
+        self.throttled = Counter()     # (scope, 'duplicate' | 'rate') -> 被限流次数
+        self.evicted = 0
+
+    def _expire(self, table: OrderedDict, ttl: float, now: float) -> None:
+        while table:
+            entry = next(iter(table.values()))
+            if now - entry[0] < ttl:
+                break
+            table.popitem(last=False)
+
+    def _cap(self, table: OrderedDict) -> None:
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+            self.evicted += 1
+
+    def dedup(self, key: str, scope: str = 'dedup') -> bool:
+        """key 在 dedup_ttl 秒内已出现过时返回 True（调用方应忽略本次请求）。"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(self._seen, self.dedup_ttl, now)
+            if key in self._seen:
+                self.throttled[(scope, 'duplicate')] += 1
+                return True
+            self._seen[key] = (now,)
+            self._cap(self._seen)
+            return False
+
+    def acquire(self, client: str, scope: str = 'request', cost: float = 1.0) -> float:
+        """从客户端的令牌桶取 cost 个令牌；成功返回 0，不足时返回需要等待的秒数。"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            self._expire(self._buckets, self.burst / self.rate, now)
+            entry = self._buckets.pop(client, None)
+            tokens = self.burst if entry is None else min(self.burst, entry[1] + (now - entry[0]) * self.rate)
+            if tokens < cost:
+                self._buckets[client] = (now, tokens)
+                self.throttled[(scope, 'rate')] += 1
+                return (cost - tokens) / self.rate
+            self._buckets[client] = (now, tokens - cost)
+            self._cap(self._buckets)
+            return 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'throttled': { f'{scope}:{reason}': n for (scope, reason), n in sorted(self.throttled.items()) },
+                'entries': { 'dedup': len(self._seen), 'buckets': len(self._buckets) },
+                'evicted': self.evicted,
+            }
+
+
+rate_limiter = RateLimiter()
+TRUST_PROXY = False  # --trust-proxy：无论对端地址都按 X-Forwarded-For 区分客户端（代理不在本机时使用）
+# 参与令牌桶限流的写接口；断点续传的分块 PUT 属于同一次上传，不单独计数
+RATE_LIMITED_ENDPOINTS = {
+    'upload_recording', 'upload_recording_stream', 'create_upload', 'complete_upload', 'delete_recording',
+    'post_progress_recording', 'post_progress_submit_word', 'post_progress_complete_task', 'post_progress_batch',
+}
+
+
+def _client_id() -> str:
+    addr = request.remote_addr or '-'
+    # 本机反向代理（如 setup_https_nginx.sh 部署的 nginx）转发的请求对端都是 127.0.0.1，
+    # 不看 X-Forwarded-For 的话整个教室会共用一个令牌桶，因此回环地址默认也信任该头部。
+    # 取最右一项：代理自己追加的真实对端，客户端伪造的值只会出现在左侧
+    if TRUST_PROXY or addr.startswith('127.') or addr in ('::1', '::ffff:127.0.0.1'):
+        route = request.access_route
+        return route[-1] if route else addr
+    return addr
+
+
+@app.before_request
+def _apply_rate_limit():
+    if request.endpoint not in RATE_LIMITED_ENDPOINTS:
+        return None
+    wait = rate_limiter.acquire(_client_id(), scope=request.endpoint)
+    if not wait:
+        return None
+    resp = jsonify({ 'ok': False, 'error': 'rate_limited', 'retryAfter': round(wait, 2) })
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+    return resp
+
+
+@app.get('/metrics')
+def get_metrics():
+    if not metrics.enabled:
+        return jsonify({ 'ok': False, 'error': 'metrics disabled (start with --metrics)' }), 404
+    with rate_limiter._lock:
+        throttled = [('ww_throttled_total', { 'scope': scope, 'reason': reason }, n)
+                     for (scope, reason), n in rate_limiter.throttled.items()]
+    resp = make_response(metrics.render(throttled))
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resp
 
 
 AUTO_MOBILE_REDIRECT = True  # 可配置开关：True 则移动端UA自动跳转 mobile.html
@@ -53,7 +350,7 @@ def index():
     ua = request.headers.get('User-Agent', '')
     if AUTO_MOBILE_REDIRECT and _is_mobile_ua(ua):
         return redirect(url_for('serve_mobile'))
-    return send_from_directory(ROOT_DIR, 'index.html')
+    return render_html('index.html')
 
 
 @app.route('/mobile')
@@ -61,7 +358,7 @@ def serve_mobile():
     pref = request.cookies.get('ww_view','')
     if pref == 'desktop':
         return redirect(url_for('index'))
-    return send_from_directory(ROOT_DIR, 'mobile.html')
+    return render_html('mobile.html')
 
 
 @app.route('/switch-view', methods=['GET'])
@@ -76,25 +373,577 @@ def switch_view():
     return resp
 
 
+# ---- 静态资源：预压缩、内容指纹与条件/分段请求 ----
+
+try:
+    import brotli  # 可选依赖，未安装时只提供 gzip
+except ImportError:
+    brotli = None
+
+STATIC_CACHE_DIR = os.path.join(DATA_DIR, 'static_cache')
+STATIC_COMPRESSIBLE = ('.js', '.css', '.html', '.svg', '.csv', '.json', '.txt')
+STATIC_MIN_COMPRESS = 1024
+STATIC_PREBUILD_DIRS = ('scripts', 'libs', 'assets/logo.svg', 'styles.css', 'styles.mobile.css', 'data/words.csv')
+STATIC_ENTRIES_MAX = 512  # 常驻内存的指纹条目上限（只有文本资源会进入）
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# 录音文件名唯一且不会被覆盖，可以长期缓存
+IMMUTABLE_PREFIXES = ('assets/records/',)
+
+
+class StaticAssets:
+    """静态资源清单：文本资源（脚本、样式等）按文件内容计算指纹，并预先压缩到按内容寻址的缓存目录。
+
+    文件变化（mtime/size）后下次访问自动重新计算，因此既可启动时预构建，也可按需懒加载。
+    录音、图片等二进制文件不读取内容，ETag 直接由 mtime/size 生成，也不进入常驻清单；
+    清单按最近使用保留 STATIC_ENTRIES_MAX 条，哈希与压缩在锁外进行，不同文件互不等待。
+    """
+
+    def __init__(self, root: str, cache_dir: str, max_entries: int = STATIC_ENTRIES_MAX):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entry(self, rel: str):
+        path = os.path.join(self.root, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        if not rel.lower().endswith(STATIC_COMPRESSIBLE):
+            return { 'sig': sig, 'hash': f'{st.st_mtime_ns:x}-{st.st_size:x}', 'variants': {} }
+        with self._lock:
+            e = self._entries.get(rel)
+            if e and e['sig'] == sig:
+                self._entries.move_to_end(rel)
+                return e
+        # 同一文件被并发计算时结果相同，缓存文件按内容寻址且原子写入，重复计算无害
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()[:16]
+        e = { 'sig': sig, 'hash': digest, 'variants': {} }
+        if len(raw) >= STATIC_MIN_COMPRESS:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            encoders = [('gzip', '.gz', lambda b: gzip.compress(b, 9, mtime=0))]
+            if brotli is not None:
+                encoders.insert(0, ('br', '.br', lambda b: brotli.compress(b, quality=11)))
+            for encoding, suffix, compress in encoders:
+                out = os.path.join(self.cache_dir, digest + suffix)
+                if not os.path.isfile(out):
+                    _atomic_write_bytes(out, compress(raw))
+                if os.path.getsize(out) < len(raw):
+                    e['variants'][encoding] = out
+        with self._lock:
+            self._entries[rel] = e
+            self._entries.move_to_end(rel)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return e
+
+    def build(self) -> int:
+        """预构建常用前端资源，返回处理的文件数。"""
+        count = 0
+        for item in STATIC_PREBUILD_DIRS:
+            full = os.path.join(self.root, item)
+            paths = [full] if os.path.isfile(full) else [
+                os.path.join(d, n) for d, _, names in os.walk(full) for n in names]
+            for p in paths:
+                rel = os.path.relpath(p, self.root).replace(os.sep, '/')
+                if rel.lower().endswith(STATIC_COMPRESSIBLE) and self.entry(rel):
+                    count += 1
+        return count
+
+    def url(self, rel: str) -> str:
+        e = self.entry(rel)
+        return f"{rel}?v={e['hash']}" if e else rel
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp.{secrets.token_hex(3)}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+static_assets = StaticAssets(ROOT_DIR, STATIC_CACHE_DIR)
+_ASSET_REF_RE = re.compile(r'((?:src|href)=")((?:scripts|libs|assets)/[^"?#]+|styles[^"?#]*\.css)(\?v=[^"]*)?(")')
+
+
+def render_html(name: str):
+    """返回入口 HTML，本地脚本/样式引用替换为带内容指纹的地址。"""
+    with open(os.path.join(ROOT_DIR, name), 'r', encoding='utf-8') as f:
+        html = f.read()
+    html = _ASSET_REF_RE.sub(lambda m: m.group(1) + static_assets.url(m.group(2)) + m.group(4), html)
+    resp = make_response(html)
+    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def serve_static(filename: str):
+    rel = filename.replace('\\', '/')
+    path = safe_join(ROOT_DIR, rel)
+    if (path is None or not os.path.isfile(path)) and rel.startswith('assets/records/'):
+        # 录音在平铺与分片目录之间迁移过：按文件名找到实际位置
+        path = resolve_record(rel)
+        if path:
+            rel = os.path.relpath(path, ROOT_DIR).replace(os.sep, '/')
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    e = static_assets.entry(rel)
+    if e is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+    accepted = request.accept_encodings
+    encoding = next((enc for enc in ('br', 'gzip') if enc in e['variants'] and accepted[enc]), None)
+    if encoding:
+        resp = send_file(e['variants'][encoding], mimetype=mimetype, conditional=True,
+                         etag=f"{e['hash']}-{encoding}")
+        resp.headers['Content-Encoding'] = encoding
+    else:
+        # send_file 负责 If-None-Match / If-Modified-Since 与 Range（录音拖动播放）
+        resp = send_file(path, mimetype=mimetype, conditional=True, etag=e['hash'])
+    if e['variants']:
+        resp.headers['Vary'] = 'Accept-Encoding'
+    if request.args.get('v') == e['hash'] or rel.startswith(IMMUTABLE_PREFIXES):
+        resp.headers['Cache-Control'] = IMMUTABLE_CACHE
+    else:
+        resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+app.view_functions['static'] = serve_static
+
+
+# ---- 单词图片：按宽度与 Accept 选择的派生图 ----
+
+try:
+    from PIL import Image  # 可选依赖：未安装时 /api/images 直接返回原图
+except ImportError:
+    Image = None
+
+WORDS_IMG_DIR = os.path.join(ASSETS_DIR, 'words')
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, 'image_cache')
+IMAGE_WIDTHS = (160, 320, 640)
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+class ImageVariants:
+    """为 assets/words 下的图片生成若干宽度的 WebP/JPEG 派生图。
+
+    派生图以“原图内容哈希-宽度.格式”命名存放在缓存目录，原图替换后自然生成新文件；
+    既可通过 tools/build_image_variants.py 预先生成，也会在首次请求时按需生成。
+    """
+
+    def __init__(self, src_dir: str, cache_dir: str, widths=IMAGE_WIDTHS):
+        self.src_dir = src_dir
+        self.cache_dir = cache_dir
+        self.widths = tuple(sorted(widths))
+        self._info = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def resolve(self, name: str):
+        """按文件名找到原图；同名不同扩展名（如前端优先请求 .jpg）也能命中。"""
+        safe = sanitize_basename(os.path.basename(name or ''))
+        if not safe:
+            return None
+        path = os.path.join(self.src_dir, safe)
+        if os.path.isfile(path):
+            return path
+        stem = safe.rsplit('.', 1)[0]
+        for ext in IMAGE_EXTS:
+            alt = os.path.join(self.src_dir, stem + ext)
+            if os.path.isfile(alt):
+                return alt
+        return None
+
+    def info(self, path: str) -> dict:
+        """原图的内容哈希、宽度与是否含透明通道；文件未变化时直接用缓存。"""
+        st = os.stat(path)
+        sig = (st.st_mtime_ns, st.st_size)
+        cached = self._info.get(path)
+        if cached and cached['sig'] == sig:
+            return cached
+        with open(path, 'rb') as f:
+            raw = f.read()
+        with Image.open(io.BytesIO(raw)) as im:
+            width = im.width
+            has_alpha = 'A' in im.getbands() or 'transparency' in im.info
+        cached = { 'sig': sig, 'hash': hashlib.sha256(raw).hexdigest()[:16], 'width': width, 'alpha': has_alpha }
+        self._info[path] = cached
+        return cached
+
+    def pick_width(self, requested: int, original: int) -> int:
+        for w in self.widths:
+            if w >= requested:
+                return min(w, original)
+        return min(self.widths[-1], original)
+
+    def variant(self, path: str, width: int, fmt: str) -> str:
+        """返回（必要时生成）派生图路径。fmt 为 webp / jpeg / png。"""
+        digest = self.info(path)['hash']
+        out = os.path.join(self.cache_dir, f"{digest}-{width}.{fmt}")
+        if os.path.isfile(out):
+            return out
+        with self._guard:
+            lock = self._locks.setdefault(out, threading.Lock())
+        with lock:
+            if not os.path.isfile(out):
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with Image.open(path) as im:
+                    im.load()
+                    if im.width > width:
+                        im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+                    buf = io.BytesIO()
+                    if fmt == 'jpeg':
+                        im.convert('RGB').save(buf, 'JPEG', quality=82, optimize=True, progressive=True)
+                    elif fmt == 'png':
+                        im.save(buf, 'PNG', optimize=True)
+                    else:
+                        if im.mode not in ('RGB', 'RGBA'):
+                            im = im.convert('RGBA' if 'A' in im.getbands() else 'RGB')
+                        im.save(buf, 'WEBP', quality=80, method=6)
+                _atomic_write_bytes(out, buf.getvalue())
+        with self._guard:
+            self._locks.pop(out, None)
+        return out
+
+    def format_for(self, path: str, accept_webp: bool) -> str:
+        if accept_webp:
+            return 'webp'
+        # 不支持 WebP 时，透明图用 PNG，其余用 JPEG
+        return 'png' if self.info(path)['alpha'] else 'jpeg'
+
+    def build_all(self, log=print) -> int:
+        count = 0
+        for name in sorted(os.listdir(self.src_dir)):
+            path = os.path.join(self.src_dir, name)
+            if not name.lower().endswith(IMAGE_EXTS) or not os.path.isfile(path):
+                continue
+            try:
+                original = self.info(path)['width']
+                for w in sorted({ self.pick_width(w, original) for w in self.widths }):
+                    self.variant(path, w, 'webp')
+                    self.variant(path, w, self.format_for(path, False))
+                    count += 2
+            except Exception as e:
+                log(f'{name}: 生成失败 {e}')
+        return count
+
+
+image_variants = ImageVariants(WORDS_IMG_DIR, IMAGE_CACHE_DIR)
+
+
+@app.get('/api/images/<path:name>')
+def get_word_image(name: str):
+    """?w=期望显示宽度（CSS 像素 × devicePixelRatio）；支持 WebP 的浏览器返回 WebP。"""
+    path = image_variants.resolve(name)
+    if not path:
+        abort(404)
+    if not image_variants.enabled:
+        return redirect('/assets/words/' + os.path.basename(path))
+    try:
+        requested = max(1, min(int(request.args.get('w') or IMAGE_WIDTHS[1]), 4096))
+    except ValueError:
+        requested = IMAGE_WIDTHS[1]
+    accept_webp = 'image/webp' in (request.headers.get('Accept') or '')
+    try:
+        fmt = image_variants.format_for(path, accept_webp)
+        width = image_variants.pick_width(requested, image_variants.info(path)['width'])
+        out = image_variants.variant(path, width, fmt)
+    except Exception:
+        # 损坏或不支持的图片：退回原图
+        return redirect('/assets/words/' + os.path.basename(path))
+    resp = send_file(out, mimetype=f'image/{fmt}', conditional=True, etag=os.path.basename(out))
+    resp.headers['Vary'] = 'Accept'
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024  # 单个录音上限，可用 --max-upload-mb 调整
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_PARTIAL_DIR = os.path.join(RECORDS_DIR, '.partial')  # 与最终目录同盘，完成后 os.replace 即可
+UPLOAD_SESSION_TTL = 24 * 3600  # 未完成的断点续传会话保留时间（秒）
+_upload_locks = {}
+_upload_locks_guard = threading.Lock()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _new_record_filename(raw_word: str, ext: str) -> str:
+    # derive safe name from form fields (word or wordId)
+    base = sanitize_basename(str(raw_word or 'record').lower().replace(' ', '-')) or 'record'
+    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+    rnd = secrets.token_hex(3)
+    ext = sanitize_basename(str(ext or '').lower()) or 'webm'
+    return f"{base}_{ts}_{rnd}.{ext}"
+
+
+# 录音按文件名中的日期分片存放：assets/records/YYYY/MM/DD/<文件名>；早期平铺的文件仍可访问
+RECORD_DATE_RE = re.compile(r'_(\d{4})(\d{2})(\d{2})_\d{6}_')
+
+
+def record_relpath(filename: str) -> str:
+    """录音相对 assets/records 的存放路径；文件名中没有日期时仍平铺存放。"""
+    m = RECORD_DATE_RE.search(filename)
+    return f"{m.group(1)}/{m.group(2)}/{m.group(3)}/{filename}" if m else filename
+
+
+def record_url(filename: str) -> str:
+    return f"assets/records/{record_relpath(filename)}"
+
+
+def resolve_record(name: str):
+    """按文件名（或带分片目录的相对路径）找到录音的实际位置，新旧两种布局都能找到。"""
+    base = sanitize_basename(os.path.basename(name or ''))
+    if not base:
+        return None
+    for rel in (record_relpath(base), base):
+        path = os.path.join(RECORDS_DIR, *rel.split('/'))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _record_target(filename: str) -> str:
+    path = os.path.join(RECORDS_DIR, *record_relpath(filename).split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _copy_stream(src, dst, limit: int, written: int = 0) -> int:
+    """按块把 src 写入 dst，累计超过 limit 时抛出 UploadTooLarge；返回累计字节数。"""
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return written
+        written += len(chunk)
+        if written > limit:
+            raise UploadTooLarge()
+        dst.write(chunk)
+
+
+def _save_record_stream(src, filename: str) -> int:
+    """把录音流写到最终目录下的临时文件，完整写完后再改名，返回字节数。"""
+    path = _record_target(filename)
+    tmp_path = f"{path}.part"
+    try:
+        with metrics.phase('upload'):
+            with open(tmp_path, 'wb') as f:
+                size = _copy_stream(src, f, MAX_UPLOAD_BYTES)
+            os.replace(tmp_path, path)
+        metrics.inc('ww_upload_bytes_total', size)
+        return size
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def set_max_upload(limit: int) -> None:
+    """设置单个录音上限；请求体整体上限（MAX_CONTENT_LENGTH）另留出 multipart 头部的余量，
+    由 Werkzeug 在读取时强制执行，没有 Content-Length 的分块传输请求同样受限。"""
+    global MAX_UPLOAD_BYTES
+    MAX_UPLOAD_BYTES = limit
+    app.config['MAX_CONTENT_LENGTH'] = limit + UPLOAD_CHUNK_BYTES
+
+
+set_max_upload(MAX_UPLOAD_BYTES)
+
+
+def _too_large():
+    return jsonify({ 'ok': False, 'error': 'too_large', 'maxBytes': MAX_UPLOAD_BYTES }), 413
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def _request_too_large(e):
+    return _too_large()
+
+
 @app.post('/api/recordings')
 def upload_recording():
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES + UPLOAD_CHUNK_BYTES:
+        return _too_large()
     if 'audio' not in request.files:
         return jsonify({ 'ok': False, 'error': 'missing file field "audio"' }), 400
     file = request.files['audio']
-    # derive safe name from form fields (word or wordId)
+    try:
+        learner = _request_learner(request.form)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
     raw_word = request.form.get('word') or request.form.get('wordId') or 'record'
-    base = sanitize_basename(str(raw_word).lower().replace(' ', '-')) or 'record'
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    rnd = secrets.token_hex(3)
     # default extension .webm; allow client-provided filename's extension if present
     ext = 'webm'
     if file.filename and '.' in file.filename:
-        ext = sanitize_basename(file.filename.rsplit('.', 1)[-1].lower()) or 'webm'
-    filename = f"{base}_{ts}_{rnd}.{ext}"
-    path = os.path.join(RECORDS_DIR, filename)
-    file.save(path)
-    url = f"assets/records/{filename}"
-    return jsonify({ 'ok': True, 'url': url, 'filename': filename })
+        ext = file.filename.rsplit('.', 1)[-1]
+    filename = _new_record_filename(raw_word, ext)
+    try:
+        _save_record_stream(file.stream, filename)
+    except UploadTooLarge:
+        return _too_large()
+    audio_pipeline.submit(filename, learner)
+    return jsonify({ 'ok': True, 'url': record_url(filename), 'filename': filename })
+
+
+@app.post('/api/recordings/stream')
+def upload_recording_stream():
+    """请求体即音频数据（如 Content-Type: audio/webm），边读边写盘，不经过 multipart 解析。
+
+    参数：?word=apple&ext=webm&learner=
+    """
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return _too_large()
+    try:
+        learner = _request_learner()
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    raw_word = request.args.get('word') or request.args.get('wordId') or 'record'
+    filename = _new_record_filename(raw_word, request.args.get('ext') or 'webm')
+    try:
+        size = _save_record_stream(request.stream, filename)
+    except UploadTooLarge:
+        return _too_large()
+    if size == 0:
+        os.remove(_record_target(filename))
+        return jsonify({ 'ok': False, 'error': 'empty_body' }), 400
+    audio_pipeline.submit(filename, learner)
+    return jsonify({ 'ok': True, 'url': record_url(filename), 'filename': filename })
+
+
+def _upload_paths(upload_id: str):
+    safe = re.sub(r'[^a-f0-9]', '', upload_id or '')[:32]
+    if not safe:
+        return None, None
+    return os.path.join(UPLOAD_PARTIAL_DIR, f'{safe}.part'), os.path.join(UPLOAD_PARTIAL_DIR, f'{safe}.json')
+
+
+def _upload_lock(upload_id: str):
+    with _upload_locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _drop_upload(upload_id: str) -> None:
+    for p in _upload_paths(upload_id):
+        try:
+            os.remove(p)
+        except (OSError, TypeError):
+            pass
+    with _upload_locks_guard:
+        _upload_locks.pop(upload_id, None)
+
+
+def _sweep_stale_uploads() -> None:
+    try:
+        names = os.listdir(UPLOAD_PARTIAL_DIR)
+    except OSError:
+        return
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    for name in names:
+        p = os.path.join(UPLOAD_PARTIAL_DIR, name)
+        try:
+            if os.path.getmtime(p) < cutoff:
+                os.remove(p)
+        except OSError:
+            pass
+
+
+@app.post('/api/recordings/uploads')
+def create_upload():
+    """创建断点续传会话，返回 uploadId；之后按 offset 分块 PUT，最后 complete。"""
+    payload = request.get_json(silent=True) or {}
+    try:
+        total = int(payload.get('size') or 0)
+    except (TypeError, ValueError):
+        return jsonify({ 'ok': False, 'error': 'invalid_size' }), 400
+    try:
+        learner = _request_learner(payload)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    if total > MAX_UPLOAD_BYTES:
+        return _too_large()
+    os.makedirs(UPLOAD_PARTIAL_DIR, exist_ok=True)
+    _sweep_stale_uploads()
+    upload_id = secrets.token_hex(16)
+    part_path, meta_path = _upload_paths(upload_id)
+    meta = { 'word': str(payload.get('word') or payload.get('wordId') or 'record'),
+             'ext': str(payload.get('ext') or 'webm'), 'size': total, 'learner': learner,
+             'created': int(time.time()) }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    open(part_path, 'wb').close()
+    return jsonify({ 'ok': True, 'uploadId': upload_id, 'offset': 0, 'chunkSize': UPLOAD_CHUNK_BYTES * 4 })
+
+
+@app.get('/api/recordings/uploads/<upload_id>')
+def get_upload(upload_id: str):
+    part_path, _ = _upload_paths(upload_id)
+    if not part_path or not os.path.isfile(part_path):
+        return jsonify({ 'ok': False, 'error': 'unknown_upload' }), 404
+    return jsonify({ 'ok': True, 'uploadId': upload_id, 'offset': os.path.getsize(part_path) })
+
+
+@app.put('/api/recordings/uploads/<upload_id>')
+def put_upload_chunk(upload_id: str):
+    """追加一个分块：?offset= 必须等于服务端已收到的字节数，否则返回 409 与当前 offset。"""
+    part_path, _ = _upload_paths(upload_id)
+    if not part_path or not os.path.isfile(part_path):
+        return jsonify({ 'ok': False, 'error': 'unknown_upload' }), 404
+    try:
+        offset = int(request.args.get('offset') or 0)
+    except ValueError:
+        return jsonify({ 'ok': False, 'error': 'invalid_offset' }), 400
+    # 中途断开时已写入的字节保留，客户端 GET 当前 offset 后续传
+    with _upload_lock(upload_id):
+        current = os.path.getsize(part_path)
+        if offset != current:
+            return jsonify({ 'ok': False, 'error': 'offset_mismatch', 'offset': current }), 409
+        with open(part_path, 'r+b') as f:
+            f.seek(current)
+            try:
+                with metrics.phase('upload'):
+                    written = _copy_stream(request.stream, f, MAX_UPLOAD_BYTES, current)
+            except UploadTooLarge:
+                f.truncate(current)
+                return _too_large()
+    metrics.inc('ww_upload_bytes_total', written - current)
+    return jsonify({ 'ok': True, 'uploadId': upload_id, 'offset': written })
+
+
+@app.post('/api/recordings/uploads/<upload_id>/complete')
+def complete_upload(upload_id: str):
+    part_path, meta_path = _upload_paths(upload_id)
+    if not part_path or not os.path.isfile(part_path) or not os.path.isfile(meta_path):
+        return jsonify({ 'ok': False, 'error': 'unknown_upload' }), 404
+    with _upload_lock(upload_id):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        size = os.path.getsize(part_path)
+        if meta.get('size') and size != int(meta['size']):
+            return jsonify({ 'ok': False, 'error': 'incomplete', 'offset': size }), 409
+        if size == 0:
+            return jsonify({ 'ok': False, 'error': 'empty_body' }), 400
+        filename = _new_record_filename(meta.get('word'), meta.get('ext'))
+        os.replace(part_path, _record_target(filename))
+    _drop_upload(upload_id)
+    audio_pipeline.submit(filename, meta.get('learner') or DEFAULT_LEARNER)
+    return jsonify({ 'ok': True, 'url': record_url(filename), 'filename': filename })
+
+
+@app.delete('/api/recordings/uploads/<upload_id>')
+def abort_upload(upload_id: str):
+    _drop_upload(upload_id)
+    return jsonify({ 'ok': True })
 
 
 @app.delete('/api/recordings/<path:filename>')
@@ -103,221 +952,2778 @@ def delete_recording(filename: str):
     safe = sanitize_basename(os.path.basename(filename))
     if not safe:
         return jsonify({ 'ok': False, 'error': 'invalid filename' }), 400
-    path = os.path.join(RECORDS_DIR, safe)
-    if not os.path.isfile(path):
+    path = resolve_record(safe)
+    if not path:
         return jsonify({ 'ok': True, 'deleted': False })
     try:
         os.remove(path)
+        # 同时删除后台处理生成的压缩版本
+        processed = resolve_record(processed_record_name(safe))
+        if processed and processed != path:
+            os.remove(processed)
         return jsonify({ 'ok': True, 'deleted': True })
     except OSError:
         return jsonify({ 'ok': False, 'error': 'delete_failed' }), 500
 
 
-def read_progress():
-    if not os.path.isfile(PROGRESS_FILE):
-        return { 'days': {} }
-    try:
-        with _progress_lock:
-            with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            # 兼容旧结构：将顶层字段迁移到 task 分支
-            if isinstance(data, dict) and 'days' in data:
-                changed = False
-                for day_key, day in data['days'].items():
-                    if not isinstance(day, dict):
-                        continue
-                    if 'task' not in day or 'learn' not in day:
-                        # 初始化新结构
-                        new_day = {
-                            'task': {
-                                'recordings': {},
-                                'submittedWordIds': [],
-                                'submittedAtMap': {},
-                                'taskCompleted': False,
-                                'taskAvgScore': 0
-                            },
-                            'learn': {
-                                'recordings': {},
-                                'submittedWordIds': [],
-                                'submittedAtMap': {}
-                            }
-                        }
-                        # 旧字段迁移到 task
-                        if 'recordings' in day:
-                            new_day['task']['recordings'] = day.get('recordings') or {}
-                        if 'submittedWordIds' in day:
-                            new_day['task']['submittedWordIds'] = day.get('submittedWordIds') or []
-                        if 'submittedAtMap' in day:
-                            new_day['task']['submittedAtMap'] = day.get('submittedAtMap') or {}
-                        if 'taskCompleted' in day:
-                            new_day['task']['taskCompleted'] = bool(day.get('taskCompleted'))
-                        if 'taskAvgScore' in day:
-                            try:
-                                new_day['task']['taskAvgScore'] = float(day.get('taskAvgScore') or 0)
-                            except Exception:
-                                new_day['task']['taskAvgScore'] = 0
-                        data['days'][day_key] = new_day
-                        changed = True
-                if changed:
-                    write_progress(data)
-            return data
-    except Exception:
-        return { 'days': {} }
+def _empty_day() -> dict:
+    return {
+        'task': {
+            'recordings': {},
+            'submittedWordIds': [],
+            'submittedAtMap': {},
+            'taskCompleted': False,
+            'taskAvgScore': 0
+        },
+        'learn': {
+            'recordings': {},
+            'submittedWordIds': [],
+            'submittedAtMap': {}
+        }
+    }
 
 
-def write_progress(data: dict) -> None:
-    # 使用全局锁避免 Windows 下被占用导致替换失败
-    with _progress_lock:
-        suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-        tmp_path = f"{PROGRESS_FILE}.tmp.{suffix}"
-        with open(tmp_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
-            try:
-                f.flush()
+# 进度文档的结构版本：每次改动结构时加一，并用 @progress_migration(新版本) 登记升级函数。
+# 文件中的 schemaVersion 等于当前版本时，加载后直接信任其结构，读写路径不再做任何补齐。
+PROGRESS_SCHEMA_VERSION = 4
+PROGRESS_MIGRATIONS = []  # [(目标版本, 升级函数)]，按版本顺序执行
+
+
+def progress_migration(version: int):
+    def register(fn):
+        PROGRESS_MIGRATIONS.append((version, fn))
+        PROGRESS_MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+
+def migrate_progress(data: dict) -> int:
+    """把进度文档原地升级到 PROGRESS_SCHEMA_VERSION，返回升级前的版本。"""
+    current = int(data.get('schemaVersion') or 0)
+    if current > PROGRESS_SCHEMA_VERSION:
+        raise ValueError(f'进度数据的 schemaVersion={current} 高于本程序支持的 {PROGRESS_SCHEMA_VERSION}，请升级 server.py')
+    for version, fn in PROGRESS_MIGRATIONS:
+        if version > current:
+            fn(data)
+    data['schemaVersion'] = PROGRESS_SCHEMA_VERSION
+    return current
+
+
+def _new_progress() -> dict:
+    return { 'schemaVersion': PROGRESS_SCHEMA_VERSION, 'days': {}, 'dayVersions': {}, 'version': 0, 'archive': {},
+             'progressId': secrets.token_hex(8) }
+
+
+@progress_migration(1)
+def _migrate_legacy_days(data: dict) -> bool:
+    """兼容旧结构：将顶层字段迁移到 task 分支，返回是否有改动。"""
+    if not isinstance(data.get('days'), dict):
+        data['days'] = {}
+    if not isinstance(data.get('dayVersions'), dict):
+        data['dayVersions'] = {}
+    data['version'] = int(data.get('version') or 0)
+    changed = False
+    for day_key, day in data['days'].items():
+        if not isinstance(day, dict):
+            continue
+        if 'task' not in day or 'learn' not in day:
+            new_day = _empty_day()
+            # 旧字段迁移到 task
+            if 'recordings' in day:
+                new_day['task']['recordings'] = day.get('recordings') or {}
+            if 'submittedWordIds' in day:
+                new_day['task']['submittedWordIds'] = day.get('submittedWordIds') or []
+            if 'submittedAtMap' in day:
+                new_day['task']['submittedAtMap'] = day.get('submittedAtMap') or {}
+            if 'taskCompleted' in day:
+                new_day['task']['taskCompleted'] = bool(day.get('taskCompleted'))
+            if 'taskAvgScore' in day:
+                try:
+                    new_day['task']['taskAvgScore'] = float(day.get('taskAvgScore') or 0)
+                except Exception:
+                    new_day['task']['taskAvgScore'] = 0
+            data['days'][day_key] = new_day
+            changed = True
+    return changed
+
+
+@progress_migration(2)
+def _migrate_fill_day_keys(data: dict) -> None:
+    """补齐每天 task / learn 分支的全部键，丢弃无法识别的天。"""
+    for day_key, day in list(data['days'].items()):
+        if not isinstance(day, dict):
+            del data['days'][day_key]
+            continue
+        for kind, template in _empty_day().items():
+            if not isinstance(day.get(kind), dict):
+                day[kind] = {}
+            for key, value in template.items():
+                day[kind].setdefault(key, value)
+
+
+@progress_migration(3)
+def _migrate_archive_index(data: dict) -> None:
+    """冷数据归档索引（见 ProgressArchive）；旧版本程序看不到已归档的天，因此升级结构版本。"""
+    if not isinstance(data.get('archive'), dict):
+        data['archive'] = {}
+
+
+@progress_migration(4)
+def _migrate_progress_id(data: dict) -> None:
+    """进度数据的标识：文件被重置或换成另一份数据时随之变化，客户端据此放弃增量同步（见 /api/progress 的 epoch）。"""
+    if not isinstance(data.get('progressId'), str):
+        data['progressId'] = secrets.token_hex(8)
+
+
+def _atomic_write_text(path: str, text: str) -> None:
+    """写临时文件 + fsync + os.replace，保证文件要么是旧内容要么是新内容。"""
+    suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    tmp_path = f"{path}.tmp.{suffix}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        try:
+            f.flush()
+            with metrics.phase('fsync'):
                 os.fsync(f.fileno())
-            except Exception:
-                pass
+        except Exception:
+            pass
+    with metrics.phase('replace'):
         # 重试替换，解决 WinError 32 临时占用
-        last_err = None
         for _ in range(12):
             try:
-                os.replace(tmp_path, PROGRESS_FILE)
+                os.replace(tmp_path, path)
                 return
-            except Exception as e:
-                last_err = e
+            except Exception:
+                metrics.inc('ww_replace_retries_total')
                 time.sleep(0.05)
         # 最后一次尝试，失败则抛出
-        os.replace(tmp_path, PROGRESS_FILE)
+        os.replace(tmp_path, path)
 
 
-def ensure_day(data: dict, day_key: str) -> dict:
-    if 'days' not in data:
-        data['days'] = {}
-    if day_key not in data['days']:
-        data['days'][day_key] = {
-            'task': {
-                'recordings': {},
-                'submittedWordIds': [],
-                'submittedAtMap': {},
-                'taskCompleted': False,
-                'taskAvgScore': 0
-            },
-            'learn': {
-                'recordings': {},
-                'submittedWordIds': [],
-                'submittedAtMap': {}
-            }
-        }
-    d = data['days'][day_key]
-    # 保证新结构键存在
-    d.setdefault('task', {})
-    d.setdefault('learn', {})
-    d['task'].setdefault('recordings', {})
-    d['task'].setdefault('submittedWordIds', [])
-    d['task'].setdefault('submittedAtMap', {})
-    d['task'].setdefault('taskCompleted', False)
-    d['task'].setdefault('taskAvgScore', 0)
-    d['learn'].setdefault('recordings', {})
-    d['learn'].setdefault('submittedWordIds', [])
-    d['learn'].setdefault('submittedAtMap', {})
-    return d
+def _dump_progress(data: dict) -> str:
+    with metrics.phase('serialize'):
+        return json.dumps(data, ensure_ascii=False)
 
 
-@app.get('/api/progress/<day_key>')
-def get_progress(day_key: str):
-    data = read_progress()
-    d = ensure_day(data, day_key)
-    return jsonify({ 'ok': True, 'day': d, 'dayKey': day_key })
+def _bump_version(data: dict, day_key: str) -> None:
+    # 全局版本号单调递增，每天记录最后一次变更时的版本，用于 ETag 与增量同步
+    data['version'] = int(data.get('version') or 0) + 1
+    data.setdefault('dayVersions', {})[day_key] = data['version']
 
 
-@app.post('/api/progress/recording')
-def post_progress_recording():
-    payload = request.get_json(silent=True) or {}
-    day_key = str(payload.get('day') or '')
-    word_id = str(payload.get('wordId') or '')
-    url = str(payload.get('url') or '')
-    score = float(payload.get('score') or 0)
-    ts = int(payload.get('ts') or 0)
-    transcript = payload.get('transcript') or ''
-    kind = (payload.get('kind') or 'task').strip().lower()
-    if kind not in ('task', 'learn'):
-        kind = 'task'
-    if not day_key or not word_id or not url:
-        return jsonify({ 'ok': False, 'error': 'missing_fields' }), 400
-    data = read_progress()
-    d = ensure_day(data, day_key)
-    recs = d[kind]['recordings'].setdefault(word_id, [])
-    # 去重：相同 url+ts 不重复追加
-    for r in recs:
-        if r and r.get('url') == url and int(r.get('ts') or 0) == int(ts):
-            return jsonify({ 'ok': True, 'dedup': True })
-    recs.append({ 'url': url, 'score': score, 'ts': ts, 'transcript': transcript })
-    # 仅保留最近 3 条
-    if len(recs) > 3:
-        d[kind]['recordings'][word_id] = recs[-3:]
-    write_progress(data)
-    return jsonify({ 'ok': True })
+def apply_mutation(data: dict, m: dict) -> tuple:
+    """把一条进度变更应用到内存数据上，返回 (是否有改动, 附加响应字段)。
 
+    变更记录即日志格式，重放时也走这里，因此必须是确定性的（时间戳等由调用方提前填好）。
+    """
+    op = m.get('op')
+    day_key = m.get('day')
+    if op == 'recording':
+        kind = m['kind']
+        d = ensure_day(data, day_key)
+        recs = d[kind]['recordings'].setdefault(m['wordId'], [])
+        # 去重：相同 url+ts 不重复追加
+        for r in recs:
+            if r and m['url'] in (r.get('url'), r.get('rawUrl')) and int(r.get('ts') or 0) == int(m['ts']):
+                return False, { 'dedup': True }
+        rec = { 'url': m['url'], 'score': m['score'], 'ts': m['ts'], 'transcript': m['transcript'] }
+        if m.get('rawUrl'):
+            # 上传后已处理完成的录音：url 指向压缩版本，rawUrl 为原始上传
+            rec['url'] = m['processedUrl']
+            rec['rawUrl'] = m['rawUrl']
+            rec['audio'] = m['audio']
+        recs.append(rec)
+        # 仅保留最近 3 条
+        if len(recs) > 3:
+            d[kind]['recordings'][m['wordId']] = recs[-3:]
+        _bump_version(data, day_key)
+        return True, {}
+    if op == 'submit-word':
+        kind = m['kind']
+        d = ensure_day(data, day_key)
+        if m['wordId'] not in d[kind]['submittedWordIds']:
+            d[kind]['submittedWordIds'].append(m['wordId'])
+        d[kind]['submittedAtMap'][m['wordId']] = m['ts']
+        _bump_version(data, day_key)
+        return True, {}
+    if op == 'complete-task':
+        d = ensure_day(data, day_key)
+        d['task']['taskCompleted'] = True
+        d['task']['taskAvgScore'] = m['taskAvgScore']
+        _bump_version(data, day_key)
+        return True, {}
+    if op == 'audio-processed':
+        # 后台处理完成：播放地址切换到压缩版本，并记录时长/响度
+        branch = (data['days'].get(day_key) or {}).get(m['kind']) or {}
+        for r in (branch.get('recordings') or {}).get(m['wordId']) or []:
+            if r and r.get('url') == m['url']:
+                r['rawUrl'] = m['url']
+                r['url'] = m['processedUrl']
+                r['audio'] = m['audio']
+                _bump_version(data, day_key)
+                return True, {}
+        return False, {}
+    if op == 'relocate-recordings':
+        # 录音移到分片目录后改写地址；moves 为 旧 url -> 新 url
+        branch = (data['days'].get(day_key) or {}).get(m['kind']) or {}
+        changed = False
+        for r in (branch.get('recordings') or {}).get(m['wordId']) or []:
+            for key in ('url', 'rawUrl'):
+                if r and r.get(key) in m['moves']:
+                    r[key] = m['moves'][r[key]]
+                    changed = True
+        if changed:
+            _bump_version(data, day_key)
+        return changed, {}
+    if op == 'batch':
+        # 日志中的一整批变更，重放时整体应用
+        changed = False
+        for sub in m['mutations']:
+            changed = apply_mutation(data, sub)[0] or changed
+        return changed, {}
+    raise ValueError(f'unknown progress op: {op!r}')
 
-@app.post('/api/progress/submit-word')
-def post_progress_submit_word():
-    payload = request.get_json(silent=True) or {}
-    day_key = str(payload.get('day') or '')
-    word_id = str(payload.get('wordId') or '')
-    ts = int(payload.get('ts') or 0)
-    kind = (payload.get('kind') or 'task').strip().lower()
-    if kind not in ('task', 'learn'):
-        kind = 'task'
-    if not day_key or not word_id:
-        return jsonify({ 'ok': False, 'error': 'missing_fields' }), 400
-    # 限流：同一 (day, word, kind) 1 秒内重复提交忽略
-    key = f"submit|{day_key}|{kind}|{word_id}"
-    now = time.time()
-    last = _recent_events.get(key, 0)
-    if now - last < 1.0:
-        return jsonify({ 'ok': True, 'throttled': True })
-    _recent_events[key] = now
-
-    data = read_progress()
-    d = ensure_day(data, day_key)
-    if word_id not in d[kind]['submittedWordIds']:
-        d[kind]['submittedWordIds'].append(word_id)
-    d[kind]['submittedAtMap'][word_id] = ts or int(datetime.now().timestamp() * 1000)
-    write_progress(data)
-    return jsonify({ 'ok': True })
 
+class ProgressJournal:
+    """进度变更的追加日志（每行一条紧凑 JSON）。
 
-@app.post('/api/progress/complete-task')
-def post_progress_complete_task():
-    payload = request.get_json(silent=True) or {}
-    day_key = str(payload.get('day') or '')
-    avg = float(payload.get('taskAvgScore') or 0)
-    if not day_key:
-        return jsonify({ 'ok': False, 'error': 'missing_day' }), 400
-    data = read_progress()
-    d = ensure_day(data, day_key)
-    d['task']['taskCompleted'] = True
-    d['task']['taskAvgScore'] = avg
-    write_progress(data)
-    return jsonify({ 'ok': True })
+    写入方在持有进度锁时 append，释放锁后再 wait_durable；
+    同一时间只有一个线程执行 fsync，期间到达的记录由下一次 fsync 一并落盘（group commit）。
+    """
 
+    def __init__(self, path: str):
+        self.path = path
+        self.seq = 0
+        self.size = 0
+        self._durable = 0
+        self._syncing = False
+        self._f = None
+        self._cond = threading.Condition()
 
-@app.get('/api/progress')
-def get_all_progress():
-    data = read_progress()
-    # 返回所有天的进度
-    return jsonify({ 'ok': True, 'days': data.get('days', {}) })
+    def open(self, last_seq: int) -> None:
+        with self._cond:
+            self._f = open(self.path, 'a', encoding='utf-8')
+            self.seq = self._durable = last_seq
+            self.size = self._f.tell()
 
+    def append(self, records) -> int:
+        with self._cond:
+            for rec in records:
+                self.seq += 1
+                line = json.dumps({ 'seq': self.seq, **rec }, ensure_ascii=False, separators=(',', ':')) + '\n'
+                self._f.write(line)
+                self.size += len(line)
+            return self.seq
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--host', default='127.0.0.1')
-    parser.add_argument('--port', default=8080, type=int)
-    args = parser.parse_args()
-    app.run(host=args.host, port=args.port, debug=False)
+    def wait_durable(self, seq: int) -> None:
+        with self._cond:
+            while self._durable < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # 当前线程成为 leader，替所有已写入的记录做一次 fsync
+                self._syncing = True
+                target = self.seq
+                self._f.flush()
+                fd = self._f.fileno()
+                ok = False
+                self._cond.release()
+                try:
+                    with metrics.phase('fsync'):
+                        os.fsync(fd)
+                    ok = True
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    if ok:
+                        self._durable = max(self._durable, target)
+                    self._cond.notify_all()
 
+    def rotate(self):
+        """把当前日志落盘并改名为 <path>.<最后序号>，返回旧文件路径；日志为空时返回 None。"""
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self.size == 0:
+                return None
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            old_path = f"{self.path}.{self.seq}"
+            os.replace(self.path, old_path)
+            self._durable = self.seq
+            self._f = open(self.path, 'a', encoding='utf-8')
+            self.size = 0
+            return old_path
+
+    def segments(self) -> list:
+        """已轮转但尚未合并进快照的旧日志，以及当前日志，按序号排列。"""
+        folder, name = os.path.split(self.path)
+        olds = []
+        for fn in os.listdir(folder or '.'):
+            tail = fn[len(name) + 1:]
+            if fn.startswith(name + '.') and tail.isdigit():
+                olds.append((int(tail), os.path.join(folder, fn)))
+        olds.sort()
+        return [p for _, p in olds] + ([self.path] if os.path.isfile(self.path) else [])
+
+    def replay(self, after_seq: int):
+        for path in self.segments():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能只写了一半，忽略
+                        continue
+                    if int(rec.get('seq') or 0) > after_seq:
+                        yield rec
+
+    def close(self) -> None:
+        with self._cond:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+class ProgressLoadError(Exception):
+    """progress.json 存在但无法读取或解析。"""
+
+
+PROGRESS_LOAD_RETRIES = 5  # 读取失败（如 Windows 上替换文件时的临时占用）的重试次数，间隔 0.05 秒
+
+
+def _load_progress_json(path: str) -> tuple:
+    """读取 progress.json，返回 (data, 是否做过结构升级)。
+
+    schemaVersion 已是最新时不做任何检查；旧文件按 PROGRESS_MIGRATIONS 升级一次（通常在启动时完成）。
+    只有文件不存在时才从空数据开始；存在却读不出来时重试几次后抛出 ProgressLoadError，
+    调用方保留已加载的数据，绝不能把空数据当作权威写回去覆盖整个历史。
+    """
+    for attempt in range(PROGRESS_LOAD_RETRIES + 1):
+        try:
+            with open(path, 'r', encoding='utf-8') as f, metrics.phase('parse'):
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError('top-level value is not an object')
+            break
+        except FileNotFoundError:
+            return _new_progress(), False
+        except (OSError, ValueError) as e:
+            if attempt == PROGRESS_LOAD_RETRIES:
+                raise ProgressLoadError(f'{path}: {e}') from e
+            time.sleep(0.05)
+    if data.get('schemaVersion') == PROGRESS_SCHEMA_VERSION:
+        return data, False
+    migrate_progress(data)
+    return data, True
+
+
+def migrate_progress_file(path: str) -> tuple:
+    """升级单个 progress.json 并写回，返回 (原版本, 新版本)；文件不存在时返回 None。"""
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    before = migrate_progress(data)
+    if before != PROGRESS_SCHEMA_VERSION:
+        _atomic_write_text(path, _dump_progress(data))
+    return before, PROGRESS_SCHEMA_VERSION
+
+
+# ---- 冷热分层：早于截止日期的天按月归档为不可变的压缩分段 ----
+
+ARCHIVE_CACHE_SEGMENTS = 12       # 常驻内存的已解压分段数（所有学习者共用），可用 --archive-cache 调整
+ARCHIVE_RETIRE_GRACE = 3600       # 被新分段取代的旧文件保留时间（秒），其他进程可能仍按旧索引读取
+ARCHIVE_DAY_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+class ArchiveCache:
+    """按文件路径缓存已解压的分段（文件从不原地修改，无需失效），超出容量时淘汰最久未用的。"""
+
+    def __init__(self, capacity: int = ARCHIVE_CACHE_SEGMENTS):
+        self.capacity = capacity
+        self._items = OrderedDict()  # 路径 -> { 天 -> 数据 }
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, load):
+        with self._lock:
+            days = self._items.get(path)
+            if days is not None:
+                self._items.move_to_end(path)
+                self.hits += 1
+                return days
+        days = load(path)  # 解压在锁外进行，不同分段可并行读取
+        with self._lock:
+            self.misses += 1
+            self._items[path] = days
+            self._items.move_to_end(path)
+            while len(self._items) > max(1, self.capacity):
+                self._items.popitem(last=False)
+        return days
+
+
+archive_cache = ArchiveCache()
+
+
+def _read_segment(path: str) -> dict:
+    with open(path, 'rb') as f, metrics.phase('archive_read'):
+        doc = json.loads(gzip.decompress(f.read()))
+    if doc.get('schemaVersion') != PROGRESS_SCHEMA_VERSION:
+        # 分段写入后结构又升级过：只在内存中升级，文件保持不变
+        migrate_progress(doc)
+    return doc['days']
 
-if __name__ == '__main__':
-    main()
 
+class ProgressArchive:
+    """某个学习者的冷数据归档目录。
 
+    早于截止日期的天按月写入 <月>.<随机后缀>.json.gz；索引（月 -> 分段文件名与天列表）保存在进度文档的
+    archive 字段中，与移出这些天的热数据同一次原子写入，因此崩溃后不会出现“两边都没有”的天。
+    - 读取时热数据优先，其余按需解压对应分段并放入共享的 LRU 缓存（archive_cache）
+    - 变更涉及已归档的天时先把该天复制回热数据（thaw），分段本身不变；下次归档时连同该月其他天写出新分段
+    - 被取代的旧分段在 ARCHIVE_RETIRE_GRACE 秒后由 prune() 删除
+    调用方需持有所属 ProgressStore 的锁。
+    """
+
+    def __init__(self, directory: str):
+        self.dir = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def load(self, name: str) -> dict:
+        return archive_cache.get(self.path(name), _read_segment)
+
+    @staticmethod
+    def archived(data: dict, day_key: str):
+        entry = (data.get('archive') or {}).get(day_key[:7])
+        return entry if entry and day_key in entry['days'] else None
+
+    def get_day(self, data: dict, day_key: str):
+        entry = self.archived(data, day_key)
+        return self.load(entry['file']).get(day_key) if entry else None
+
+    def thaw(self, data: dict, mutations: list) -> None:
+        if not data.get('archive'):
+            return
+        for m in mutations:
+            for sub in (m['mutations'] if m.get('op') == 'batch' else [m]):
+                day_key = sub.get('day')
+                if day_key and day_key not in data['days']:
+                    day = self.get_day(data, day_key)
+                    if day is not None:
+                        # 缓存中的分段被多个请求共享，复制后再修改
+                        data['days'][day_key] = copy.deepcopy(day)
+
+    def write(self, month: str, days: dict) -> str:
+        os.makedirs(self.dir, exist_ok=True)
+        name = f"{month}.{secrets.token_hex(4)}.json.gz"
+        doc = { 'schemaVersion': PROGRESS_SCHEMA_VERSION, 'month': month, 'days': days }
+        payload = gzip.compress(json.dumps(doc, ensure_ascii=False).encode('utf-8'), compresslevel=6)
+        tmp = self.path(name + '.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path(name))
+        return name
+
+    def archive_days(self, data: dict, before: str) -> list:
+        """把早于 before 的天写入新分段并从 data 中移出；返回被取代的旧分段文件名。
+
+        只修改内存中的 data，调用方随后需整体保存（save_all）。
+        """
+        cold = [k for k in data['days'] if k < before and ARCHIVE_DAY_RE.fullmatch(k)]
+        if not cold:
+            return []
+        index = data.setdefault('archive', {})
+        months = {}
+        for day_key in cold:
+            months.setdefault(day_key[:7], []).append(day_key)
+        retired = []
+        for month, keys in sorted(months.items()):
+            entry = index.get(month)
+            days = dict(self.load(entry['file'])) if entry else {}
+            for day_key in keys:
+                days[day_key] = data['days'][day_key]  # 解冻过的天以热数据为准
+            index[month] = { 'file': self.write(month, days), 'days': sorted(days) }
+            if entry:
+                retired.append(entry['file'])
+        for day_key in cold:
+            del data['days'][day_key]
+        return retired
+
+    def prune(self, data: dict, retired=()) -> int:
+        """删除索引不再引用、且已超过保留时间的分段（包括崩溃遗留的临时文件）。"""
+        for name in retired:
+            try:
+                os.utime(self.path(name))  # 从现在开始计算保留时间
+            except OSError:
+                pass
+        keep = { e['file'] for e in (data.get('archive') or {}).values() }
+        removed = 0
+        try:
+            entries = list(os.scandir(self.dir))
+        except FileNotFoundError:
+            return 0
+        now = time.time()
+        for entry in entries:
+            if entry.name in keep or not entry.name.endswith(('.json.gz', '.tmp')):
+                continue
+            try:
+                if now - entry.stat().st_mtime >= ARCHIVE_RETIRE_GRACE:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def progress_archive_dir(json_path: str) -> str:
+    return os.path.join(os.path.dirname(json_path), 'progress_archive')
+
+
+class ProgressBackend:
+    """进度持久化后端接口。
+
+    ProgressStore 始终把完整数据常驻内存，后端只负责加载和持久化：
+    - load()：启动或外部变化时加载完整数据
+    - changed()：数据是否被其他进程/人工修改过（需要重新 load）
+    - commit(data, mutations)：在进度锁内调用，持久化已应用到 data 上的变更；
+      返回值交给 wait() 在锁外等待落盘
+    - save_all(data)：整体覆盖写入（迁移、导入时使用）
+    - checkpoint(data)：在进度锁内调用的周期性维护，返回需在锁外执行的函数或 None
+    - archive：冷数据归档（ProgressArchive），不支持分层的后端为 None
+    """
+
+    name = 'base'
+    wakeup = None  # 由 ProgressStore 注入的 threading.Event，用于提前唤醒维护线程
+    archive = None
+
+    def load(self) -> dict:
+        raise NotImplementedError
+
+    def changed(self) -> bool:
+        return False
+
+    def commit(self, data: dict, mutations: list):
+        raise NotImplementedError
+
+    def wait(self, token) -> None:
+        pass
+
+    def save_all(self, data: dict) -> None:
+        raise NotImplementedError
+
+    def checkpoint(self, data: dict):
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class JsonProgressBackend(ProgressBackend):
+    """单个 progress.json 文件，每次变更整文件写入。适合小规模安装。"""
+
+    name = 'json'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sig = None
+        self.archive = ProgressArchive(progress_archive_dir(path))
+
+    def _file_sig(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def load(self) -> dict:
+        sig = self._file_sig()
+        data, changed = _load_progress_json(self.path)
+        # 加载成功后才记录文件签名，失败时下次访问会重试
+        self._sig = sig
+        if changed:
+            self.save_all(data)
+        return data
+
+    def changed(self) -> bool:
+        return self._file_sig() != self._sig
+
+    def commit(self, data: dict, mutations: list):
+        self.save_all(data)
+
+    def save_all(self, data: dict) -> None:
+        _atomic_write_text(self.path, _dump_progress(data))
+        # 自己写入的文件不需要重新加载
+        self._sig = self._file_sig()
+
+
+class JournalProgressBackend(ProgressBackend):
+    """progress.json 快照 + 追加日志。
+
+    每次变更只向日志追加一行，并发写入共享同一次 fsync（group commit）；
+    checkpoint() 定期把日志合并回快照。启动时按“快照 + 日志”恢复。
+    内存数据是唯一权威来源，不检测外部修改。
+    """
+
+    name = 'journal'
+
+    def __init__(self, path: str, journal_path: str):
+        self.path = path
+        self.journal = ProgressJournal(journal_path)
+        self.archive = ProgressArchive(progress_archive_dir(path))
+        # 快照可能由锁外的 checkpoint 收尾和锁内的 save_all 同时写入：
+        # 串行化写入，并且只写比已落盘快照更新的版本，旧快照不能覆盖新快照
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_seq = 0
+
+    def load(self) -> dict:
+        data, changed = _load_progress_json(self.path)
+        self.journal.close()
+        if changed:
+            _atomic_write_text(self.path, _dump_progress(data))
+        last_seq = int(data.get('journalSeq') or 0)
+        self._snapshot_seq = last_seq
+        for rec in self.journal.replay(last_seq):
+            # 与 ProgressStore.mutate 一致：写入已归档的天之前先解冻，否则会被当成空白的新一天
+            self.archive.thaw(data, [rec])
+            apply_mutation(data, rec)
+            last_seq = int(rec['seq'])
+        self.journal.open(last_seq)
+        return data
+
+    def commit(self, data: dict, mutations: list):
+        # 多条变更合成一行写入，崩溃时不会只重放半批
+        records = mutations if len(mutations) == 1 else [{ 'op': 'batch', 'mutations': mutations }]
+        seq = self.journal.append(records)
+        if self.journal.size >= JOURNAL_COMPACT_BYTES:
+            self.wakeup.set()
+        return seq
+
+    def wait(self, token) -> None:
+        # 在锁外等待落盘，让并发写入共享同一次 fsync
+        self.journal.wait_durable(token)
+
+    def save_all(self, data: dict) -> None:
+        self.journal.rotate()
+        data['journalSeq'] = self.journal.seq
+        self._write_snapshot(_dump_progress(data), self.journal.seq, force=True)
+
+    def checkpoint(self, data: dict):
+        """锁内序列化并轮转日志，锁外写快照，成功后删除已合并的旧日志。"""
+        if self.journal.size == 0 and len(self.journal.segments()) <= 1:
+            return None
+        data['journalSeq'] = self.journal.seq
+        text = _dump_progress(data)
+        last_seq = self.journal.seq
+        self.journal.rotate()
+
+        def finish():
+            self._write_snapshot(text, last_seq)
+        return finish
+
+    def _write_snapshot(self, text: str, seq: int, force: bool = False) -> None:
+        """写入截至 seq 的快照并删除已合并的日志。
+
+        checkpoint 的收尾在锁外执行，期间 save_all 可能已写入同一或更新序号的快照
+        （归档只改快照、不写日志），此时放弃写入；save_all 持有进度锁，数据总是最新的，总是写入（force）。
+        """
+        with self._snapshot_lock:
+            if force or seq > self._snapshot_seq:
+                _atomic_write_text(self.path, text)
+                self._snapshot_seq = seq
+            self._drop_segments(seq)
+
+    def _drop_segments(self, last_seq: int) -> None:
+        name = os.path.basename(self.journal.path)
+        for path in self.journal.segments():
+            tail = os.path.basename(path)[len(name) + 1:]
+            if tail.isdigit() and int(tail) <= last_seq:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        self.journal.close()
+
+
+class SqliteProgressBackend(ProgressBackend):
+    """SQLite（WAL 模式）后端：每个 (day, kind, word_id) 一行，更新一个单词只写一行。"""
+
+    name = 'sqlite'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS progress_words (
+            day TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            word_id TEXT NOT NULL,
+            recordings TEXT NOT NULL DEFAULT '[]',
+            submitted INTEGER NOT NULL DEFAULT 0,
+            submit_order INTEGER,
+            submitted_at INTEGER,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, kind, word_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS progress_days (
+            day TEXT NOT NULL PRIMARY KEY,
+            task_completed INTEGER NOT NULL DEFAULT 0,
+            task_avg_score REAL NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS progress_meta (
+            key TEXT NOT NULL PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data_version = None
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.conn.executescript(self.SCHEMA)
+        # 早期创建的库没有 version 列
+        for table in ('progress_words', 'progress_days'):
+            cols = [r[1] for r in self.conn.execute(f'PRAGMA table_info({table})')]
+            if 'version' not in cols:
+                self.conn.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        self.conn.execute("INSERT OR IGNORE INTO progress_meta (key, value) VALUES ('progressId', ?)",
+                          (secrets.token_hex(8),))
+
+    def _version(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self) -> dict:
+        # 由表结构直接构建成最新结构，无需走 JSON 的升级流程
+        data = _new_progress()
+        versions = data['dayVersions']
+        self._data_version = self._version()
+        rows = self.conn.execute(
+            'SELECT day, kind, word_id, recordings, submitted, submitted_at, version FROM progress_words '
+            'ORDER BY day, kind, submit_order IS NULL, submit_order, word_id').fetchall()
+        for day_key, kind, word_id, recordings, submitted, submitted_at, version in rows:
+            versions[day_key] = max(versions.get(day_key, 0), version)
+            branch = ensure_day(data, day_key)[kind]
+            recs = json.loads(recordings or '[]')
+            if recs:
+                branch['recordings'][word_id] = recs
+            if submitted:
+                branch['submittedWordIds'].append(word_id)
+            if submitted_at is not None:
+                branch['submittedAtMap'][word_id] = submitted_at
+        for day_key, completed, avg, version in self.conn.execute(
+                'SELECT day, task_completed, task_avg_score, version FROM progress_days'):
+            versions[day_key] = max(versions.get(day_key, 0), version)
+            task = ensure_day(data, day_key)['task']
+            task['taskCompleted'] = bool(completed)
+            task['taskAvgScore'] = avg
+        data['version'] = max(versions.values(), default=0)
+        data['progressId'] = self.conn.execute(
+            "SELECT value FROM progress_meta WHERE key = 'progressId'").fetchone()[0]
+        return data
+
+    def changed(self) -> bool:
+        # data_version 只在其他连接提交后变化
+        return self._version() != self._data_version
+
+    def _write_word(self, branch: dict, day_key: str, kind: str, word_id: str, version: int) -> None:
+        submitted = word_id in branch['submittedWordIds']
+        self.conn.execute(
+            'INSERT INTO progress_words (day, kind, word_id, recordings, submitted, submit_order, submitted_at, version) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (day, kind, word_id) DO UPDATE SET recordings = excluded.recordings, '
+            'submitted = excluded.submitted, submit_order = excluded.submit_order, '
+            'submitted_at = excluded.submitted_at, version = excluded.version',
+            (day_key, kind, word_id,
+             json.dumps(branch['recordings'].get(word_id) or [], ensure_ascii=False),
+             int(submitted),
+             branch['submittedWordIds'].index(word_id) if submitted else None,
+             branch['submittedAtMap'].get(word_id),
+             version))
+
+    def _write_day(self, day: dict, day_key: str, version: int) -> None:
+        self.conn.execute(
+            'INSERT INTO progress_days (day, task_completed, task_avg_score, version) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (day) DO UPDATE SET task_completed = excluded.task_completed, '
+            'task_avg_score = excluded.task_avg_score, version = excluded.version',
+            (day_key, int(bool(day['task'].get('taskCompleted'))), float(day['task'].get('taskAvgScore') or 0),
+             version))
+
+    def commit(self, data: dict, mutations: list):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for m in mutations:
+                day = data['days'][m['day']]
+                version = data['dayVersions'].get(m['day'], 0)
+                if m['op'] == 'complete-task':
+                    self._write_day(day, m['day'], version)
+                else:
+                    self._write_word(day[m['kind']], m['day'], m['kind'], m['wordId'], version)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        # 自己提交不会改变 data_version，这里无需更新
+
+    def save_all(self, data: dict) -> None:
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.execute('DELETE FROM progress_words')
+            self.conn.execute('DELETE FROM progress_days')
+            if isinstance(data.get('progressId'), str):
+                # 导入的是同一份数据（版本号延续），沿用其标识
+                self.conn.execute("UPDATE progress_meta SET value = ? WHERE key = 'progressId'", (data['progressId'],))
+            for day_key, day in (data.get('days') or {}).items():
+                if not isinstance(day, dict):
+                    continue
+                version = (data.get('dayVersions') or {}).get(day_key, 0)
+                for kind in ('task', 'learn'):
+                    branch = day[kind]
+                    word_ids = set(branch['recordings']) | set(branch['submittedAtMap'])
+                    word_ids |= set(str(w) for w in branch['submittedWordIds'])
+                    branch['submittedWordIds'] = [str(w) for w in branch['submittedWordIds']]
+                    for word_id in word_ids:
+                        self._write_word(branch, day_key, kind, word_id, version)
+                self._write_day(day, day_key, version)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class InterProcessLock:
+    """基于锁文件的跨进程互斥锁（POSIX flock / Windows msvcrt.locking）。
+
+    只负责进程之间的互斥，同一进程内的线程仍需先持有线程锁；不可重入。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def _fileno(self) -> int:
+        # fork 出的子进程必须重新打开：flock 锁属于“打开的文件”，继承来的描述符与父进程共用同一把锁
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """blocking=False 时拿不到锁立即返回 False。"""
+        fd = self._fileno()
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)  # LK_LOCK 内部重试约 10 秒后抛出
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+
+    def release(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+_EMPTY_CELL = (0, 0.0, 0.0, 0, 0)  # (录音数, 得分和, 最高分, 最近录音时间, 已提交)
+
+
+def _merge_cell(agg: list, cells: dict, key, new) -> None:
+    """用 new 替换 cells[key]，并增量更新汇总 agg（与单元同序的 list）。
+
+    计数与求和按差值更新；最大值只在原最大值被撤下（如录音超过 3 条被挤掉）时才在 cells 中重算。
+    """
+    old = cells.pop(key, None) or _EMPTY_CELL
+    if new and new != _EMPTY_CELL:
+        cells[key] = new
+    else:
+        new = _EMPTY_CELL
+    for i in (0, 1, 4):
+        agg[i] += new[i] - old[i]
+    for i in (2, 3):
+        if new[i] >= agg[i]:
+            agg[i] = new[i]
+        elif old[i] == agg[i]:
+            agg[i] = max((c[i] for c in cells.values()), default=_EMPTY_CELL[i])
+
+
+class ProgressStats:
+    """进度聚合，供 /api/stats 使用，读取时不必遍历全部录音。
+
+    - 每个 (kind, 天, 单词) 折算为一个单元：录音数、得分和、最高分、最近录音时间、是否已提交
+    - 按天与按单词（跨天累计）分别汇总；另有每种 kind 的历史总计与连续学习天数
+    - 每次变更只重算被改动单词的单元（最多 3 条录音）；进度被整体重新加载时只做标记，
+      到下一次查询才全量重建（多进程部署下重新加载很频繁，多数时候没有人查询统计）
+    调用方需持有所属 ProgressStore 的锁。
+    """
+
+    KINDS = ('task', 'learn')
+
+    def __init__(self):
+        self._build({})
+
+    def rebuild(self, data: dict, iter_days=None) -> None:
+        """iter_days(data)：产出全部 (天, 数据)，用于把已归档的天也计入；默认只用 data['days']。"""
+        self._pending = (data, iter_days)
+
+    def _ensure(self) -> None:
+        if self._pending is not None:
+            (data, iter_days), self._pending = self._pending, None
+            self._build(data, iter_days)
+
+    def _build(self, data: dict, iter_days=None) -> None:
+        self._pending = None
+        self._day_cells = {}   # (kind, 天) -> { 单词 -> 单元 }
+        self._day_aggs = {}    # (kind, 天) -> 汇总
+        self._word_cells = {}  # (kind, 单词) -> { 天 -> 单元 }
+        self._word_aggs = {}   # (kind, 单词) -> 汇总
+        self._total_cells = { kind: {} for kind in self.KINDS }  # kind -> { 天 -> 当天汇总 }
+        self._totals = { kind: list(_EMPTY_CELL) for kind in self.KINDS }
+        self._day_keys = []    # 有序，供区间查询
+        self._tasks = {}       # 天 -> (taskCompleted, taskAvgScore)
+        self._streaks = {}     # kind -> 缓存的连续天数，活跃天变化时失效
+        for day_key, day in (iter_days(data) if iter_days else (data.get('days') or {}).items()):
+            if not isinstance(day, dict):
+                continue
+            self._add_day(day_key)
+            for kind in self.KINDS:
+                branch = day.get(kind) or {}
+                word_ids = set(branch.get('recordings') or {}) | set(str(w) for w in branch.get('submittedWordIds') or [])
+                for word_id in word_ids:
+                    self._update_word(kind, day_key, word_id, branch)
+            self._update_task(day_key, day.get('task') or {})
+
+    def apply(self, data: dict, m: dict) -> None:
+        """在 apply_mutation 成功修改数据之后调用。"""
+        if self._pending is not None:
+            return  # 等待重建的数据就是被修改的同一对象，重建时自然包含这次变更
+        if m.get('op') == 'batch':
+            for sub in m['mutations']:
+                self.apply(data, sub)
+            return
+        day = (data.get('days') or {}).get(m.get('day'))
+        if not isinstance(day, dict):
+            return
+        self._add_day(m['day'])
+        if m['op'] == 'complete-task':
+            self._update_task(m['day'], day['task'])
+        elif m.get('wordId') is not None:
+            self._update_word(m['kind'], m['day'], m['wordId'], day[m['kind']])
+
+    def _add_day(self, day_key: str) -> None:
+        if (self.KINDS[0], day_key) in self._day_aggs:
+            return
+        bisect.insort(self._day_keys, day_key)
+        for kind in self.KINDS:
+            self._day_aggs[(kind, day_key)] = list(_EMPTY_CELL)
+
+    def _update_task(self, day_key: str, task: dict) -> None:
+        self._tasks[day_key] = (bool(task.get('taskCompleted')), float(task.get('taskAvgScore') or 0))
+
+    def _update_word(self, kind: str, day_key: str, word_id: str, branch: dict) -> None:
+        recs = [r for r in (branch.get('recordings') or {}).get(word_id) or [] if r]
+        scores = [float(r.get('score') or 0) for r in recs]
+        submitted = word_id in (branch.get('submittedWordIds') or [])
+        cell = (len(recs), sum(scores), max(scores, default=0.0),
+                max((int(r.get('ts') or 0) for r in recs), default=0), int(submitted))
+        agg = self._day_aggs[(kind, day_key)]
+        was_active = agg[0] > 0 or agg[4] > 0
+        _merge_cell(agg, self._day_cells.setdefault((kind, day_key), {}), word_id, cell)
+        _merge_cell(self._word_aggs.setdefault((kind, word_id), list(_EMPTY_CELL)),
+                    self._word_cells.setdefault((kind, word_id), {}), day_key, cell)
+        _merge_cell(self._totals[kind], self._total_cells[kind], day_key, tuple(agg))
+        if was_active != (agg[0] > 0 or agg[4] > 0):
+            self._streaks.pop(kind, None)
+
+    @staticmethod
+    def _row(agg) -> dict:
+        return { 'recordings': agg[0], 'scoreSum': round(agg[1], 4),
+                 'avgScore': round(agg[1] / agg[0], 4) if agg[0] else 0,
+                 'bestScore': agg[2], 'lastTs': agg[3] }
+
+    def days(self, kind: str, start: str = None, end: str = None) -> list:
+        """[start, end] 内每天的汇总（按天排序）；二分定位，耗时只与区间内的天数有关。"""
+        self._ensure()
+        lo = bisect.bisect_left(self._day_keys, start) if start else 0
+        hi = bisect.bisect_right(self._day_keys, end) if end else len(self._day_keys)
+        rows = []
+        for day_key in self._day_keys[lo:hi]:
+            agg = self._day_aggs[(kind, day_key)]
+            row = { 'day': day_key, 'submitted': agg[4], **self._row(agg) }
+            if kind == 'task':
+                row['taskCompleted'], row['taskAvgScore'] = self._tasks.get(day_key, (False, 0.0))
+            rows.append(row)
+        return rows
+
+    def totals(self, kind: str) -> dict:
+        self._ensure()
+        agg = self._totals[kind]
+        return { 'days': len(self._total_cells[kind]), 'submitted': agg[4], **self._row(agg) }
+
+    def word(self, kind: str, word_id: str):
+        self._ensure()
+        agg = self._word_aggs.get((kind, word_id))
+        if not agg or agg == list(_EMPTY_CELL):
+            return None
+        return { 'days': len(self._word_cells[(kind, word_id)]), 'submittedDays': agg[4], **self._row(agg) }
+
+    def word_ids(self, kind: str) -> list:
+        self._ensure()
+        return sorted(w for (k, w), agg in self._word_aggs.items() if k == kind and agg != list(_EMPTY_CELL))
+
+    def streak(self, kind: str, today: str = None) -> dict:
+        """连续学习天数（当天有录音或提交即算）：current 为截至今天/昨天仍在延续的连续天数。"""
+        self._ensure()
+        cached = self._streaks.get(kind)
+        if cached is None:
+            ordinals = []
+            for day_key in self._total_cells[kind]:
+                try:
+                    ordinals.append(datetime.strptime(day_key, '%Y-%m-%d').toordinal())
+                except ValueError:
+                    continue
+            ordinals.sort()
+            longest = run = 0
+            prev = None
+            for n in ordinals:
+                run = run + 1 if prev is not None and n == prev + 1 else 1
+                longest = max(longest, run)
+                prev = n
+            cached = self._streaks[kind] = (longest, run, prev)
+        longest, run, last = cached
+        today_n = datetime.strptime(today, '%Y-%m-%d').toordinal() if today else datetime.now().toordinal()
+        current = run if last is not None and 0 <= today_n - last <= 1 else 0
+        return { 'current': current, 'longest': longest,
+                 'lastDay': datetime.fromordinal(last).strftime('%Y-%m-%d') if last is not None else None }
+
+
+class ProgressStore:
+    """进程内常驻的进度数据。
+
+    首次访问时通过后端加载完整数据并常驻内存，之后的读取直接返回内存对象；
+    只有后端报告数据被外部修改（例如 progress.json 被手工编辑或替换）时才重新加载。
+    为避免每次请求都检查，外部修改检测最多每 stat_interval 秒进行一次。
+    调用方读取后若要修改，必须在持有 lock 的情况下完成“读-改-写”，或使用 mutate()。
+
+    多进程部署（--workers N）时，写入还要持有 process_lock：拿到锁后无条件检查后端
+    是否被其他进程改过并重新加载，再应用变更，保证“读-改-写”不会覆盖别人的提交。
+    """
+
+    def __init__(self, backend: ProgressBackend, lock=None, stat_interval: float = 1.0, process_lock=None):
+        self.backend = backend
+        self.lock = lock or threading.RLock()
+        self.process_lock = process_lock
+        self.stat_interval = stat_interval
+        self._data = None
+        self._checked_at = 0.0
+        self._maintain_wakeup = threading.Event()
+        backend.wakeup = self._maintain_wakeup
+        # 在锁内、应用之前对变更做补充（如替换为已处理的录音地址），结果会原样写入日志
+        self.preprocessors = []
+        # 每次（重新）加载生成新的 epoch，外部修改后旧 ETag 全部失效
+        self.epoch = ''
+        self.stats = ProgressStats()
+        self.closed = False
+
+    def _exclusive(self):
+        return self.process_lock if self.process_lock is not None else contextlib.nullcontext()
+
+    def get(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            if self._data is not None and now - self._checked_at < self.stat_interval:
+                return self._data
+            self._checked_at = now
+            if self._data is None or self.backend.changed():
+                # 加载时可能顺带升级旧格式并写回，同样需要跨进程互斥
+                try:
+                    with self._exclusive():
+                        self._reload()
+                except ProgressLoadError as e:
+                    # 读取继续使用已加载的数据；写入（_get_exclusive）则直接失败，不会基于它覆盖文件
+                    if self._data is None:
+                        raise
+                    print(f'[progress] reload failed, serving loaded data: {e}')
+            return self._data
+
+    def _reload(self) -> None:
+        with metrics.phase('load'):
+            self._data = self.backend.load()
+        self.stats.rebuild(self._data, self.iter_days)
+        self.epoch = secrets.token_hex(4)
+
+    def _get_exclusive(self) -> dict:
+        """持有 process_lock 时调用：不受 stat_interval 限制，确保基于最新数据修改。"""
+        if self._data is None or self.backend.changed():
+            self._reload()
+        self._checked_at = time.monotonic()
+        return self._data
+
+    def save(self, data: dict) -> None:
+        t0 = time.perf_counter()
+        with self.lock, self._exclusive():
+            metrics.record_phase('lock_wait', time.perf_counter() - t0)
+            try:
+                self.backend.save_all(data)
+            except Exception:
+                # 写盘失败时内存数据可能已被修改，丢弃缓存以便下次重新加载
+                self.invalidate()
+                raise
+            self._data = data
+            self.stats.rebuild(data, self.iter_days)
+            self._checked_at = time.monotonic()
+
+    def mutate(self, mutations: list) -> list:
+        """应用一组变更并持久化，返回每条变更的附加响应字段。"""
+        t0 = time.perf_counter()
+        with self.lock, self._exclusive():
+            metrics.record_phase('lock_wait', time.perf_counter() - t0)
+            data = self._get_exclusive()
+            results = []
+            changed = []
+            for fn in self.preprocessors:
+                mutations = [fn(m) for m in mutations]
+            if self.backend.archive is not None:
+                self.backend.archive.thaw(data, mutations)
+            for m in mutations:
+                did_change, extra = apply_mutation(data, m)
+                results.append(extra)
+                if did_change:
+                    changed.append(m)
+                    self.stats.apply(data, m)
+            if not changed:
+                return results
+            try:
+                with metrics.phase('commit'):
+                    token = self.backend.commit(data, changed)
+            except Exception:
+                self.invalidate()
+                raise
+        self.backend.wait(token)
+        return results
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._data = None
+
+    # 以下读取方法把热数据与已归档的天合在一起，调用方需持有 lock，且不得修改返回的天
+
+    def day(self, data: dict, day_key: str):
+        day = data['days'].get(day_key)
+        if day is None and self.backend.archive is not None:
+            day = self.backend.archive.get_day(data, day_key)
+        return day
+
+    def day_keys(self, data: dict) -> list:
+        keys = set(data['days'])
+        for entry in (data.get('archive') or {}).values():
+            keys.update(entry['days'])
+        return sorted(keys)
+
+    def iter_days(self, data: dict, keys=None):
+        """产出 (天, 数据)；keys 为 None 时遍历全部，归档部分按月逐个分段读取。"""
+        hot = data['days']
+        if keys is not None:
+            for day_key in keys:
+                day = self.day(data, day_key)
+                if day is not None:
+                    yield day_key, day
+            return
+        yield from list(hot.items())
+        index = data.get('archive') or {}
+        if not index or self.backend.archive is None:
+            return
+        for month in sorted(index):
+            entry = index[month]
+            pending = [k for k in entry['days'] if k not in hot]
+            if pending:
+                days = self.backend.archive.load(entry['file'])
+                for day_key in pending:
+                    yield day_key, days[day_key]
+
+    def archive_cold_days(self, before: str) -> int:
+        """把早于 before（YYYY-MM-DD）的天移入归档分段，返回移出的天数；不支持分层的后端返回 0。"""
+        archive = self.backend.archive
+        if archive is None:
+            return 0
+        with self.lock, self._exclusive():
+            data = self._get_exclusive()
+            count = len(data['days'])
+            try:
+                retired = archive.archive_days(data, before)
+                moved = count - len(data['days'])
+                if moved:
+                    self.backend.save_all(data)
+            except Exception:
+                self.invalidate()
+                raise
+            self._checked_at = time.monotonic()
+            archive.prune(data, retired)
+        return moved
+
+    def close(self) -> None:
+        """停止维护线程并关闭后端（学习者分片被换出时调用）。"""
+        with self.lock:
+            self.closed = True
+            self._maintain_wakeup.set()
+            self.backend.close()
+            self._data = None
+
+    def set_backend(self, backend: ProgressBackend) -> None:
+        with self.lock:
+            self.backend.close()
+            self.backend = backend
+            backend.wakeup = self._maintain_wakeup
+            self._data = None
+
+    def checkpoint(self) -> None:
+        with self.lock:
+            finish = self.backend.checkpoint(self.get())
+        if finish:
+            finish()
+
+    def start_maintenance(self, interval: float) -> None:
+        # 启动时先合并一次，再由后台线程定期执行
+        self.checkpoint()
+        t = threading.Thread(target=self._maintain_loop, args=(interval,), name='progress-maintenance', daemon=True)
+        t.start()
+
+    def _maintain_loop(self, interval: float) -> None:
+        while not self.closed:
+            self._maintain_wakeup.wait(interval)
+            self._maintain_wakeup.clear()
+            if self.closed:
+                return
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f'[progress] checkpoint failed: {e}')
+
+
+JOURNAL_FILE = os.path.join(DATA_DIR, 'progress.journal')
+JOURNAL_COMPACT_BYTES = 1024 * 1024  # 日志超过 1MB 时提前合并
+PROGRESS_DB_FILE = os.path.join(DATA_DIR, 'progress.db')
+
+progress_store = ProgressStore(JsonProgressBackend(PROGRESS_FILE), _progress_lock,
+                               process_lock=InterProcessLock(PROGRESS_LOCK_FILE))
+
+
+def make_progress_backend(persist: str, db_path: str = PROGRESS_DB_FILE, json_path: str = PROGRESS_FILE,
+                          journal_path: str = JOURNAL_FILE) -> ProgressBackend:
+    if persist == 'journal':
+        return JournalProgressBackend(json_path, journal_path)
+    if persist == 'sqlite':
+        return SqliteProgressBackend(db_path)
+    return JsonProgressBackend(json_path)
+
+
+def migrate_json_to_sqlite(db_path: str = PROGRESS_DB_FILE, json_path: str = PROGRESS_FILE,
+                           journal_path: str = JOURNAL_FILE) -> dict:
+    """一次性把 progress.json（含未合并的日志）导入 SQLite，返回导入统计。"""
+    source = JournalProgressBackend(json_path, journal_path)
+    try:
+        data = source.load()
+        # SQLite 按行存储，不分冷热：已归档的天一并导入
+        for entry in (data.get('archive') or {}).values():
+            for day_key, day in source.archive.load(entry['file']).items():
+                data['days'].setdefault(day_key, day)
+    finally:
+        source.close()
+    target = SqliteProgressBackend(db_path)
+    try:
+        target.save_all(data)
+        days = data.get('days') or {}
+        words = target.conn.execute('SELECT COUNT(*) FROM progress_words').fetchone()[0]
+    finally:
+        target.close()
+    return { 'days': len(days), 'rows': words }
+
+
+# ---- 按学习者分片的进度：每个学习者独立的数据文件与锁 ----
+
+LEARNERS_DIR = os.path.join(DATA_DIR, 'learners')
+DEFAULT_LEARNER = 'default'
+LEARNER_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}')
+LEARNER_STORES_MAX = 256     # 常驻内存的学习者分片上限，超出时关闭最久未用的空闲分片
+LEARNER_IDLE_SECONDS = 60.0  # 分片至少空闲多久才会被关闭
+
+
+class EmptyProgressBackend(ProgressBackend):
+    """尚未写入过的学习者：只读的空进度，不创建任何文件。"""
+
+    name = 'empty'
+
+    def load(self) -> dict:
+        return _new_progress()
+
+    def commit(self, data: dict, mutations: list):
+        raise RuntimeError('read-only progress backend')
+
+    def save_all(self, data: dict) -> None:
+        raise RuntimeError('read-only progress backend')
+
+
+class LearnerStores:
+    """学习者 id -> ProgressStore。
+
+    默认学习者沿用原有的 data/progress.json（及 progress.db / progress.journal / progress.lock），
+    其他学习者各自存放在 data/learners/<id>/ 下，拥有独立的线程锁与锁文件，
+    不同学习者的写入互不等待。
+
+    学习者 id 来自客户端，不能据此无限制地占用磁盘和内存：只有写入（get）才会创建分片，
+    只读接口用 find()，未知学习者得到共用的空进度 empty；常驻分片超过 max_stores 时，
+    关闭最久未用且已空闲 LEARNER_IDLE_SECONDS 的分片（下次访问时重新打开）。
+    """
+
+    def __init__(self, default_store: ProgressStore, root: str = LEARNERS_DIR):
+        self.root = root
+        self.persist = 'snapshot'
+        self.stat_interval = default_store.stat_interval
+        self.maintenance_interval = None
+        self.max_stores = LEARNER_STORES_MAX
+        self.preprocessors = default_store.preprocessors  # 所有分片共用同一组预处理钩子
+        self.empty = ProgressStore(EmptyProgressBackend(), stat_interval=3600.0)
+        self._stores = { DEFAULT_LEARNER: default_store }
+        self._used = {}  # 学习者 -> 最近一次访问的 monotonic 时间
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid(learner) -> bool:
+        return isinstance(learner, str) and bool(LEARNER_ID_RE.fullmatch(learner))
+
+    def paths(self, learner: str) -> dict:
+        d = os.path.join(self.root, learner)
+        return { 'json': os.path.join(d, 'progress.json'), 'journal': os.path.join(d, 'progress.journal'),
+                 'db': os.path.join(d, 'progress.db'), 'lock': os.path.join(d, 'progress.lock') }
+
+    def _backend(self, learner: str) -> ProgressBackend:
+        p = self.paths(learner)
+        return make_progress_backend(self.persist, p['db'], p['json'], p['journal'])
+
+    def get(self, learner: str = DEFAULT_LEARNER) -> ProgressStore:
+        """写入用：分片不存在时创建。"""
+        # 先记录访问时间再取分片，换出时据此判断分片是否刚被取走（见 _evict）
+        self._used[learner] = time.monotonic()
+        store = self._stores.get(learner)
+        if store is not None:
+            return store
+        if not self.valid(learner):
+            raise ValueError('invalid_learner')
+        with self._lock:
+            store = self._stores.get(learner)
+            if store is None:
+                os.makedirs(os.path.join(self.root, learner), exist_ok=True)
+                store = ProgressStore(self._backend(learner), stat_interval=self.stat_interval,
+                                      process_lock=InterProcessLock(self.paths(learner)['lock']))
+                store.preprocessors = self.preprocessors
+                if self.maintenance_interval is not None:
+                    store.start_maintenance(self.maintenance_interval)
+                self._stores[learner] = store
+                self._used[learner] = time.monotonic()
+                self._evict()
+        return store
+
+    def find(self, learner: str = DEFAULT_LEARNER):
+        """只读用：已有分片（常驻或磁盘上已存在）时返回，否则返回 None，不创建目录。"""
+        if learner in self._stores or os.path.isdir(os.path.join(self.root, learner)):
+            return self.get(learner)
+        return None
+
+    def _evict(self) -> None:
+        """持有 self._lock 时调用：关闭超出上限的、最久未用的空闲分片（默认学习者常驻）。"""
+        excess = len(self._stores) - self.max_stores
+        if excess <= 0:
+            return
+        now = time.monotonic()
+        for learner in sorted(self._stores, key=lambda k: self._used.get(k, 0.0)):
+            if excess <= 0:
+                break
+            store = self._stores[learner]
+            if learner == DEFAULT_LEARNER or now - self._used.get(learner, 0.0) < LEARNER_IDLE_SECONDS:
+                continue
+            if not store.lock.acquire(blocking=False):
+                continue
+            try:
+                del self._stores[learner]
+                # 摘除后再确认一次：期间被 get() 取走的分片放回去
+                if now - self._used.get(learner, 0.0) < LEARNER_IDLE_SECONDS:
+                    self._stores[learner] = store
+                    continue
+                store.close()
+                self._used.pop(learner, None)
+                excess -= 1
+            finally:
+                store.lock.release()
+
+    def learners(self) -> list:
+        """已打开的和磁盘上已有的学习者（其他工作进程创建的分片也能看到）。"""
+        names = set(self._stores)
+        try:
+            names.update(e.name for e in os.scandir(self.root) if e.is_dir() and self.valid(e.name))
+        except FileNotFoundError:
+            pass
+        return sorted(names)
+
+    def set_persist(self, persist: str, db_path: str = PROGRESS_DB_FILE) -> None:
+        with self._lock:
+            self.persist = persist
+            for learner, store in self._stores.items():
+                store.set_backend(make_progress_backend(persist, db_path) if learner == DEFAULT_LEARNER
+                                  else self._backend(learner))
+
+    def set_stat_interval(self, seconds: float) -> None:
+        with self._lock:
+            self.stat_interval = seconds
+            for store in self._stores.values():
+                store.stat_interval = seconds
+
+    def start_maintenance(self, interval: float) -> None:
+        with self._lock:
+            self.maintenance_interval = interval
+            for store in self._stores.values():
+                store.start_maintenance(interval)
+
+    def archive_cold_days(self, keep_days: int) -> list:
+        """把每个学习者 keep_days 天之前的进度移入归档分段，返回 [(学习者, 移出天数)]。"""
+        before = datetime.fromordinal(datetime.now().toordinal() - keep_days).strftime('%Y-%m-%d')
+        return [(learner, self.get(learner).archive_cold_days(before)) for learner in self.learners()]
+
+    def start_archiver(self, keep_days: int, interval: float = 3600.0) -> None:
+        """后台线程：立即归档一次，之后每 interval 秒检查一次（跨过日期后才会有新的冷数据）。"""
+        def loop():
+            while True:
+                try:
+                    for learner, moved in self.archive_cold_days(keep_days):
+                        if moved:
+                            print(f'[progress] {learner}: 归档 {moved} 天')
+                except Exception as e:
+                    print(f'[progress] archive failed: {e}')
+                time.sleep(interval)
+        threading.Thread(target=loop, name='progress-archiver', daemon=True).start()
+
+    def migrate_schema(self) -> list:
+        """把所有学习者的 progress.json 升级到当前结构版本，返回 [(学习者, 原版本, 新版本)]。"""
+        results = []
+        for learner in self.learners():
+            path = PROGRESS_FILE if learner == DEFAULT_LEARNER else self.paths(learner)['json']
+            store = self.get(learner)
+            with store.lock, store._exclusive():
+                result = migrate_progress_file(path)
+            if result:
+                results.append((learner, *result))
+        return results
+
+
+learner_stores = LearnerStores(progress_store)
+
+
+def read_progress():
+    return progress_store.get()
+
+
+def write_progress(data: dict) -> None:
+    progress_store.save(data)
+
+
+def ensure_day(data: dict, day_key: str) -> dict:
+    # 加载时已升级到最新结构（见 migrate_progress），已有的天一定包含全部键
+    d = data['days'].get(day_key)
+    if d is None:
+        d = data['days'][day_key] = _empty_day()
+    return d
+
+
+def peek_day(data: dict, day_key: str, store: 'ProgressStore' = None) -> dict:
+    """只读取某天数据（给出 store 时包括已归档的天）；不存在时返回空结构，不写入常驻数据。"""
+    d = store.day(data, day_key) if store is not None else (data.get('days') or {}).get(day_key)
+    if not isinstance(d, dict):
+        return _empty_day()
+    return d
+
+
+def _parse_kind(value) -> str:
+    kind = (value or 'task').strip().lower()
+    return kind if kind in ('task', 'learn') else 'task'
+
+
+def _conditional_json(etag: str, build):
+    """强 ETag 命中时直接 304，否则调用 build() 生成 JSON；浏览器缓存但每次都需要验证。"""
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+
+def _request_learner(payload=None) -> str:
+    """学习者 id：?learner=、请求体中的 learner 字段或 X-Learner 头，都没有时为默认学习者。"""
+    learner = (request.args.get('learner') or (payload or {}).get('learner')
+               or request.headers.get('X-Learner') or DEFAULT_LEARNER)
+    if not LearnerStores.valid(learner):
+        raise ValueError('invalid_learner')
+    return learner
+
+
+@app.get('/api/learners')
+def list_learners():
+    return jsonify({ 'ok': True, 'learners': learner_stores.learners(), 'default': DEFAULT_LEARNER })
+
+
+@app.get('/api/progress/<day_key>')
+def get_progress(day_key: str):
+    try:
+        learner = _request_learner()
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    store = learner_stores.find(learner) or learner_stores.empty
+    with store.lock:
+        data = store.get()
+        version = data['dayVersions'].get(day_key, 0)
+        etag = f"{learner}-{store.epoch}-{day_key}-{version}"
+        return _conditional_json(etag, lambda: {
+            'ok': True, 'day': peek_day(data, day_key, store), 'dayKey': day_key, 'version': version })
+
+
+PROGRESS_BATCH_MAX = 200  # 单次批量提交的变更条数上限
+
+
+def _parse_mutation(op: str, payload: dict) -> dict:
+    """把请求体转换为变更记录；缺少或无法解析必填字段时抛出 ValueError(错误码)。"""
+    try:
+        return _build_mutation(op, payload)
+    except (TypeError, ValueError) as e:
+        if e.args and e.args[0] in ('missing_fields', 'missing_day', 'unknown_op'):
+            raise
+        raise ValueError('invalid_fields')
+
+
+def _build_mutation(op: str, payload: dict) -> dict:
+    day_key = str(payload.get('day') or '')
+    if op == 'recording':
+        m = { 'op': 'recording', 'day': day_key, 'kind': _parse_kind(payload.get('kind')),
+              'wordId': str(payload.get('wordId') or ''), 'url': str(payload.get('url') or ''),
+              'score': float(payload.get('score') or 0), 'ts': int(payload.get('ts') or 0),
+              'transcript': payload.get('transcript') or '' }
+        if not day_key or not m['wordId'] or not m['url']:
+            raise ValueError('missing_fields')
+        return m
+    if op == 'submit-word':
+        m = { 'op': 'submit-word', 'day': day_key, 'kind': _parse_kind(payload.get('kind')),
+              'wordId': str(payload.get('wordId') or ''),
+              'ts': int(payload.get('ts') or 0) or int(datetime.now().timestamp() * 1000) }
+        if not day_key or not m['wordId']:
+            raise ValueError('missing_fields')
+        return m
+    if op == 'complete-task':
+        if not day_key:
+            raise ValueError('missing_day')
+        return { 'op': 'complete-task', 'day': day_key, 'taskAvgScore': float(payload.get('taskAvgScore') or 0) }
+    raise ValueError('unknown_op')
+
+
+def _submit_throttled(learner: str, m: dict) -> bool:
+    # 限流：同一学习者同一 (day, word, kind) 1 秒内重复提交忽略
+    return rate_limiter.dedup(f"submit|{learner}|{m['day']}|{m['kind']}|{m['wordId']}", scope='submit-word')
+
+
+@app.post('/api/progress/recording')
+def post_progress_recording():
+    payload = request.get_json(silent=True) or {}
+    try:
+        learner = _request_learner(payload)
+        m = _parse_mutation('recording', payload)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    extra = learner_stores.get(learner).mutate([m])[0]
+    return jsonify({ 'ok': True, **extra })
+
+
+@app.post('/api/progress/submit-word')
+def post_progress_submit_word():
+    payload = request.get_json(silent=True) or {}
+    try:
+        learner = _request_learner(payload)
+        m = _parse_mutation('submit-word', payload)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    if _submit_throttled(learner, m):
+        return jsonify({ 'ok': True, 'throttled': True })
+    learner_stores.get(learner).mutate([m])
+    return jsonify({ 'ok': True })
+
+
+@app.post('/api/progress/complete-task')
+def post_progress_complete_task():
+    payload = request.get_json(silent=True) or {}
+    try:
+        learner = _request_learner(payload)
+        m = _parse_mutation('complete-task', payload)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    learner_stores.get(learner).mutate([m])
+    return jsonify({ 'ok': True })
+
+
+@app.post('/api/progress/batch')
+def post_progress_batch():
+    """按顺序批量应用 recording / submit-word / complete-task，一次读取、一次持久化。
+
+    请求体：{ "learner": "...", "mutations": [ { "op": "recording", "day": ..., ... }, ... ] }
+    任一条校验失败则整批拒绝；去重与“仅保留最近 3 条”规则与单条接口一致。
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        learner = _request_learner(payload)
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    items = payload.get('mutations')
+    if not isinstance(items, list) or not items:
+        return jsonify({ 'ok': False, 'error': 'missing_mutations' }), 400
+    if len(items) > PROGRESS_BATCH_MAX:
+        return jsonify({ 'ok': False, 'error': 'too_many_mutations' }), 400
+    mutations = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({ 'ok': False, 'error': 'invalid_mutation', 'index': idx }), 400
+        try:
+            mutations.append(_parse_mutation(str(item.get('op') or ''), item))
+        except ValueError as e:
+            return jsonify({ 'ok': False, 'error': str(e), 'index': idx }), 400
+    results = [None] * len(mutations)
+    pending = []
+    for idx, m in enumerate(mutations):
+        if m['op'] == 'submit-word' and _submit_throttled(learner, m):
+            results[idx] = { 'ok': True, 'throttled': True }
+        else:
+            pending.append(idx)
+    if pending:
+        extras = learner_stores.get(learner).mutate([mutations[idx] for idx in pending])
+        for idx, extra in zip(pending, extras):
+            results[idx] = { 'ok': True, **extra }
+    return jsonify({ 'ok': True, 'results': results })
+
+
+@app.get('/api/progress')
+def get_all_progress():
+    # ?since=<version>：只返回该版本之后有变化的天
+    try:
+        since = int(request.args.get('since') or 0)
+    except ValueError:
+        return jsonify({ 'ok': False, 'error': 'invalid_since' }), 400
+    try:
+        learner = _request_learner()
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    store = learner_stores.find(learner) or learner_stores.empty
+    with store.lock:
+        data = store.get()
+        version = data['version']
+        etag = f"{learner}-{store.epoch}-{version}-{since}"
+
+        def build():
+            keys = None
+            if since > 0:
+                keys = [k for k, v in data['dayVersions'].items() if v > since]
+            # 已归档的天按需从分段读取（since 增量同步通常只涉及热数据）
+            days = dict(store.iter_days(data, keys))
+            # 返回所有（或有变化的）天的进度；epoch 变化说明数据被整体替换，客户端应放弃 since 做全量同步
+            return { 'ok': True, 'days': days, 'version': version, 'since': since,
+                     'epoch': data.get('progressId') or '' }
+        return _conditional_json(etag, build)
+
+
+@app.get('/api/stats')
+def get_progress_stats():
+    """增量维护的进度聚合，耗时与历史总天数无关。
+
+    参数：kind=task|learn，from / to=YYYY-MM-DD（闭区间，可省略），learner，
+    words=all 或逗号分隔的单词 id（附带跨天累计的单词统计），today=YYYY-MM-DD（计算连续天数用，默认服务器日期）
+    """
+    try:
+        learner = _request_learner()
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    kind = _parse_kind(request.args.get('kind'))
+    start = request.args.get('from') or None
+    end = request.args.get('to') or None
+    today = request.args.get('today') or None
+    words = (request.args.get('words') or '').strip()
+    if today and not re.fullmatch(r'\d{4}-\d{2}-\d{2}', today):
+        return jsonify({ 'ok': False, 'error': 'invalid_today' }), 400
+    store = learner_stores.find(learner) or learner_stores.empty
+    with store.lock:
+        data = store.get()
+        stats = store.stats
+        version = data['version']
+        query = hashlib.sha1(request.query_string).hexdigest()[:12]
+        # 连续天数依赖“今天”，日期变化后 ETag 也要变化
+        etag = f"{learner}-{store.epoch}-{version}-{today or datetime.now().strftime('%Y%m%d')}-{query}"
+
+        def build():
+            days = stats.days(kind, start, end)
+            totals = { 'days': 0, 'submitted': 0, 'recordings': 0, 'scoreSum': 0.0, 'bestScore': 0.0, 'lastTs': 0 }
+            for row in days:
+                if row['recordings'] or row['submitted']:
+                    totals['days'] += 1
+                for key in ('submitted', 'recordings', 'scoreSum'):
+                    totals[key] += row[key]
+                totals['bestScore'] = max(totals['bestScore'], row['bestScore'])
+                totals['lastTs'] = max(totals['lastTs'], row['lastTs'])
+            totals['scoreSum'] = round(totals['scoreSum'], 4)
+            totals['avgScore'] = round(totals['scoreSum'] / totals['recordings'], 4) if totals['recordings'] else 0
+            out = { 'ok': True, 'learner': learner, 'kind': kind, 'from': start, 'to': end, 'version': version,
+                    'days': days, 'totals': totals, 'allTime': stats.totals(kind), 'streak': stats.streak(kind, today) }
+            if words:
+                ids = stats.word_ids(kind) if words == 'all' else [w for w in words.split(',') if w]
+                out['words'] = { w: stats.word(kind, w) for w in ids }
+            return out
+        return _conditional_json(etag, build)
+
+
+# ---- 单词目录：words.csv 常驻内存，按 id / 前缀 / 子串检索 ----
+
+WORDS_FILE = os.path.join(DATA_DIR, 'words.csv')
+WORDS_PAGE_DEFAULT = 50
+WORDS_PAGE_MAX = 500
+WORDS_SEARCH_FIELDS = ('en', 'cn', 'pinyin')
+
+
+def _fold_pinyin(text: str) -> str:
+    """去声调、去空格并小写：píng guǒ / pingguo / Ping Guo 都归一为 pingguo。"""
+    s = unicodedata.normalize('NFD', text or '')
+    return ''.join(ch for ch in s if ch.isalnum() and not unicodedata.combining(ch)).lower()
+
+
+def _search_key(field: str, text: str) -> str:
+    text = (text or '').strip()
+    if field == 'pinyin':
+        return _fold_pinyin(text)
+    return text.lower()
+
+
+class WordsIndex:
+    """words.csv 某一版本的只读快照：紧凑记录（按列存元组）+ 检索索引。
+
+    - by_id：id -> 记录下标
+    - 前缀索引：每个字段一份按检索键排序的 (键, 下标) 列表，用 bisect 取区间
+    - 子串索引：每个字段的单字/双字 gram 倒排表，取交集后再逐条核对
+    """
+
+    def __init__(self, columns: list, records: list, version: str):
+        self.columns = columns
+        self.records = records
+        self.version = version
+        self.by_id = { r[0]: i for i, r in enumerate(records) }
+        self._prefix = {}
+        self._grams = {}
+        for field in WORDS_SEARCH_FIELDS:
+            col = columns.index(field) if field in columns else None
+            keys = [_search_key(field, r[col]) if col is not None else '' for r in records]
+            pairs = sorted((k, i) for i, k in enumerate(keys) if k)
+            self._prefix[field] = ([k for k, _ in pairs], [i for _, i in pairs], keys)
+            grams = {}
+            for i, k in enumerate(keys):
+                for g in { k[j:j + n] for n in (1, 2) for j in range(len(k) - n + 1) }:
+                    grams.setdefault(g, []).append(i)
+            self._grams[field] = grams
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'WordsIndex':
+        with open(path, 'rb') as f:
+            raw = f.read()
+        text = raw.decode('utf-8-sig')
+        # 与前端 words_loader.js 一致：忽略空行和 # 注释行，没有 en 的行不收录
+        lines = [l for l in text.splitlines() if l.strip() and not l.strip().startswith('#')]
+        reader = csv.reader(lines)
+        header = [h.strip() for h in next(reader, [])]
+        columns = ['id'] + [h for h in header if h and h != 'id']
+        records = []
+        seen = set()
+        for n, row in enumerate(reader, 1):
+            item = { h: (row[i].strip() if i < len(row) else '') for i, h in enumerate(header) if h }
+            if not item.get('en'):
+                continue
+            try:
+                wid = int(item.get('id') or n)
+            except ValueError:
+                wid = n
+            if wid in seen:
+                continue
+            seen.add(wid)
+            records.append((wid,) + tuple(item.get(c, '') for c in columns[1:]))
+        return cls(columns, records, hashlib.sha256(raw).hexdigest()[:16])
+
+    def item(self, idx: int) -> dict:
+        return dict(zip(self.columns, self.records[idx]))
+
+    def prefix(self, field: str, key: str) -> list:
+        keys, idxs, _ = self._prefix[field]
+        lo = bisect.bisect_left(keys, key)
+        hi = bisect.bisect_right(keys, key + '\uffff')
+        return idxs[lo:hi]
+
+    def substring(self, field: str, key: str) -> list:
+        grams = self._grams[field]
+        n = min(2, len(key))
+        postings = sorted((grams.get(key[j:j + n], []) for j in range(len(key) - n + 1)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+        keys = self._prefix[field][2]
+        return sorted(i for i in candidates if key in keys[i])
+
+    def search(self, q: str, field: str = 'all', mode: str = 'substring') -> list:
+        """返回命中的记录下标：先前缀命中（按检索键排序），再其余子串命中（按出现顺序）。"""
+        fields = WORDS_SEARCH_FIELDS if field == 'all' else (field,)
+        out = []
+        seen = set()
+        passes = ('prefix',) if mode == 'prefix' else ('prefix', 'substring')
+        for kind in passes:
+            for f in fields:
+                key = _search_key(f, q)
+                if not key:
+                    continue
+                for i in (self.prefix(f, key) if kind == 'prefix' else self.substring(f, key)):
+                    if i not in seen:
+                        seen.add(i)
+                        out.append(i)
+        return out
+
+
+class WordsCatalog:
+    """常驻内存的单词目录；words.csv 的 mtime/大小变化时整体重建索引并原子替换快照。
+
+    与 ProgressStore 一样，文件检查最多每 stat_interval 秒一次。
+    """
+
+    def __init__(self, path: str, stat_interval: float = 1.0):
+        self.path = path
+        self.stat_interval = stat_interval
+        self._index = None
+        self._sig = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> WordsIndex:
+        now = time.monotonic()
+        index = self._index
+        if index is not None and now - self._checked_at < self.stat_interval:
+            return index
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.stat_interval:
+                return self._index
+            try:
+                st = os.stat(self.path)
+                sig = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                sig = None
+            if self._index is None or sig != self._sig:
+                self._index = WordsIndex.from_csv(self.path) if sig else WordsIndex(['id'], [], 'empty')
+                self._sig = sig
+            self._checked_at = time.monotonic()
+            return self._index
+
+
+words_catalog = WordsCatalog(WORDS_FILE)
+
+
+def _page_args():
+    try:
+        offset = max(0, int(request.args.get('offset') or 0))
+        limit = int(request.args.get('limit') or WORDS_PAGE_DEFAULT)
+    except ValueError:
+        return None
+    return offset, max(1, min(limit, WORDS_PAGE_MAX))
+
+
+def _words_page(index: WordsIndex, idxs: list, offset: int, limit: int, **extra) -> dict:
+    return {
+        'ok': True, 'total': len(idxs), 'offset': offset, 'limit': limit, 'version': index.version,
+        'items': [index.item(i) for i in idxs[offset:offset + limit]], **extra }
+
+
+@app.get('/api/words')
+def list_words():
+    # ?ids=1,2,3 只取指定单词（按给定顺序），否则按 offset/limit 分页
+    page = _page_args()
+    if page is None:
+        return jsonify({ 'ok': False, 'error': 'invalid_page' }), 400
+    offset, limit = page
+    index = words_catalog.current()
+    ids_arg = (request.args.get('ids') or '').strip()
+    if ids_arg:
+        try:
+            ids = [int(x) for x in ids_arg.split(',') if x.strip()]
+        except ValueError:
+            return jsonify({ 'ok': False, 'error': 'invalid_ids' }), 400
+        idxs = [index.by_id[i] for i in ids if i in index.by_id]
+    else:
+        idxs = range(len(index.records))
+    etag = f"{index.version}-" + hashlib.sha256(f"{ids_arg}\0{offset}\0{limit}".encode('utf-8')).hexdigest()[:16]
+    return _conditional_json(etag, lambda: _words_page(index, idxs, offset, limit))
+
+
+@app.get('/api/words/search')
+def search_words():
+    """?q=关键字&field=all|en|cn|pinyin&mode=substring|prefix；拼音可不带声调和空格。"""
+    q = (request.args.get('q') or '').strip()
+    field = (request.args.get('field') or 'all').strip().lower()
+    mode = (request.args.get('mode') or 'substring').strip().lower()
+    page = _page_args()
+    if not q:
+        return jsonify({ 'ok': False, 'error': 'missing_q' }), 400
+    if field not in ('all',) + WORDS_SEARCH_FIELDS or mode not in ('substring', 'prefix') or page is None:
+        return jsonify({ 'ok': False, 'error': 'invalid_args' }), 400
+    offset, limit = page
+    index = words_catalog.current()
+    etag = f"{index.version}-" + hashlib.sha256(f"{q}\0{field}\0{mode}\0{offset}\0{limit}".encode('utf-8')).hexdigest()[:16]
+    return _conditional_json(etag, lambda: _words_page(
+        index, index.search(q, field, mode), offset, limit, q=q, field=field, mode=mode))
+
+
+# ---- 进度导出：逐天流式生成 CSV / NDJSON，可连同录音打包为 zip ----
+
+EXPORT_COLUMNS = ['kid', 'day', 'wordId', 'word', 'score', 'transcript', 'audioUrl', 'kind', 'ts']
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+
+def iter_export_rows(learner: str, start: str = None, end: str = None, kinds=('task', 'learn')):
+    """按日期顺序逐条产出录音行（word 列取自单词目录）。
+
+    每天只在进度锁内复制当天的录音列表，锁外再交给调用方，服务端内存与历史长度无关；
+    导出期间的写入不受影响，已导出的天不会再变化。
+    """
+    store = learner_stores.find(learner)
+    if store is None:
+        return
+    with store.lock:
+        day_keys = [k for k in store.day_keys(store.get()) if (not start or k >= start) and (not end or k <= end)]
+    index = words_catalog.current()
+    en_col = index.columns.index('en') if 'en' in index.columns else None
+    for day_key in day_keys:
+        # 每天重新取分片：导出较久时分片可能已被换出并重新打开
+        store = learner_stores.get(learner)
+        with store.lock:
+            day = store.day(store.get(), day_key)
+            if not day:
+                continue
+            batch = [(kind, word_id, list(recs or []))
+                     for kind in kinds for word_id, recs in ((day.get(kind) or {}).get('recordings') or {}).items()]
+        for kind, word_id, recs in batch:
+            try:
+                idx = index.by_id.get(int(word_id))
+            except ValueError:
+                idx = None
+            word = index.records[idx][en_col] if idx is not None and en_col is not None else ''
+            for r in recs:
+                if r:
+                    yield { 'kid': learner, 'day': day_key, 'wordId': word_id, 'word': word, 'score': r.get('score') or 0,
+                            'transcript': r.get('transcript') or '', 'audioUrl': r.get('url') or '', 'kind': kind,
+                            'ts': r.get('ts') or 0 }
+
+
+def iter_export_chunks(rows, fmt: str):
+    """把行编码为约 EXPORT_FLUSH_BYTES 大小的字节块。"""
+    buf = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(buf, lineterminator='\n')
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        if writer is not None:
+            writer.writerow([row[c] for c in EXPORT_COLUMNS])
+        else:
+            buf.write(json.dumps(row, ensure_ascii=False) + '\n')
+        if buf.tell() >= EXPORT_FLUSH_BYTES:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+class _ZipSink(io.RawIOBase):
+    """zipfile 的只写输出：不可 seek，zipfile 因此改用数据描述符逐项流式写出；写入的字节由生成器取走。"""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.buf += b
+        return len(b)
+
+    def take(self) -> bytes:
+        out = bytes(self.buf)
+        self.buf.clear()
+        return out
+
+
+def iter_export_zip(make_rows, fmt: str, name: str):
+    """zip 流：先写导出文件，再按第二遍遍历的顺序写入引用到的录音（不压缩，位于 records/ 下）。"""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w') as zf:
+        info = zipfile.ZipInfo(name, datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zf.open(info, 'w', force_zip64=True) as dst:
+            for chunk in iter_export_chunks(make_rows(), fmt):
+                dst.write(chunk)
+                yield sink.take()
+        yield sink.take()
+        day, seen = None, set()
+        for row in make_rows():
+            if row['day'] != day:
+                # 录音文件名带日期，只需在当天内去重
+                day, seen = row['day'], set()
+            url = row['audioUrl']
+            path = resolve_record(url) if url.startswith('assets/records/') and url not in seen else None
+            seen.add(url)
+            if not path:
+                continue
+            info = zipfile.ZipInfo.from_file(path, 'records/' + url[len('assets/records/'):])
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as src, zf.open(info, 'w') as dst:
+                for chunk in iter(lambda: src.read(EXPORT_FLUSH_BYTES), b''):
+                    dst.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+@app.get('/api/export')
+def export_progress():
+    """流式导出录音记录，边生成边发送（分块传输），不在内存中拼出整个文件。
+
+    参数：format=csv|ndjson，from / to=YYYY-MM-DD（闭区间，可省略），kind=task|learn（默认两者），
+    learner，zip=1（连同引用到的录音打包为 zip）
+    """
+    fmt = (request.args.get('format') or 'csv').strip().lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({ 'ok': False, 'error': 'invalid_format' }), 400
+    try:
+        learner = _request_learner()
+    except ValueError as e:
+        return jsonify({ 'ok': False, 'error': str(e) }), 400
+    start = request.args.get('from') or None
+    end = request.args.get('to') or None
+    if any(v and not re.fullmatch(r'\d{4}-\d{2}-\d{2}', v) for v in (start, end)):
+        return jsonify({ 'ok': False, 'error': 'invalid_date' }), 400
+    kinds = (_parse_kind(request.args.get('kind')),) if request.args.get('kind') else ('task', 'learn')
+    as_zip = request.args.get('zip') in ('1', 'true')
+
+    def make_rows():
+        return iter_export_rows(learner, start, end, kinds)
+    name = f"progress-{learner}" + (f"-{start or ''}_{end or ''}" if start or end else '') + f".{fmt}"
+    if as_zip:
+        body, mimetype = iter_export_zip(make_rows, fmt, name), 'application/zip'
+        name += '.zip'
+    else:
+        body = iter_export_chunks(make_rows(), fmt)
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    resp = app.response_class(body, mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+# ---- 录音后处理：去首尾静音、响度归一化、转为 Opus ----
+
+AUDIO_FILTER = (
+    'silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.05,'
+    'areverse,silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.05,areverse,'
+    'loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json'
+)
+AUDIO_OPUS_ARGS = ['-ac', '1', '-ar', '48000', '-c:a', 'libopus', '-b:a', '24k', '-application', 'voip']
+PROCESSED_SUFFIX = '.opus.webm'
+
+
+def processed_record_name(filename: str) -> str:
+    if filename.endswith(PROCESSED_SUFFIX):
+        return filename
+    return filename.rsplit('.', 1)[0] + PROCESSED_SUFFIX
+
+
+def process_audio_file(src: str, dst: str, ffmpeg: str = None) -> dict:
+    """用 ffmpeg 处理单个录音文件并写入 dst，返回时长与响度等元数据。"""
+    ffmpeg = ffmpeg or shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError('ffmpeg not found')
+    tmp = f"{dst}.tmp.webm"
+    cmd = [ffmpeg, '-hide_banner', '-nostdin', '-y', '-i', src, '-vn', '-af', AUDIO_FILTER, *AUDIO_OPUS_ARGS, tmp]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=120)
+    err = proc.stderr.decode('utf-8', 'replace')
+    if proc.returncode != 0 or not os.path.isfile(tmp):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise RuntimeError(f'ffmpeg failed: {err.strip().splitlines()[-1:] }')
+    os.replace(tmp, dst)
+    meta = { 'bytes': os.path.getsize(dst), 'rawBytes': os.path.getsize(src) }
+    # 处理后的时长取最后一条进度输出中的 time=
+    times = re.findall(r'time=(\d+):(\d+):(\d+(?:\.\d+)?)', err)
+    if times:
+        h, mi, sec = times[-1]
+        meta['durationMs'] = int(round((int(h) * 3600 + int(mi) * 60 + float(sec)) * 1000))
+    # loudnorm 在结尾打印一段 JSON：输入/输出响度
+    found = re.search(r'\{[^{}]*"input_i"[^{}]*\}', err)
+    if found:
+        try:
+            stats = json.loads(found.group(0))
+        except ValueError:
+            stats = {}
+        # 全程静音时响度为 -inf，JSON 无法表示，直接省略
+        for key, field in (('loudnessLufs', 'output_i'), ('inputLoudnessLufs', 'input_i')):
+            try:
+                value = float(stats.get(field))
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(value):
+                meta[key] = value
+    return meta
+
+
+class AudioPipeline:
+    """录音后台处理：上传接口只入队并立即返回，由工作线程池调用 ffmpeg 处理。
+
+    处理完成后：若进度中已有这条录音，则把播放地址切换为压缩版本；
+    若进度稍后才提交，则由 ProgressStore 的预处理钩子在写入时直接替换。
+    是否已处理以磁盘上的压缩文件为准，重启后或由其他工作进程（--workers N）处理的录音同样生效。
+    未安装 ffmpeg 时整个流水线不启用，录音保持原样。
+    """
+
+    def __init__(self, records_dir: str, max_queue: int = 1000, remember: int = 2000):
+        self.records_dir = records_dir
+        self.ffmpeg = None
+        self.processed = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._done = {}  # 原始 url -> 元数据（时长/响度），只保留最近 remember 条；仅用于补充元数据
+        self._remember = remember
+
+    @property
+    def enabled(self) -> bool:
+        return self.ffmpeg is not None
+
+    def start(self, workers: int) -> bool:
+        if workers <= 0:
+            return False
+        self.ffmpeg = shutil.which('ffmpeg')
+        if not self.ffmpeg:
+            print('[audio] 未找到 ffmpeg，录音后处理未启用')
+            return False
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f'audio-worker-{i}', daemon=True)
+            t.start()
+        return True
+
+    def submit(self, filename: str, learner: str = DEFAULT_LEARNER) -> None:
+        if not self.enabled or filename.endswith(PROCESSED_SUFFIX):
+            return
+        try:
+            self._queue.put_nowait((filename, learner))
+        except queue.Full:
+            print(f'[audio] queue full, skip {filename}')
+
+    def attach(self, m: dict) -> dict:
+        """ProgressStore 预处理钩子：磁盘上已有压缩版本时，写入的就是压缩版本地址。"""
+        url = m.get('url') if m.get('op') == 'recording' else None
+        if not url or not url.startswith('assets/records/') or url.endswith(PROCESSED_SUFFIX) or m.get('rawUrl'):
+            return m
+        path = resolve_record(processed_record_name(url.rsplit('/', 1)[-1]))
+        if not path:
+            return m
+        meta = self._done.get(url)
+        if meta is None:
+            # 本进程没处理过（重启前或其他工作进程处理的）：只能给出文件大小
+            try:
+                meta = { 'bytes': os.path.getsize(path) }
+            except OSError:
+                return m
+        processed_url = 'assets/' + os.path.relpath(path, ASSETS_DIR).replace(os.sep, '/')
+        return { **m, 'rawUrl': url, 'processedUrl': processed_url, 'audio': meta }
+
+    def _worker(self) -> None:
+        while True:
+            filename, learner = self._queue.get()
+            try:
+                self.process(filename, learner)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f'[audio] {filename}: {e}')
+            finally:
+                self._queue.task_done()
+
+    def process(self, filename: str, learner: str = DEFAULT_LEARNER) -> dict:
+        src = resolve_record(filename) or os.path.join(self.records_dir, filename)
+        dst = os.path.join(os.path.dirname(src), processed_record_name(filename))
+        meta = process_audio_file(src, dst, self.ffmpeg)
+        raw_url = 'assets/' + os.path.relpath(src, ASSETS_DIR).replace(os.sep, '/')
+        processed_url = 'assets/' + os.path.relpath(dst, ASSETS_DIR).replace(os.sep, '/')
+        self._done[raw_url] = meta
+        while len(self._done) > self._remember:
+            self._done.pop(next(iter(self._done)), None)
+        store = learner_stores.find(learner)
+        if store is None:
+            return meta
+        # 压缩文件已落盘后才查找：此后提交的进度由 attach 直接写入压缩地址；
+        # 查找在进程锁内进行，与其他工作进程的“attach + 提交”互斥，不会两边都错过
+        with store.lock, store._exclusive():
+            loc = _find_recording(store._get_exclusive(), raw_url)
+        if loc:
+            # 锁外调用 mutate：journal 模式下等待 fsync 时不占用进度锁
+            day_key, kind, word_id = loc
+            store.mutate([{ 'op': 'audio-processed', 'day': day_key, 'kind': kind, 'wordId': word_id,
+                            'url': raw_url, 'processedUrl': processed_url, 'audio': meta }])
+        return meta
+
+
+def _find_recording(data: dict, url: str):
+    """按 url 查找录音所在位置 (day, kind, wordId)；从最近的日期开始找。"""
+    days = data.get('days') or {}
+    for day_key in sorted(days, reverse=True):
+        for kind in ('task', 'learn'):
+            for word_id, recs in ((days[day_key].get(kind) or {}).get('recordings') or {}).items():
+                if any(r and r.get('url') == url for r in recs or []):
+                    return day_key, kind, word_id
+    return None
+
+
+def canonical_record_url(m: dict) -> dict:
+    """ProgressStore 预处理钩子：离线期间排队的旧平铺地址，若文件已迁到分片目录则改写为新地址。"""
+    url = m.get('url') if m.get('op') == 'recording' else None
+    if not url or not url.startswith('assets/records/') or '/' in url[len('assets/records/'):]:
+        return m
+    name = url[len('assets/records/'):]
+    if record_relpath(name) == name or os.path.isfile(os.path.join(RECORDS_DIR, name)):
+        return m
+    if not resolve_record(name):
+        return m
+    return { **m, 'url': record_url(name) }
+
+
+audio_pipeline = AudioPipeline(RECORDS_DIR)
+progress_store.preprocessors.append(canonical_record_url)
+progress_store.preprocessors.append(audio_pipeline.attach)
+
+
+def iter_record_files(root: str):
+    """逐个产出录音文件的 DirEntry（含日期分片子目录），跳过 .partial 等以点开头的目录和文件。"""
+    try:
+        it = os.scandir(root)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_record_files(entry.path)
+            elif entry.is_file():
+                yield entry
+
+
+def process_records_offline(names: list, out_dir: str) -> int:
+    """离线处理 assets/records 下的录音（不修改进度），打印每个文件的元数据。"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        print('未找到 ffmpeg，请先安装并加入 PATH')
+        return 2
+    os.makedirs(out_dir, exist_ok=True)
+    names = names or sorted(e.name for e in iter_record_files(RECORDS_DIR)
+                            if e.name.endswith('.webm') and not e.name.endswith(PROCESSED_SUFFIX))
+    failed = 0
+    for name in names:
+        src = name if os.path.isfile(name) else (resolve_record(name) or os.path.join(RECORDS_DIR, name))
+        dst = os.path.join(out_dir, processed_record_name(os.path.basename(src)))
+        try:
+            meta = process_audio_file(src, dst, ffmpeg)
+            print(f"{os.path.basename(src)}: {meta.get('rawBytes')} -> {meta.get('bytes')} bytes, "
+                  f"{meta.get('durationMs', '?')} ms, {meta.get('loudnessLufs', '?')} LUFS")
+        except Exception as e:
+            failed += 1
+            print(f'{os.path.basename(src)}: 处理失败 {e}')
+    return 1 if failed else 0
+
+
+# ---- 录音清理：删除或归档不再被进度引用的录音 ----
+
+RECORDS_ARCHIVE_DIR = os.path.join(DATA_DIR, 'records_archive')
+RECORDS_GRACE_SECONDS = 7 * 86400  # 上传后多久仍未被进度引用才视为孤立
+RECORDS_SWEEP_BATCH = 500          # 每轮最多检查的目录项
+RECORDS_SWEEP_LOCK_FILE = os.path.join(DATA_DIR, 'records_sweep.lock')
+
+
+class RecordsSweeper:
+    """增量清理 assets/records。
+
+    - 引用索引按（学习者, 天）缓存：只有 dayVersions 变化的天才重新收集（url 与 rawUrl 都算引用），
+      某个学习者的进度被整体重新加载（epoch 变化）时重建该学习者的部分；已归档的天按分段整体计入
+    - 目录扫描跨轮次继续：每轮只从同一个遍历（含日期分片子目录）取 batch 项，扫完一遍再从头开始
+    - 压缩版本（.opus.webm）与原始录音互相保留：任一方被引用，另一方也不清理
+    - 只处理 grace 秒之前的文件，给“已上传、进度尚未提交”的录音留出时间；跳过 .partial 等目录
+    - 多进程部署时通过锁文件保证同一时间只有一个进程在清理
+    """
+
+    def __init__(self, records_dir: str, archive_dir: str, grace: float = RECORDS_GRACE_SECONDS,
+                 batch: int = RECORDS_SWEEP_BATCH, lock_path: str = RECORDS_SWEEP_LOCK_FILE):
+        self.records_dir = records_dir
+        self.archive_dir = archive_dir
+        self.grace = grace
+        self.batch = batch
+        self.mode = 'off'  # off / archive / delete
+        self._lock = InterProcessLock(lock_path)
+        self._epochs = {}       # 学习者 -> 建索引时的 epoch
+        self._day_refs = {}     # 学习者 -> { day -> (dayVersion, 该天引用的文件名集合) }
+        self._refs = Counter()  # 文件名 -> 引用它的天数
+        self._stems = Counter() # 去掉扩展名后的文件名 -> 次数，用于匹配压缩版本与原始录音
+        self._segments = {}     # 归档分段路径 -> 其中引用的文件名集合
+        self._scan = None
+        self._sweep_lock = threading.Lock()
+        self.totals = Counter()
+
+    @staticmethod
+    def _stem(name: str) -> str:
+        if name.endswith(PROCESSED_SUFFIX):
+            return name[:-len(PROCESSED_SUFFIX)]
+        return name.rsplit('.', 1)[0]
+
+    @staticmethod
+    def _day_names(day: dict) -> set:
+        names = set()
+        for kind in ('task', 'learn'):
+            for recs in ((day.get(kind) or {}).get('recordings') or {}).values():
+                for r in recs or []:
+                    for key in ('url', 'rawUrl'):
+                        url = (r or {}).get(key) or ''
+                        if url.startswith('assets/records/'):
+                            names.add(url.rsplit('/', 1)[-1])
+        return names
+
+    def _set_day(self, day_refs: dict, day_key: str, entry) -> None:
+        old = day_refs.pop(day_key, None)
+        if old:
+            self._refs.subtract(old[1])
+            self._stems.subtract(self._stem(n) for n in old[1])
+        if entry:
+            day_refs[day_key] = entry
+            self._refs.update(entry[1])
+            self._stems.update(self._stem(n) for n in entry[1])
+
+    def drop_learner(self, learner: str) -> None:
+        day_refs = self._day_refs.pop(learner, {})
+        for day_key in list(day_refs):
+            self._set_day(day_refs, day_key, None)
+        self._epochs.pop(learner, None)
+
+    def _segment_names(self, archive, name: str) -> set:
+        # 分段不可变：按文件缓存引用集合，不必随 epoch 变化重新解压
+        path = archive.path(name)
+        names = self._segments.get(path)
+        if names is None:
+            names = set()
+            for day in archive.load(name).values():
+                names |= self._day_names(day)
+            self._segments[path] = names
+        return names
+
+    def refresh_index(self, learner: str, epoch: str, data: dict, archive=None) -> None:
+        """调用方需持有该学习者的进度锁。已归档的每个分段作为一项（键为 archive:<文件名>）计入引用。"""
+        if self._epochs.get(learner) != epoch:
+            self.drop_learner(learner)
+            self._epochs[learner] = epoch
+        day_refs = self._day_refs.setdefault(learner, {})
+        days = data.get('days') or {}
+        versions = data.get('dayVersions') or {}
+        segments = { 'archive:' + e['file']: e['file'] for e in (data.get('archive') or {}).values() } if archive else {}
+        for day_key in [k for k in day_refs if k not in days and k not in segments]:
+            self._set_day(day_refs, day_key, None)
+        for key, name in segments.items():
+            if key not in day_refs:
+                self._set_day(day_refs, key, (name, self._segment_names(archive, name)))
+        for day_key, day in days.items():
+            version = versions.get(day_key, 0)
+            cached = day_refs.get(day_key)
+            if cached is None or cached[0] != version:
+                self._set_day(day_refs, day_key, (version, self._day_names(day) if isinstance(day, dict) else set()))
+
+    def refresh_all(self) -> None:
+        learners = learner_stores.learners()
+        for learner in [k for k in self._day_refs if k not in learners]:
+            self.drop_learner(learner)
+        for learner in learners:
+            store = learner_stores.get(learner)
+            with store.lock:
+                data = store.get()
+                self.refresh_index(learner, store.epoch, data, store.backend.archive)
+
+    def referenced(self, name: str) -> bool:
+        return self._refs[name] > 0 or self._stems[self._stem(name)] > 0
+
+    def _entries(self, limit):
+        if limit is None:
+            return list(iter_record_files(self.records_dir))
+        out = []
+        while len(out) < limit:
+            if self._scan is None:
+                self._scan = iter_record_files(self.records_dir)
+            entry = next(self._scan, None)
+            if entry is None:
+                self._scan = None
+                self.totals['cycles'] += 1
+                break
+            out.append(entry)
+        return out
+
+    def _dispose(self, entry, mtime: float) -> None:
+        if self.mode == 'delete':
+            os.remove(entry.path)
+            return
+        dst_dir = os.path.join(self.archive_dir, datetime.fromtimestamp(mtime).strftime('%Y-%m'))
+        os.makedirs(dst_dir, exist_ok=True)
+        shutil.move(entry.path, os.path.join(dst_dir, entry.name))
+
+    def sweep(self, apply: bool = True, limit=None) -> dict:
+        """检查一批目录项（limit=None 时检查全部）；apply=False 只生成报告不改动文件。"""
+        report = { 'scanned': 0, 'referenced': 0, 'young': 0, 'orphans': [], 'bytes': 0, 'errors': 0 }
+        if not os.path.isdir(self.records_dir):
+            return report
+        with self._sweep_lock:
+            # 先汇总所有学习者的引用，再扫描目录；扫描期间不持有任何进度锁
+            self.refresh_all()
+            now = time.time()
+            for entry in self._entries(limit):
+                try:
+                    if '.tmp' in entry.name or entry.name.endswith('.part'):
+                        continue
+                    report['scanned'] += 1
+                    if self.referenced(entry.name):
+                        report['referenced'] += 1
+                        continue
+                    st = entry.stat()
+                    if now - st.st_mtime < self.grace:
+                        report['young'] += 1
+                        continue
+                    if apply:
+                        self._dispose(entry, st.st_mtime)
+                    report['orphans'].append({ 'name': entry.name, 'bytes': st.st_size,
+                                               'ageDays': round((now - st.st_mtime) / 86400, 1) })
+                    report['bytes'] += st.st_size
+                except OSError:
+                    report['errors'] += 1
+        if apply:
+            self.totals['removed'] += len(report['orphans'])
+            self.totals['bytes'] += report['bytes']
+        return report
+
+    def start(self, interval: float) -> bool:
+        if self.mode == 'off':
+            return False
+        t = threading.Thread(target=self._loop, args=(interval,), name='records-sweeper', daemon=True)
+        t.start()
+        return True
+
+    def _loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            if not self._lock.acquire(blocking=False):
+                continue  # 其他进程正在清理
+            try:
+                report = self.sweep(limit=self.batch)
+                if report['orphans']:
+                    action = '删除' if self.mode == 'delete' else '归档'
+                    print(f"[records] {action} {len(report['orphans'])} 个孤立录音（{report['bytes']} 字节）")
+            except Exception as e:
+                print(f'[records] sweep failed: {e}')
+            finally:
+                self._lock.release()
+
+
+records_sweeper = RecordsSweeper(RECORDS_DIR, RECORDS_ARCHIVE_DIR)
+
+
+def print_sweep_report() -> int:
+    report = records_sweeper.sweep(apply=False)
+    for item in report['orphans']:
+        print(f"{item['name']}\t{item['bytes']}\t{item['ageDays']} 天")
+    print(f"共检查 {report['scanned']} 个录音：被引用 {report['referenced']}，"
+          f"未满保留期 {report['young']}，可清理 {len(report['orphans'])}（{report['bytes']} 字节）")
+    return 0
+
+
+# ---- 录音目录迁移：平铺 -> 按日期分片 ----
+
+def migrate_records_layout(apply: bool = True, batch: int = 200) -> dict:
+    """把平铺在 assets/records 下的录音移入 YYYY/MM/DD 分片目录，并改写进度中的地址。
+
+    可在服务运行时执行、可重复执行：先逐个 os.replace 移动文件（旧地址由 resolve_record 继续解析，
+    播放与删除不中断），再逐个学习者把进度中的 url / rawUrl 分批改写，每批只短暂持有该学习者的进度锁。
+    """
+    stats = { 'moved': 0, 'duplicates': 0, 'conflicts': 0, 'flat': 0, 'rewritten': 0 }
+    try:
+        names = sorted(e.name for e in os.scandir(RECORDS_DIR)
+                       if e.is_file() and not e.name.startswith('.') and not e.name.endswith(('.part', '.tmp')))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        rel = record_relpath(name)
+        if rel == name:
+            stats['flat'] += 1
+            continue
+        src = os.path.join(RECORDS_DIR, name)
+        dst = os.path.join(RECORDS_DIR, *rel.split('/'))
+        if os.path.exists(dst):
+            # 上一次迁移中断后留下的副本：内容一致才删除旧文件，否则留给人工处理
+            same = os.path.getsize(src) == os.path.getsize(dst)
+            stats['duplicates' if same else 'conflicts'] += 1
+            if apply and same:
+                os.remove(src)
+            continue
+        if apply:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(src, dst)
+        stats['moved'] += 1
+
+    for learner in learner_stores.learners():
+        store = learner_stores.get(learner)
+        with store.lock:
+            mutations = _relocate_mutations(store.get(), apply)
+        stats['rewritten'] += len(mutations)
+        if apply:
+            for i in range(0, len(mutations), max(1, batch)):
+                store.mutate(mutations[i:i + batch])
+    return stats
+
+
+def _relocate_mutations(data: dict, apply: bool) -> list:
+    mutations = []
+    for day_key, day in (data.get('days') or {}).items():
+        for kind in ('task', 'learn'):
+            for word_id, recs in ((day.get(kind) or {}).get('recordings') or {}).items():
+                moves = {}
+                for r in recs or []:
+                    for key in ('url', 'rawUrl'):
+                        url = (r or {}).get(key) or ''
+                        name = url[len('assets/records/'):]
+                        if not url.startswith('assets/records/') or '/' in name or record_relpath(name) == name:
+                            continue
+                        if not apply or os.path.isfile(os.path.join(RECORDS_DIR, *record_relpath(name).split('/'))):
+                            moves[url] = record_url(name)
+                if moves:
+                    mutations.append({ 'op': 'relocate-recordings', 'day': day_key, 'kind': kind,
+                                       'wordId': word_id, 'moves': moves })
+    return mutations
+
+
+# ---- 多进程部署：预先 fork 的工作进程共享同一监听 socket ----
+
+def serve_prefork(host: str, port: int, workers: int, on_worker_start=None) -> None:
+    """主进程只负责监听与看护，每个工作进程运行多线程 WSGI 服务（仅 POSIX）。
+
+    进度写入通过 progress.lock 跨进程互斥；意外退出的工作进程会被自动补上。
+    on_worker_start 在子进程中、开始处理请求前调用（后台线程、数据库连接不能跨 fork 继承）。
+    """
+    from werkzeug.serving import make_server
+
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                if on_worker_start:
+                    on_worker_start()
+                make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+            except BaseException as e:
+                print(f'[worker {os.getpid()}] 退出：{e!r}')
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f' * {workers} 个工作进程监听 http://{host}:{port}')
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f'[prefork] 工作进程 {pid} 退出，重新启动')
+            time.sleep(0.5)
+            spawn()
+    sock.close()
+
+
+def main():
+    global TRUST_PROXY
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=8080, type=int)
+    parser.add_argument('--persist', default='snapshot', choices=['snapshot', 'journal', 'sqlite'],
+                        help='进度持久化方式：snapshot 每次整文件写入；journal 追加日志 + 后台合并；sqlite 按单词行写入')
+    parser.add_argument('--compact-interval', default=30.0, type=float, help='journal 模式下日志合并间隔（秒）')
+    parser.add_argument('--db', default=PROGRESS_DB_FILE, help='sqlite 模式的数据库文件')
+    parser.add_argument('--migrate-sqlite', action='store_true', help='把 progress.json 一次性导入 --db 指定的 SQLite 后退出')
+    parser.add_argument('--migrate-schema', action='store_true',
+                        help='把各学习者的 progress.json 升级到当前结构版本后退出（snapshot/journal 模式启动时也会自动执行）')
+    parser.add_argument('--archive-after-days', default=0, type=int,
+                        help='把多少天之前的进度按月归档为压缩分段，常驻文档只保留最近的天（snapshot/journal 模式；0 表示关闭）')
+    parser.add_argument('--archive-cache', default=ARCHIVE_CACHE_SEGMENTS, type=int, help='内存中缓存的已解压归档分段数')
+    parser.add_argument('--archive-now', action='store_true', help='按 --archive-after-days 立即归档一次后退出')
+    parser.add_argument('--max-upload-mb', default=MAX_UPLOAD_BYTES / (1024 * 1024), type=float, help='单个录音上传大小上限（MB）')
+    parser.add_argument('--audio-workers', default=2, type=int, help='录音后处理线程数（需要 ffmpeg），0 表示关闭')
+    parser.add_argument('--process-audio', nargs='*', metavar='FILE', help='离线处理录音（默认 assets/records 下全部 .webm）后退出')
+    parser.add_argument('--audio-out', default=os.path.join(DATA_DIR, 'processed_records'), help='--process-audio 的输出目录')
+    parser.add_argument('--build-static', action='store_true', help='预压缩前端静态资源到 data/static_cache 后退出')
+    parser.add_argument('--workers', default=1, type=int, help='工作进程数；大于 1 时以多进程方式部署（仅 Linux/macOS）')
+    parser.add_argument('--rate-limit', default=f'{rate_limiter.rate:g}/{rate_limiter.burst:g}', metavar='RATE/BURST',
+                        help='每个客户端写接口的限流：每秒 RATE 次、最多突发 BURST 次；0 表示不限')
+    parser.add_argument('--metrics', action='store_true', help='记录请求延迟与内部阶段耗时，在 /metrics 以 Prometheus 文本格式输出')
+    parser.add_argument('--server-timing', action='store_true', help='在响应头 Server-Timing 中附带本次请求的阶段耗时（隐含 --metrics）')
+    parser.add_argument('--trust-proxy', action='store_true', help='总是按 X-Forwarded-For 区分客户端（反向代理不在本机时使用；本机代理默认已信任）')
+    parser.add_argument('--records-retention', default='off', choices=['off', 'archive', 'delete'],
+                        help='后台清理不再被进度引用的录音：archive 移到 data/records_archive，delete 直接删除')
+    parser.add_argument('--records-grace-days', default=RECORDS_GRACE_SECONDS / 86400, type=float,
+                        help='录音超过多少天仍未被引用才清理')
+    parser.add_argument('--sweep-interval', default=60.0, type=float, help='录音清理每轮间隔（秒），每轮最多检查 500 个文件')
+    parser.add_argument('--sweep-report', action='store_true', help='列出当前可清理的孤立录音（不做改动）后退出')
+    args = parser.parse_args()
+    try:
+        rate, _, burst = args.rate_limit.partition('/')
+        rate_limiter.rate = float(rate)
+        rate_limiter.burst = float(burst or max(1.0, rate_limiter.rate * 2))
+    except ValueError:
+        parser.error('--rate-limit 格式应为 RATE 或 RATE/BURST，例如 20/40')
+    TRUST_PROXY = args.trust_proxy
+    metrics.enabled = args.metrics or args.server_timing
+    metrics.server_timing = args.server_timing
+    if args.workers > 1 and args.persist == 'journal':
+        parser.error('journal 模式的日志只能由单个进程写入，请改用 --persist snapshot/sqlite 或 --workers 1')
+    if args.workers > 1 and not hasattr(os, 'fork'):
+        parser.error('--workers 需要 POSIX 系统（Linux/macOS）')
+    if args.build_static:
+        print(f'已预压缩 {static_assets.build()} 个静态资源到 {STATIC_CACHE_DIR}')
+        return
+    if args.process_audio is not None:
+        raise SystemExit(process_records_offline(args.process_audio, args.audio_out))
+    set_max_upload(int(args.max_upload_mb * 1024 * 1024))
+    archive_cache.capacity = args.archive_cache
+    if args.archive_after_days and args.persist == 'sqlite':
+        print('提示：sqlite 模式按单词行读写，不需要冷热分层，--archive-after-days 已忽略')
+        args.archive_after_days = 0
+        if args.archive_now:
+            return
+    if args.archive_now:
+        if args.archive_after_days <= 0:
+            parser.error('--archive-now 需要同时指定 --archive-after-days N（N > 0）')
+        learner_stores.set_persist(args.persist, args.db)
+        for learner, moved in learner_stores.archive_cold_days(args.archive_after_days):
+            print(f'[{learner}] 归档 {moved} 天')
+        return
+    records_sweeper.grace = args.records_grace_days * 86400
+    records_sweeper.mode = args.records_retention
+    if args.migrate_schema:
+        for learner, before, after in learner_stores.migrate_schema():
+            print(f'[{learner}] schemaVersion {before} -> {after}' if before != after else f'[{learner}] 已是最新（{after}）')
+        return
+    if args.migrate_sqlite:
+        stats = migrate_json_to_sqlite(args.db)
+        print(f"已导入 {stats['days']} 天、{stats['rows']} 条单词记录到 {args.db}")
+        for learner in learner_stores.learners():
+            p = learner_stores.paths(learner)
+            if learner != DEFAULT_LEARNER and os.path.isfile(p['json']):
+                stats = migrate_json_to_sqlite(p['db'], p['json'], p['journal'])
+                print(f"[{learner}] 已导入 {stats['days']} 天、{stats['rows']} 条单词记录到 {p['db']}")
+        return
+    if args.sweep_report:
+        learner_stores.set_persist(args.persist, args.db)
+        raise SystemExit(print_sweep_report())
+    if args.persist == 'sqlite' and not os.path.isfile(args.db) and os.path.isfile(PROGRESS_FILE):
+        print(f'提示：{args.db} 不存在，可先运行 python server.py --migrate-sqlite 导入现有 progress.json')
+    if args.persist != 'sqlite':
+        # 在 fork 工作进程之前一次性升级，之后的加载都直接信任数据结构
+        for learner, before, after in learner_stores.migrate_schema():
+            if before != after:
+                print(f'[progress] {learner}: schemaVersion {before} -> {after}')
+    print(f'[static] 预压缩 {static_assets.build()} 个静态资源')
+
+    def start_services():
+        learner_stores.set_persist(args.persist, args.db)
+        if args.workers > 1:
+            # 其他进程随时可能写入：每次读取都检查一次（一次 stat 或 PRAGMA data_version）
+            learner_stores.set_stat_interval(0)
+        if args.persist == 'journal':
+            learner_stores.start_maintenance(args.compact_interval)
+        audio_pipeline.start(args.audio_workers)
+        records_sweeper.start(args.sweep_interval)
+        if args.archive_after_days > 0:
+            learner_stores.start_archiver(args.archive_after_days)
+
+    if args.workers > 1:
+        serve_prefork(args.host, args.port, args.workers, start_services)
+        return
+    start_services()
+    app.run(host=args.host, port=args.port, debug=False)
+
+
+if __name__ == '__main__':
+    main()
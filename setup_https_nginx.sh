@@ -129,4 +129,6 @@ curl -I http://${DOMAIN} || true
 echo "Check HTTPS: "
 curl -I https://${DOMAIN} || true
 
-echo "Done. Open: https://${DOMAIN}/"
\ No newline at end of file
+echo "Done. Open: https://${DOMAIN}/"
+# 后端需监听 UPSTREAM 并按 X-Forwarded-For 区分学生（限流按客户端计数）
+echo "Start backend: python server.py --host ${UPSTREAM%:*} --port ${UPSTREAM##*:} --trust-proxy"
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""Benchmark progress GET latency before/after the versioned progress schema.
+
+Usage:
+  cd <project root>
+  python tools/bench_progress_schema.py
+  python tools/bench_progress_schema.py --days 3000 --words 30 --requests 50
+
+Behavior:
+- Writes a synthetic progress.json (--days days x --words words x 3 recordings, task and learn)
+  for a temporary learner in a temp directory; real data/ is never touched.
+- "before" replays the old load path: the legacy flat-structure scan plus eleven setdefault calls
+  per day on every (re)load. "after" is the current loader, which trusts schemaVersion.
+- GET /api/progress/<day> is measured through the Flask test client twice per mode:
+  cached (nothing changed) and after an external write (the file is touched before every
+  request, as happens with --workers N whenever another process commits).
+- Also reports the per-load normalization cost on its own (the JSON parse, which both modes
+  share, dominates a reload of a large file) and the one-time cost of migrating the same file
+  from schemaVersion 0.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import server  # noqa: E402
+
+LEARNER = "bench"
+
+
+def synthetic_progress(days: int, words: int, recordings: int = 3, seed: int = 1) -> Dict:
+    """days x words (per kind) x recordings, every word submitted; ids are drawn from 1..words*20."""
+    rnd = random.Random(seed)
+    start = date(2020, 1, 1)
+    data = {"schemaVersion": server.PROGRESS_SCHEMA_VERSION, "days": {}, "dayVersions": {}, "version": 0}
+    for n in range(days):
+        day_key = (start + timedelta(days=n)).isoformat()
+        day = server._empty_day()
+        for kind in ("task", "learn"):
+            branch = day[kind]
+            for w in rnd.sample(range(1, words * 20), words):
+                word_id = str(w)
+                branch["recordings"][word_id] = [
+                    {"url": f"assets/records/{word_id}_{day_key.replace('-', '')}_1200{i:02d}_abcdef.webm",
+                     "score": round(rnd.random(), 2), "ts": 1577836800000 + n * 86400000 + i, "transcript": ""}
+                    for i in range(recordings)]
+                branch["submittedWordIds"].append(word_id)
+                branch["submittedAtMap"][word_id] = 1577836800000 + n * 86400000
+        day["task"]["taskCompleted"] = True
+        data["days"][day_key] = day
+        data["version"] += 1
+        data["dayVersions"][day_key] = data["version"]
+    return data
+
+
+def _legacy_ensure_day(data: Dict, day_key: str) -> Dict:
+    d = data["days"][day_key]
+    d.setdefault("task", {})
+    d.setdefault("learn", {})
+    d["task"].setdefault("recordings", {})
+    d["task"].setdefault("submittedWordIds", [])
+    d["task"].setdefault("submittedAtMap", {})
+    d["task"].setdefault("taskCompleted", False)
+    d["task"].setdefault("taskAvgScore", 0)
+    d["learn"].setdefault("recordings", {})
+    d["learn"].setdefault("submittedWordIds", [])
+    d["learn"].setdefault("submittedAtMap", {})
+    return d
+
+
+def legacy_load(path: str):
+    """The loader before schemaVersion: scan and normalize every day on every load."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        data = {"days": {}}
+    return data, legacy_normalize(data)
+
+
+def legacy_normalize(data: Dict) -> bool:
+    if not isinstance(data.get("days"), dict):
+        data["days"] = {}
+    if not isinstance(data.get("dayVersions"), dict):
+        data["dayVersions"] = {}
+    data["version"] = int(data.get("version") or 0)
+    changed = server._migrate_legacy_days(data)
+    for day_key in list(data["days"].keys()):
+        if isinstance(data["days"][day_key], dict):
+            _legacy_ensure_day(data, day_key)
+    return changed
+
+
+def time_normalize(text: str, fn: Callable, rounds: int = 5) -> float:
+    """Median time of fn(parsed document), excluding the JSON parse."""
+    times = []
+    for _ in range(rounds):
+        data = json.loads(text)
+        t0 = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - t0)
+    return percentile(times, 50)
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def measure(client, path: str, url: str, requests: int, touch: bool) -> List[float]:
+    out = []
+    for i in range(requests):
+        if touch:
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        out.append(time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.status_code
+    return out
+
+
+def run_mode(loader: Callable, client, path: str, url: str, requests: int) -> Dict[str, List[float]]:
+    server._load_progress_json = loader
+    store = server.learner_stores.get(LEARNER)
+    store.invalidate()
+    client.get(url)  # 预热：首次加载
+    return {"cached": measure(client, path, url, requests, touch=False),
+            "reload": measure(client, path, url, requests, touch=True)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Progress schema benchmark")
+    parser.add_argument("--days", type=int, default=1000, help="synthetic days")
+    parser.add_argument("--words", type=int, default=20, help="words per day and kind")
+    parser.add_argument("--requests", type=int, default=30, help="GET requests per measurement")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="ww-bench-"))
+    try:
+        server.learner_stores.root = str(tmp)
+        server.learner_stores.set_stat_interval(0)
+        path = Path(server.learner_stores.paths(LEARNER)["json"])
+        path.parent.mkdir(parents=True)
+        data = synthetic_progress(args.days, args.words)
+        text = json.dumps(data, ensure_ascii=False)
+        path.write_text(text, encoding="utf-8")
+        print(f"synthetic progress: {args.days} days, {len(text) / 1e6:.1f} MB")
+
+        before = time_normalize(text, legacy_normalize)
+        after = time_normalize(text, lambda d: d.get("schemaVersion") == server.PROGRESS_SCHEMA_VERSION)
+        print(f"normalization per load (excluding json parse): {before * 1000:.2f} ms -> {after * 1000:.3f} ms")
+        legacy = json.loads(text)
+        legacy.pop("schemaVersion")
+        t0 = time.perf_counter()
+        server.migrate_progress(legacy)
+        print(f"one-time migration (schemaVersion 0 -> {server.PROGRESS_SCHEMA_VERSION}, after json.load): "
+              f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        current_loader = server._load_progress_json
+        client = server.app.test_client()
+        url = f"/api/progress/2020-01-01?learner={LEARNER}"
+        results = {"before": run_mode(legacy_load, client, str(path), url, args.requests),
+                   "after": run_mode(current_loader, client, str(path), url, args.requests)}
+        server._load_progress_json = current_loader
+
+        print(f"{'GET /api/progress/<day>':<28}{'p50 ms':>10}{'p95 ms':>10}")
+        for case in ("cached", "reload"):
+            for mode in ("before", "after"):
+                values = results[mode][case]
+                print(f"{mode + ' / ' + case:<28}{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}")
+        before = percentile(results["before"]["reload"], 50)
+        after = percentile(results["after"]["reload"], 50)
+        print(f"reload p50: {before * 1000:.1f} ms -> {after * 1000:.1f} ms (json parse is shared by both modes)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""Benchmark / load test for the progress and upload endpoints at several history sizes.
+
+Usage:
+  cd <project root>
+  python tools/bench_server.py                                   # default sizes, 8 clients
+  python tools/bench_server.py --sizes 30x10x3,1000x20x3 --concurrency 16 --requests 400
+  python tools/bench_server.py --workers 4 --persist sqlite --out bench-sqlite.json
+  python tools/bench_server.py --compare bench-old.json           # print deltas against an earlier run
+
+Behavior:
+- For every size DAYSxWORDSxRECORDINGS a synthetic progress.json is generated (see
+  bench_progress_schema.synthetic_progress) and server.py is started on it in a temp directory
+  with --rate-limit 0, so real data/ and assets/ are never touched.
+- Scenarios, each --requests requests from --concurrency client threads after a short warm-up:
+    get_progress       GET  /api/progress/<random day>
+    get_all_progress   GET  /api/progress
+    post_recording     POST /api/progress/recording
+    post_submit_word   POST /api/progress/submit-word
+    post_complete_task POST /api/progress/complete-task
+    upload_recording   POST /api/recordings (multipart, payloads are the checked-in assets/records/*.webm)
+- Reports throughput, p50/p95/p99 latency and bytes written per request. Bytes come from
+  /proc/<pid>/io of the server and its worker processes: "written" is what the server handed to
+  write() (wchar), "disk" what reached the block layer (write_bytes, often 0 in containers).
+  Both are null where /proc is unavailable.
+- Results are saved as JSON (--out, default bench-results-<timestamp>.json) together with the
+  git revision and parameters; --compare prints the change in throughput and p50/p95 per case.
+
+Notes:
+- No third-party dependencies required (uses urllib).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+TOOLS = Path(__file__).resolve().parent
+ROOT = TOOLS.parent
+sys.path.insert(0, str(TOOLS))
+
+from bench_progress_schema import synthetic_progress  # noqa: E402
+from stress_progress import free_port, percentile, wait_ready  # noqa: E402
+
+SCENARIOS = ["get_progress", "get_all_progress", "post_recording", "post_submit_word",
+             "post_complete_task", "upload_recording"]
+
+
+def parse_size(text: str) -> Tuple[int, int, int]:
+    parts = [int(x) for x in text.lower().split("x")]
+    if len(parts) == 2:
+        parts.append(3)
+    if len(parts) != 3 or min(parts) <= 0:
+        raise argparse.ArgumentTypeError(f"size must be DAYSxWORDS[xRECORDINGS]: {text}")
+    return parts[0], parts[1], parts[2]
+
+
+def process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    for p in pids:
+        for task in Path(f"/proc/{p}/task").glob("*"):
+            try:
+                pids.extend(int(c) for c in (task / "children").read_text().split())
+            except OSError:
+                pass
+    return pids
+
+
+def io_counters(pid: Optional[int]) -> Optional[Dict[str, int]]:
+    """Summed wchar / write_bytes of the server process tree; None without /proc."""
+    if pid is None:
+        return None
+    total = {"wchar": 0, "write_bytes": 0}
+    try:
+        for p in process_tree(pid):
+            for line in Path(f"/proc/{p}/io").read_text().splitlines():
+                key, _, value = line.partition(":")
+                if key in total:
+                    total[key] += int(value)
+    except OSError:
+        return None
+    return total
+
+
+def request(method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict] = None,
+            timeout: float = 60.0) -> int:
+    req = urllib.request.Request(url, data=body, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def multipart(field: str, filename: str, payload: bytes, fields: Dict[str, str]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    chunks = []
+    for key, value in fields.items():
+        chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    chunks.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                  f"Content-Type: audio/webm\r\n\r\n".encode())
+    chunks.append(payload)
+    chunks.append(f"\r\n--{boundary}--\r\n".encode())
+    return b"".join(chunks), f"multipart/form-data; boundary={boundary}"
+
+
+class Workload:
+    """Builds one request per call for a scenario; ids stay within the synthetic history."""
+
+    def __init__(self, base: str, days: List[str], words: int, samples: List[Path]):
+        self.base = base
+        self.days = days
+        self.words = words
+        self.samples = [(p.name, p.read_bytes()) for p in samples]
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _next(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def _post_json(self, path: str, payload: Dict) -> int:
+        return request("POST", self.base + path, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+
+    def call(self, scenario: str, rnd: random.Random) -> int:
+        day = rnd.choice(self.days)
+        word_id = str(rnd.randint(1, self.words * 20))
+        n = self._next()
+        if scenario == "get_progress":
+            return request("GET", f"{self.base}/api/progress/{day}")
+        if scenario == "get_all_progress":
+            return request("GET", f"{self.base}/api/progress")
+        if scenario == "post_recording":
+            return self._post_json("/api/progress/recording", {
+                "day": day, "kind": rnd.choice(["task", "learn"]), "wordId": word_id,
+                "url": f"assets/records/bench_{n}.webm", "score": round(rnd.random(), 2), "ts": n})
+        if scenario == "post_submit_word":
+            return self._post_json("/api/progress/submit-word", {"day": day, "wordId": f"{word_id}-{n}"})
+        if scenario == "post_complete_task":
+            return self._post_json("/api/progress/complete-task", {"day": day, "taskAvgScore": round(rnd.random(), 2)})
+        if scenario == "upload_recording":
+            name, payload = rnd.choice(self.samples)
+            body, ctype = multipart("audio", name, payload, {"word": "bench"})
+            return request("POST", f"{self.base}/api/recordings", body, {"Content-Type": ctype})
+        raise ValueError(scenario)
+
+
+def run_scenario(work: Workload, scenario: str, requests: int, concurrency: int,
+                 server_pid: Optional[int], warmup: int) -> Dict:
+    rnd = random.Random(7)
+    for _ in range(warmup):
+        work.call(scenario, rnd)
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    gate = threading.Event()
+
+    def client(n: int) -> None:
+        nonlocal errors
+        local = random.Random(n)
+        gate.wait()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            t0 = time.perf_counter()
+            try:
+                status = work.call(scenario, local)
+            except Exception:
+                status = -1
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    io_before = io_counters(server_pid)
+    t0 = time.perf_counter()
+    gate.set()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    io_after = io_counters(server_pid)
+
+    def per_request(key: str) -> Optional[float]:
+        if io_before is None or io_after is None:
+            return None
+        return round((io_after[key] - io_before[key]) / max(1, len(latencies)), 1)
+
+    return {
+        "scenario": scenario, "requests": len(latencies), "errors": errors, "seconds": round(seconds, 3),
+        "throughput": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "latencyMs": {f"p{p}": round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)}
+        | {"max": round(max(latencies, default=0) * 1000, 2)},
+        "bytesWrittenPerRequest": per_request("wchar"),
+        "diskBytesPerRequest": per_request("write_bytes"),
+    }
+
+
+def bench_size(size: Tuple[int, int, int], args, samples: List[Path]) -> List[Dict]:
+    days, words, recs = size
+    tmp = Path(tempfile.mkdtemp(prefix="ww-bench-"))
+    proc = None
+    try:
+        shutil.copy2(ROOT / "server.py", tmp / "server.py")
+        (tmp / "data").mkdir()
+        data = synthetic_progress(days, words, recs)
+        text = json.dumps(data, ensure_ascii=False)
+        (tmp / "data" / "progress.json").write_text(text, encoding="utf-8")
+        port = free_port()
+        cmd = [sys.executable, "server.py", "--port", str(port), "--workers", str(args.workers),
+               "--persist", args.persist, "--rate-limit", "0", "--audio-workers", str(args.audio_workers)]
+        if args.persist == "sqlite":
+            subprocess.run([sys.executable, "server.py", "--migrate-sqlite"], cwd=tmp, check=True,
+                           stdout=subprocess.DEVNULL)
+        proc = subprocess.Popen(cmd, cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base = f"http://127.0.0.1:{port}"
+        wait_ready(base, proc, timeout=120)
+        work = Workload(base, sorted(data["days"]), words, samples)
+        label = f"{days}x{words}x{recs}"
+        print(f"== {label}: progress.json {len(text) / 1e6:.1f} MB, workers {args.workers}, persist {args.persist}")
+        results = []
+        for scenario in args.scenarios:
+            if scenario == "upload_recording" and not samples:
+                print("  upload_recording: skipped (no assets/records/*.webm)")
+                continue
+            requests = args.requests
+            if scenario == "get_all_progress":
+                requests = max(args.concurrency, requests // args.full_divisor)
+            r = run_scenario(work, scenario, requests, args.concurrency, proc.pid, args.warmup)
+            r.update({"size": label, "days": days, "words": words, "recordings": recs,
+                      "progressBytes": len(text.encode("utf-8"))})
+            results.append(r)
+            lat = r["latencyMs"]
+            written = "n/a" if r["bytesWrittenPerRequest"] is None else f"{r['bytesWrittenPerRequest']:.0f} B"
+            print(f"  {scenario:<20}{r['throughput']:>9.1f} req/s  p50 {lat['p50']:>8.2f}  p95 {lat['p95']:>8.2f}"
+                  f"  p99 {lat['p99']:>8.2f} ms  written/req {written:>10}  errors {r['errors']}")
+        return results
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def compare(old_path: Path, results: List[Dict]) -> None:
+    old = {(r["size"], r["scenario"]): r for r in json.loads(old_path.read_text(encoding="utf-8"))["results"]}
+    print(f"== compared with {old_path}")
+    for r in results:
+        prev = old.get((r["size"], r["scenario"]))
+        if not prev:
+            continue
+
+        def delta(new: float, before: float) -> str:
+            return f"{(new / before - 1) * 100:+.0f}%" if before else "n/a"
+        print(f"  {r['size']:<12}{r['scenario']:<20}throughput {delta(r['throughput'], prev['throughput']):>6}"
+              f"  p50 {delta(r['latencyMs']['p50'], prev['latencyMs']['p50']):>6}"
+              f"  p95 {delta(r['latencyMs']['p95'], prev['latencyMs']['p95']):>6}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Progress / upload endpoint benchmark")
+    parser.add_argument("--sizes", default="30x10x3,365x20x3,1000x20x3",
+                        help="comma separated DAYSxWORDS[xRECORDINGS] history sizes")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--full-divisor", type=int, default=10,
+                        help="get_all_progress sends --requests / N requests (it returns the whole history)")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before each scenario")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--persist", default="snapshot", choices=["snapshot", "journal", "sqlite"])
+    parser.add_argument("--audio-workers", type=int, default=0, help="server audio workers (needs ffmpeg)")
+    parser.add_argument("--out", type=Path, help="result JSON (default bench-results-<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier result JSON to compare against")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s]
+
+    samples = sorted((ROOT / "assets" / "records").rglob("*.webm"))
+    results: List[Dict] = []
+    for size in sizes:
+        results.extend(bench_size(size, args, samples))
+
+    out = args.out or Path(f"bench-results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    meta = {"revision": git_revision(), "python": sys.version.split()[0], "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "workers": args.workers, "persist": args.persist, "concurrency": args.concurrency,
+            "requests": args.requests, "samples": len(samples)}
+    out.write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+    print(f"results written to {out}")
+    if args.compare:
+        compare(args.compare, results)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
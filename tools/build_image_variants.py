@@ -0,0 +1,38 @@
+"""Pre-generate resized WebP/JPEG variants for images in assets/words/.
+
+Usage (run each command separately on Windows PowerShell):
+  cd <project root>
+  python -m pip install Pillow
+  python tools/build_image_variants.py
+
+Behavior:
+- For every image in assets/words/, writes variants at the widths configured in
+  server.py (IMAGE_WIDTHS, never wider than the original) to data/image_cache/.
+- Variant names are "<content hash>-<width>.<format>", so unchanged images are skipped
+  and replaced images get new variants automatically.
+- The server (/api/images/<name>?w=) uses the same cache and generates missing
+  variants lazily on first request; running this tool just warms the cache.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from server import Image, image_variants  # noqa: E402
+
+
+def main() -> int:
+    if Image is None:
+        print("请先安装 Pillow：python -m pip install Pillow")
+        return 2
+    count = image_variants.build_all()
+    print(f"完成：共 {count} 个派生图（已存在的直接复用），目录 {image_variants.cache_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,26 +16,52 @@ Behavior:
   6) If still missing and cn exists -> try Unsplash Source by Chinese cn
 - Adds/updates column img_flag to mark how image was obtained (e.g. "新获取", "新获取(中文)").
 
+Concurrent mode (for large vocab lists):
+  python tools/download_images_and_update_csv.py --workers 8
+
+- Rows are processed by a thread pool; HTTP connections are kept alive and pooled per host.
+- Each host gets its own concurrency cap (--per-host) and request rate limit (--rate, req/s).
+- Timeouts, connection errors, 429 and 5xx responses are retried with exponential backoff (--retries).
+- Source fallbacks for one row are tried --fallback-parallel at a time; the highest-priority
+  successful source wins, so results match the sequential order above.
+- Source endpoints can be pointed at a local stand-in server with --wiki-base / --unsplash-base.
+
+Incremental re-runs:
+- A manifest (data/image_manifest.json, --manifest) records, per row, the source URL,
+  ETag/Last-Modified, content hash and local path, plus Wikimedia summary lookups.
+- Rows whose local image still exists are skipped without any network access; words.csv is only
+  rewritten when a row actually changed.
+- --refresh re-validates recorded sources with conditional GETs (If-None-Match / If-Modified-Since).
+- Images are stored once per content hash: a byte-identical download reuses the existing file,
+  and a name clash with different content becomes <name>-<hash8>.<ext> instead of -1/-2.
+- --dedup points rows at the canonical copy of byte-identical files and removes the duplicates.
+
 Notes:
-- No third-party dependencies required (uses urllib).
+- No third-party dependencies required (uses urllib / http.client).
 - Creates assets/words/ if it does not exist.
 """
 
 from __future__ import annotations
 
+import argparse
 import csv
+import hashlib
+import http.client
 import io
 import json
 import mimetypes
 import os
 import re
 import sys
+import threading
 import time
+import urllib.error
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 
 USER_AGENT = (
@@ -44,6 +70,14 @@ USER_AGENT = (
     "Chrome/124.0.0.0 Safari/537.36"
 )
 
+# Source endpoints; overridable from the command line (e.g. to point at a local test server)
+WIKI_SUMMARY_BASE = "https://{lang}.wikipedia.org/api/rest_v1/page/summary/"
+UNSPLASH_SOURCE_BASE = "https://source.unsplash.com/600x400/"
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+MANIFEST_VERSION = 1
+
 
 @dataclass
 class DownloadResult:
@@ -53,6 +87,17 @@ class DownloadResult:
     origin: str = ""
 
 
+@dataclass
+class Fetched:
+    url: str
+    etag: str = ""
+    last_modified: str = ""
+    content_type: str = ""
+    body: bytes = b""
+    # Set when the server answered 304 and the recorded local copy is still on disk
+    path: str = ""
+
+
 def project_paths() -> Tuple[Path, Path, Path]:
     script_path = Path(__file__).resolve()
     root = script_path.parent.parent
@@ -100,160 +145,535 @@ def ensure_ext_from_mime(url: str, content_type: str | None) -> str:
     return guessed or ".jpg"
 
 
-def unique_file_path(directory: Path, base: str, ext: str) -> Path:
-    i = 0
-    while True:
-        name = f"{base}{'' if i == 0 else f'-{i}'}{ext}"
-        p = directory / name
-        if not p.exists():
-            return p
-        i += 1
-
-
-def urlopen_bytes(url: str, timeout: float = 15.0) -> Tuple[bytes, str]:
-    req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        data = resp.read()
-        ctype = resp.headers.get("Content-Type", "")
-        return data, ctype
-
-
-def save_bytes(fp: Path, data: bytes) -> None: 
-    fp.parent.mkdir(parents=True, exist_ok=True)
-    with fp.open("wb") as f:
-        f.write(data)
-
-
-def fetch_wikimedia_thumb(term: str, lang: str) -> str:
+def build_unsplash_source(term: str) -> str:
+    if not term:
+        return ""
+    return f"{UNSPLASH_SOURCE_BASE}?{urllib.parse.quote(term)}"
+
+
+class UrllibClient:
+    """Sequential GET client on plain urllib; same interface as PooledHttpClient."""
+
+    def __init__(self, timeout: float = 15.0) -> None:
+        self.timeout = timeout
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, **(headers or {})})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, {k.lower(): v for k, v in resp.headers.items()}, resp.read()
+        except urllib.error.HTTPError as e:
+            # 304 and error statuses arrive as HTTPError
+            return e.code, {k.lower(): v for k, v in (e.headers or {}).items()}, b""
+
+    def close(self) -> None:
+        pass
+
+
+class HostPool:
+    """Keep-alive connections to one host, with a concurrency cap and a request rate limit."""
+
+    def __init__(self, scheme: str, netloc: str, max_conns: int, rate: float, timeout: float) -> None:
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._slots = threading.BoundedSemaphore(max_conns)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def _wait_rate(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.netloc, timeout=self.timeout)
+
+    def get(self, path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        with self._slots:
+            self._wait_rate()
+            conn = self._connect()
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except Exception:
+                conn.close()
+                raise
+            resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+            if resp.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+            return resp.status, resp_headers, body
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle.clear()
+
+
+class PooledHttpClient:
+    """Thread-safe GET client: per-host pools, redirects, retry with exponential backoff."""
+
+    def __init__(self, per_host: int = 4, rate: float = 0.0, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 15.0) -> None:
+        self.per_host = per_host
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._pools: Dict[Tuple[str, str], HostPool] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, scheme: str, netloc: str) -> HostPool:
+        key = (scheme, netloc)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = HostPool(scheme, netloc, self.per_host, self.rate, self.timeout)
+                self._pools[key] = pool
+            return pool
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            max_redirects: int = 5) -> Tuple[int, Dict[str, str], bytes]:
+        headers = {"User-Agent": USER_AGENT, **(headers or {})}
+        attempt = 0
+        redirects = 0
+        while True:
+            parts = urllib.parse.urlsplit(url)
+            path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            try:
+                status, resp_headers, body = self._pool(parts.scheme, parts.netloc).get(path, headers)
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries:
+                    raise
+                status, resp_headers, body = -1, {}, b""
+            if status in (301, 302, 303, 307, 308) and resp_headers.get("location"):
+                redirects += 1
+                if redirects > max_redirects:
+                    return status, resp_headers, body
+                url = urllib.parse.urljoin(url, resp_headers["location"])
+                continue
+            if (status == -1 or status in RETRY_STATUSES) and attempt < self.retries:
+                delay = self.backoff * (2 ** attempt)
+                retry_after = resp_headers.get("retry-after", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                attempt += 1
+                time.sleep(delay)
+                continue
+            return status, resp_headers, body
+
+    def close(self) -> None:
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+
+
+class Manifest:
+    """Persistent state for incremental runs; all methods are thread-safe.
+
+    - rows:    row key -> {en, cn, origin, source, etag, lastModified, sha256, path}
+    - sources: source URL -> {etag, lastModified, sha256, path}
+    - wiki:    "<lang>:<term>" -> thumbnail URL ("" = no thumbnail)
+    - files:   file name in assets_dir -> {size, mtime_ns, sha256}
+    """
+
+    def __init__(self, path: Path, assets_dir: Path) -> None:
+        self.path = path
+        self.assets_dir = assets_dir
+        self.root = assets_dir.parent.parent
+        self.rows: Dict[str, Dict[str, str]] = {}
+        self.sources: Dict[str, Dict[str, str]] = {}
+        self.wiki: Dict[str, str] = {}
+        self.files: Dict[str, Dict] = {}
+        self.blobs: Dict[str, str] = {}  # sha256 -> canonical relative path
+        self._lock = threading.RLock()
+
+    def load(self) -> "Manifest":
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if data.get("version") == MANIFEST_VERSION:
+            self.rows = data.get("rows") or {}
+            self.sources = data.get("sources") or {}
+            self.wiki = data.get("wiki") or {}
+            self.files = data.get("files") or {}
+        return self
+
+    def save(self) -> None:
+        with self._lock:
+            text = json.dumps({
+                "version": MANIFEST_VERSION,
+                "rows": self.rows,
+                "sources": self.sources,
+                "wiki": self.wiki,
+                "files": self.files,
+            }, ensure_ascii=False, indent=1, sort_keys=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def rel_path(name: str) -> str:
+        return (Path("assets") / "words" / name).as_posix()
+
+    def exists(self, rel: str) -> bool:
+        return bool(rel) and (self.root / rel).is_file()
+
+    def scan(self) -> None:
+        """Hash files in assets_dir; unchanged files (same size and mtime) reuse the recorded hash."""
+        files: Dict[str, Dict] = {}
+        for fp in sorted(self.assets_dir.iterdir()) if self.assets_dir.is_dir() else []:
+            if not fp.is_file() or fp.name.startswith(".") or fp.name.endswith(".tmp"):
+                continue
+            st = fp.stat()
+            known = self.files.get(fp.name)
+            if known and known.get("size") == st.st_size and known.get("mtime_ns") == st.st_mtime_ns:
+                files[fp.name] = known
+            else:
+                files[fp.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                  "sha256": hashlib.sha256(fp.read_bytes()).hexdigest()}
+        with self._lock:
+            self.files = files
+            self.blobs = {}
+            # Shortest name wins, so apple.jpg is canonical over apple-1.jpg
+            for name in sorted(files, key=lambda n: (len(n), n)):
+                self.blobs.setdefault(files[name]["sha256"], self.rel_path(name))
+
+    def sha_of(self, rel: str) -> str:
+        with self._lock:
+            return (self.files.get(Path(rel).name) or {}).get("sha256", "")
+
+    def canonical(self, rel: str) -> str:
+        with self._lock:
+            return self.blobs.get(self.sha_of(rel), rel)
+
+    def store(self, base: str, ext: str, data: bytes) -> Tuple[str, str]:
+        """Store data once by content hash; returns (sha256, relative path)."""
+        sha = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            rel = self.blobs.get(sha)
+            if rel and self.exists(rel):
+                return sha, rel
+            name = f"{base}{ext}"
+            if (self.assets_dir / name).exists():
+                name = f"{base}-{sha[:8]}{ext}"
+            fp = self.assets_dir / name
+            fp.parent.mkdir(parents=True, exist_ok=True)
+            tmp = fp.with_name(fp.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, fp)
+            st = fp.stat()
+            self.files[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+            rel = self.rel_path(name)
+            self.blobs[sha] = rel
+            return sha, rel
+
+    def source(self, url: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            rec = self.sources.get(url)
+        return rec if rec and self.exists(rec.get("path", "")) else None
+
+    def commit(self, base: str, got: Fetched) -> str:
+        """Persist a fetched image (or reuse the 304 copy) and record its source; returns the path."""
+        if got.path:
+            with self._lock:
+                rec = self.sources[got.url]
+                # Servers may rotate validators on 304
+                if got.etag:
+                    rec["etag"] = got.etag
+                if got.last_modified:
+                    rec["lastModified"] = got.last_modified
+                return rec["path"]
+        sha, rel = self.store(base, ensure_ext_from_mime(got.url, got.content_type), got.body)
+        with self._lock:
+            self.sources[got.url] = {"etag": got.etag, "lastModified": got.last_modified,
+                                     "sha256": sha, "path": rel}
+        return rel
+
+    def row(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            return self.rows.get(key)
+
+    def record_row(self, key: str, row: Dict[str, str], origin: str, url: str, rel: str) -> None:
+        with self._lock:
+            rec = self.sources.get(url) or {}
+            self.rows[key] = {
+                "en": (row.get("en") or "").strip(),
+                "cn": (row.get("cn") or "").strip(),
+                "origin": origin,
+                "source": url,
+                "etag": rec.get("etag", ""),
+                "lastModified": rec.get("lastModified", ""),
+                "sha256": rec.get("sha256", ""),
+                "path": rel,
+            }
+
+    def wiki_get(self, lang: str, term: str) -> Optional[str]:
+        with self._lock:
+            return self.wiki.get(f"{lang}:{term}")
+
+    def wiki_put(self, lang: str, term: str, thumb: str) -> None:
+        with self._lock:
+            self.wiki[f"{lang}:{term}"] = thumb
+
+
+def row_key(row: Dict[str, str]) -> str:
+    rid = (row.get("id") or "").strip()
+    return f"id:{rid}" if rid else f"en:{(row.get('en') or '').strip().lower()}"
+
+
+def lookup_wikimedia_thumb(client, manifest: Manifest, term: str, lang: str) -> str:
+    """Wikimedia summary thumbnail for term; definitive answers (200/404) are memoized in the manifest."""
     if not term:
         return ""
-    base = f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/"
-    url = base + urllib.parse.quote(term)
+    cached = manifest.wiki_get(lang, term)
+    if cached is not None:
+        return cached
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.load(io.TextIOWrapper(resp, encoding="utf-8"))
-        thumb = (data or {}).get("thumbnail", {}).get("source")
-        return thumb or ""
+        status, _, body = client.get(WIKI_SUMMARY_BASE.format(lang=lang) + urllib.parse.quote(term))
     except Exception:
         return ""
-
-
-def build_unsplash_source(term: str) -> str:
-    if not term:
+    if status == 404:
+        manifest.wiki_put(lang, term, "")
+        return ""
+    if status != 200:
         return ""
-    return f"https://source.unsplash.com/600x400/?{urllib.parse.quote(term)}"
+    try:
+        thumb = (json.loads(body.decode("utf-8")) or {}).get("thumbnail", {}).get("source") or ""
+    except ValueError:
+        return ""
+    manifest.wiki_put(lang, term, thumb)
+    return thumb
 
 
-def try_download_to_assets(
-    url: str, assets_dir: Path, base_name: str
-) -> Tuple[bool, str]:
+def fetch_image(client, manifest: Manifest, url: str) -> Optional[Fetched]:
+    """GET an image; conditional when the URL was fetched before and its local copy still exists."""
     if not url:
-        return False, ""
+        return None
+    known = manifest.source(url)
+    headers: Dict[str, str] = {}
+    if known and known.get("etag"):
+        headers["If-None-Match"] = known["etag"]
+    if known and known.get("lastModified"):
+        headers["If-Modified-Since"] = known["lastModified"]
     try:
-        data, ctype = urlopen_bytes(url)
-        ext = ensure_ext_from_mime(url, ctype)
-        fp = unique_file_path(assets_dir, base_name, ext)
-        save_bytes(fp, data)
-        rel = Path("assets") / "words" / fp.name
-        # Use forward slashes in CSV
-        return True, rel.as_posix()
+        status, resp_headers, body = client.get(url, headers)
     except Exception:
-        return False, ""
-
-
-def process_row(row: Dict[str, str], assets_dir: Path) -> DownloadResult:
+        return None
+    if status == 304 and known:
+        return Fetched(url, resp_headers.get("etag", ""), resp_headers.get("last-modified", ""),
+                       path=known["path"])
+    if status != 200 or not body:
+        return None
+    return Fetched(url, resp_headers.get("etag", ""), resp_headers.get("last-modified", ""),
+                   resp_headers.get("content-type", ""), body)
+
+
+def process_row(
+    row: Dict[str, str],
+    assets_dir: Path,
+    client,
+    manifest: Manifest,
+    refresh: bool = False,
+    fallback_pool: Optional[ThreadPoolExecutor] = None,
+    fallback_parallel: int = 1,
+) -> DownloadResult:
+    """Resolve an image for one row in the priority order above.
+
+    With a fallback_pool, sources are fetched fallback_parallel at a time; the highest-priority
+    success still wins. Nothing is written to disk until a source is chosen.
+    """
     english = (row.get("en") or "").strip()
     chinese = (row.get("cn") or "").strip()
     img = (row.get("img") or "").strip()
     base_name = normalize_name(english or chinese or row.get("id") or "word")
+    key = row_key(row)
 
     # Case 1: already local and exists
     if img and not img.lower().startswith("http") and img.replace("\\", "/").startswith("assets/words/"):
         local_path = Path(assets_dir.parent.parent) / img  # root/assets/words/..
         if local_path.exists():
+            entry = manifest.row(key)
+            if refresh and entry and entry.get("path") == img and entry.get("source"):
+                got = fetch_image(client, manifest, entry["source"])
+                if got:
+                    rel = manifest.commit(base_name, got)
+                    manifest.record_row(key, row, entry.get("origin", ""), got.url, rel)
+                    if rel != img:
+                        return DownloadResult(True, "refreshed", rel, origin=entry.get("origin", ""))
             return DownloadResult(True, "already_local", img, origin="local")
 
-    # Case 2: CSV remote url provided
+    # Cases 2-6: (origin, fetch) in priority order
+    attempts: List[Tuple[str, Callable[[], Optional[Fetched]]]] = []
     if img and img.lower().startswith("http"):
-        ok, rel = try_download_to_assets(img, assets_dir, base_name)
-        if ok:
-            return DownloadResult(True, "downloaded_from_csv", rel, origin="csv")
-
-    # Case 3: Wikimedia EN
-    wiki_en = fetch_wikimedia_thumb(english, "en")
-    if wiki_en:
-        ok, rel = try_download_to_assets(wiki_en, assets_dir, base_name)
-        if ok:
-            return DownloadResult(True, "downloaded_wikimedia_en", rel, origin="wikimedia_en")
-
-    # Case 4: Wikimedia ZH by Chinese name
-    wiki_zh = fetch_wikimedia_thumb(chinese, "zh") if chinese else ""
-    if wiki_zh:
-        ok, rel = try_download_to_assets(wiki_zh, assets_dir, base_name)
-        if ok:
-            return DownloadResult(True, "downloaded_wikimedia_zh", rel, origin="wikimedia_zh")
-
-    # Case 5: Unsplash EN
-    uns_en = build_unsplash_source(english)
-    if uns_en:
-        ok, rel = try_download_to_assets(uns_en, assets_dir, base_name)
-        if ok:
-            return DownloadResult(True, "downloaded_unsplash_en", rel, origin="unsplash_en")
-
-    # Case 6: Unsplash ZH
-    uns_zh = build_unsplash_source(chinese)
-    if uns_zh:
-        ok, rel = try_download_to_assets(uns_zh, assets_dir, base_name)
-        if ok:
-            return DownloadResult(True, "downloaded_unsplash_zh", rel, origin="unsplash_zh")
-
+        attempts.append(("csv", lambda: fetch_image(client, manifest, img)))
+    attempts.append(("wikimedia_en", lambda: fetch_image(
+        client, manifest, lookup_wikimedia_thumb(client, manifest, english, "en"))))
+    if chinese:
+        attempts.append(("wikimedia_zh", lambda: fetch_image(
+            client, manifest, lookup_wikimedia_thumb(client, manifest, chinese, "zh"))))
+    if english:
+        attempts.append(("unsplash_en", lambda: fetch_image(client, manifest, build_unsplash_source(english))))
+    if chinese:
+        attempts.append(("unsplash_zh", lambda: fetch_image(client, manifest, build_unsplash_source(chinese))))
+
+    step = max(1, fallback_parallel) if fallback_pool else 1
+    for i in range(0, len(attempts), step):
+        wave = attempts[i:i + step]
+        if fallback_pool and len(wave) > 1:
+            futures = [(origin, fallback_pool.submit(fetch)) for origin, fetch in wave]
+            results = [(origin, fut.result()) for origin, fut in futures]
+        else:
+            results = [(origin, fetch()) for origin, fetch in wave]
+        for origin, got in results:
+            if not got:
+                continue
+            rel = manifest.commit(base_name, got)
+            manifest.record_row(key, row, origin, got.url, rel)
+            reason = "downloaded_from_csv" if origin == "csv" else f"downloaded_{origin}"
+            return DownloadResult(True, reason, rel, origin=origin)
     return DownloadResult(False, "no_image_source")
 
 
-def main() -> int:
+def dedup_rows(rows: List[Dict[str, str]], manifest: Manifest) -> Tuple[int, List[Path]]:
+    """Point rows at the canonical copy of byte-identical images; returns (rows changed, removed files)."""
+    changed = 0
+    for row in rows:
+        img = (row.get("img") or "").strip()
+        if img.startswith("assets/words/"):
+            canon = manifest.canonical(img)
+            if canon != img:
+                row["img"] = canon
+                changed += 1
+    referenced = {Path((r.get("img") or "")).name for r in rows}
+    removed: List[Path] = []
+    for name, info in list(manifest.files.items()):
+        rel = manifest.rel_path(name)
+        if name in referenced or manifest.blobs.get(info["sha256"]) == rel:
+            continue
+        fp = manifest.assets_dir / name
+        fp.unlink(missing_ok=True)
+        del manifest.files[name]
+        removed.append(fp)
+    return changed, removed
+
+
+def apply_result(row: Dict[str, str], result: DownloadResult) -> str:
+    """Write result into the row; returns "updated" / "skipped" / "failed"."""
+    if result.ok:
+        row["img"] = result.local_rel_path
+        # Flag: 新获取 (+中文) | 本地已存在
+        if result.origin == "local":
+            row["img_flag"] = ""
+            return "skipped"
+        if result.origin.endswith("_zh"):
+            row["img_flag"] = "新获取(中文)"
+        elif result.origin == "csv":
+            row["img_flag"] = "新获取(原csv)"
+        else:
+            row["img_flag"] = "新获取"
+        return "updated"
+    # Keep as-is, mark empty flag to retry next time
+    row.setdefault("img", "")
+    row.setdefault("img_flag", "")
+    return "failed"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download word images and update data/words.csv")
+    parser.add_argument("--csv", type=Path, help="CSV path (default: data/words.csv)")
+    parser.add_argument("--assets-dir", type=Path, help="image directory (default: assets/words)")
+    parser.add_argument("--manifest", type=Path, help="incremental manifest (default: data/image_manifest.json)")
+    parser.add_argument("--refresh", action="store_true", help="re-validate recorded sources with conditional GETs")
+    parser.add_argument("--dedup", action="store_true", help="merge byte-identical images and remove duplicates")
+    parser.add_argument("--workers", type=int, default=1, help="rows processed in parallel (1 = sequential)")
+    parser.add_argument("--per-host", type=int, default=4, help="max concurrent connections per host")
+    parser.add_argument("--rate", type=float, default=5.0, help="max requests per second per host (0 = unlimited)")
+    parser.add_argument("--retries", type=int, default=3, help="retries for timeouts, 429 and 5xx")
+    parser.add_argument("--fallback-parallel", type=int, default=2, help="image sources tried at once per row")
+    parser.add_argument("--wiki-base", default=WIKI_SUMMARY_BASE, help="Wikipedia summary endpoint ({lang} placeholder)")
+    parser.add_argument("--unsplash-base", default=UNSPLASH_SOURCE_BASE, help="Unsplash source endpoint")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    global WIKI_SUMMARY_BASE, UNSPLASH_SOURCE_BASE
+    args = parse_args(argv)
+    WIKI_SUMMARY_BASE = args.wiki_base
+    UNSPLASH_SOURCE_BASE = args.unsplash_base
     root, csv_path, assets_dir = project_paths()
+    csv_path = args.csv or csv_path
+    assets_dir = args.assets_dir or assets_dir
+    manifest_path = args.manifest or (root / "data" / "image_manifest.json")
     if not csv_path.exists():
         print(f"CSV 不存在: {csv_path}")
         return 2
     assets_dir.mkdir(parents=True, exist_ok=True)
 
     fieldnames, rows = read_csv(csv_path)
-    if "img_flag" not in fieldnames:
+    header_changed = "img_flag" not in fieldnames
+    if header_changed:
         fieldnames = [*fieldnames, "img_flag"]
 
-    updated = 0
-    skipped = 0
-    failed = 0
+    manifest = Manifest(manifest_path, assets_dir).load()
+    manifest.scan()
+    before = [(r.get("img"), r.get("img_flag")) for r in rows]
+    counts = {"updated": 0, "skipped": 0, "failed": 0}
 
-    for row in rows:
-        result = process_row(row, assets_dir)
-        if result.ok:
-            row["img"] = result.local_rel_path
-            # Flag: 新获取 (+中文) | 本地已存在
-            if result.origin == "local":
-                row["img_flag"] = ""
-                skipped += 1
-            elif result.origin.endswith("_zh"):
-                row["img_flag"] = "新获取(中文)"
-                updated += 1
-            elif result.origin == "csv":
-                row["img_flag"] = "新获取(原csv)"
-                updated += 1
-            else:
-                row["img_flag"] = "新获取"
-                updated += 1
+    try:
+        if args.workers <= 1:
+            client = UrllibClient()
+            for row in rows:
+                counts[apply_result(row, process_row(row, assets_dir, client, manifest, args.refresh))] += 1
         else:
-            # Keep as-is, mark empty flag to retry next time
-            row.setdefault("img", "")
-            row.setdefault("img_flag", "")
-            failed += 1
-
-    write_csv(csv_path, fieldnames, rows)
+            client = PooledHttpClient(per_host=args.per_host, rate=args.rate, retries=args.retries)
+            fallback_parallel = max(1, args.fallback_parallel)
+            try:
+                with ThreadPoolExecutor(args.workers) as pool, \
+                        ThreadPoolExecutor(args.workers * fallback_parallel) as fallback_pool:
+                    results = list(pool.map(
+                        lambda r: process_row(r, assets_dir, client, manifest, args.refresh,
+                                              fallback_pool, fallback_parallel), rows))
+            finally:
+                client.close()
+            for row, result in zip(rows, results):
+                counts[apply_result(row, result)] += 1
+        if args.dedup:
+            merged, removed = dedup_rows(rows, manifest)
+            print(f"去重：{merged} 条改为指向同内容文件，删除重复文件 {len(removed)} 个。")
+    finally:
+        # Keep lookups and downloads from a partial run
+        manifest.save()
+    updated, skipped, failed = counts["updated"], counts["skipped"], counts["failed"]
+
+    after = [(r.get("img"), r.get("img_flag")) for r in rows]
+    if after != before or header_changed:
+        write_csv(csv_path, fieldnames, rows)
+        written = f"已写入: {csv_path}"
+    else:
+        written = f"无变化，未改写: {csv_path}"
 
     print(
         f"完成。更新 {updated} 条，保留本地 {skipped} 条，仍未获取 {failed} 条。\n"
-        f"已写入: {csv_path}"
+        f"{written}"
     )
     return 0
 
@@ -10,53 +10,140 @@ Effects:
 - For rows with empty pinyin and non-empty Chinese `cn`, fill pinyin with tone marks (e.g., píng guǒ)
 - If `--fill-sent` is provided, fill empty `sent`/`sent_cn` with simple templates
   (You can later refine them in CSV)
+
+Large vocab lists:
+- Rows are streamed: read one, write one, to a temp file that replaces the CSV at the end
+  (the CSV is left untouched when nothing changed). Use --csv / --out for other files.
+- Pinyin per `cn` phrase is memoized and persisted in data/pinyin_cache.json (--cache),
+  keyed to the installed pypinyin version.
+- Rows that already have valid pinyin (and sentences, with --fill-sent) pass through without
+  calling pypinyin.
+- `--jobs N` fans chunks of --chunk-size rows out to N worker processes; output order is kept
+  and only a few chunks are in flight at a time.
 """
 
 from __future__ import annotations
 
 import csv
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 try:
+    import pypinyin
     from pypinyin import pinyin, Style
 except Exception as e:
     raise SystemExit("请先安装 pypinyin：python -m pip install pypinyin")
 
 
+NEED_COLS = ["id", "en", "cn", "pinyin", "img", "sent", "sent_cn"]
+# 允许字母/空格/连字符/点号/带声调元音/ü
+PINYIN_RE = re.compile(r"[a-zA-Z\s\.\-āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜü]+")
+CACHE_VERSION = 1
+
+
 def project_paths() -> Tuple[Path, Path]:
     root = Path(__file__).resolve().parent.parent
     csv_path = root / "data" / "words.csv"
     return root, csv_path
 
 
-def read_csv(csv_file: Path) -> Tuple[List[str], List[Dict[str, str]]]:
-    with csv_file.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = [dict(r) for r in reader]
-        fieldnames = list(reader.fieldnames or [])
-    return fieldnames, rows
-
-
-def write_csv(csv_file: Path, fieldnames: List[str], rows: List[Dict[str, str]]) -> None:
-    with csv_file.open("w", encoding="utf-8", newline="\n") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-
-
-def fill_pinyin(text: str) -> str:
+def fill_pinyin(text: str, cache: Optional[Dict[str, str]] = None, misses: Optional[Dict[str, str]] = None) -> str:
+    # 按整个词组缓存：pypinyin 对多音字按词组判断读音，逐字缓存会读错
+    if cache is not None and text in cache:
+        return cache[text]
     items = pinyin(text, style=Style.TONE, strict=False)
-    return " ".join(s[0] for s in items if s and s[0])
+    result = " ".join(s[0] for s in items if s and s[0])
+    if cache is not None:
+        cache[text] = result
+    if misses is not None:
+        misses[text] = result
+    return result
+
 
 def is_likely_pinyin(text: str) -> bool:
     if not text:
         return False
-    s = str(text).strip()
-    # 允许字母/空格/连字符/点号/带声调元音/ü
-    import re
-    return bool(re.fullmatch(r"[a-zA-Z\s\.\-āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜü]+", s))
+    return bool(PINYIN_RE.fullmatch(str(text).strip()))
+
+
+def load_cache(path: Path) -> Dict[str, str]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION or data.get("pypinyin") != pypinyin.__version__:
+        return {}
+    return data.get("phrases") or {}
+
+
+def save_cache(path: Path, cache: Dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({
+        "version": CACHE_VERSION,
+        "pypinyin": pypinyin.__version__,
+        "phrases": cache,
+    }, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def fill_row(r: Dict[str, str], fill_sent: bool, cache: Dict[str, str], misses: Dict[str, str]) -> Tuple[int, int]:
+    """Fill one row in place; returns (pinyin fixed, sentences fixed)."""
+    cn = (r.get("cn") or "").strip()
+    fixed_py = 0
+    fixed_sent = 0
+    # 若拼音为空或不是拼音（包含中文等），则重算
+    if cn:
+        py = (r.get("pinyin") or "").strip()
+        if not py or not PINYIN_RE.fullmatch(py):
+            r["pinyin"] = fill_pinyin(cn, cache, misses)
+            fixed_py += 1
+    if fill_sent:
+        en = (r.get("en") or "").strip()
+        if not r.get("sent"):
+            r["sent"] = f"This is {en}." if en else "This is it."
+            fixed_sent += 1
+        if not r.get("sent_cn"):
+            r["sent_cn"] = f"这是{cn or '它'}。"
+            fixed_sent += 1
+    return fixed_py, fixed_sent
+
+
+# 子进程内的缓存：由 initializer 用主进程的快照填充
+_worker_cache: Dict[str, str] = {}
+
+
+def _init_worker(cache: Dict[str, str]) -> None:
+    global _worker_cache
+    _worker_cache = cache
+
+
+def fill_chunk(rows: List[Dict[str, str]], fill_sent: bool) -> Tuple[List[Dict[str, str]], Dict[str, str], int, int]:
+    """Worker entry: returns (rows, newly computed cache entries, pinyin fixed, sentences fixed)."""
+    misses: Dict[str, str] = {}
+    fixed_py = 0
+    fixed_sent = 0
+    for r in rows:
+        a, b = fill_row(r, fill_sent, _worker_cache, misses)
+        fixed_py += a
+        fixed_sent += b
+    return rows, misses, fixed_py, fixed_sent
+
+
+def chunked(rows: Iterator[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    chunk: List[Dict[str, str]] = []
+    for r in rows:
+        chunk.append(r)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 def main() -> int:
@@ -64,44 +151,80 @@ def main() -> int:
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--fill-sent", action="store_true", help="补全空缺的 sent/sent_cn")
+    parser.add_argument("--csv", type=Path, help="输入 CSV（默认 data/words.csv）")
+    parser.add_argument("--out", type=Path, help="输出 CSV（默认写回输入文件）")
+    parser.add_argument("--cache", type=Path, help="拼音缓存文件（默认 data/pinyin_cache.json）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写拼音缓存文件")
+    parser.add_argument("--jobs", type=int, default=1, help="并行进程数（默认 1，不开子进程）")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="每个子进程任务的行数")
     args = parser.parse_args()
 
     root, csv_path = project_paths()
+    csv_path = args.csv or csv_path
+    out_path = args.out or csv_path
+    cache_path = args.cache or (root / "data" / "pinyin_cache.json")
     if not csv_path.exists():
         print(f"CSV 不存在: {csv_path}")
         return 2
 
-    fieldnames, rows = read_csv(csv_path)
-    need_cols = ["id","en","cn","pinyin","img","sent","sent_cn"]
-    for c in need_cols:
-        if c not in fieldnames:
-            fieldnames.append(c)
-
+    cache = {} if args.no_cache else load_cache(cache_path)
+    cache_size = len(cache)
     fixed_py = 0
     fixed_sent = 0
+    changed = False
 
-    for r in rows:
-        cn = (r.get("cn") or "").strip()
-        py = (r.get("pinyin") or "").strip()
-        # 若拼音为空或不是拼音（包含中文等），则重算
-        if cn and (not py or not is_likely_pinyin(py)):
-            r["pinyin"] = fill_pinyin(cn)
-            fixed_py += 1
-        if args.fill_sent:
-            en = (r.get("en") or "").strip()
-            if not r.get("sent"):
-                r["sent"] = f"This is {en}." if en else "This is it."
-                fixed_sent += 1
-            if not r.get("sent_cn"):
-                r["sent_cn"] = f"这是{cn or '它'}。"
-                fixed_sent += 1
-
-    write_csv(csv_path, fieldnames, rows)
-    print(f"完成：拼音补全 {fixed_py} 条，短句/翻译补全 {fixed_sent} 条。已写回 {csv_path}")
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with csv_path.open("r", encoding="utf-8", newline="") as fin, \
+            tmp_path.open("w", encoding="utf-8", newline="") as fout:
+        reader = csv.DictReader(fin)
+        fieldnames = list(reader.fieldnames or [])
+        for c in NEED_COLS:
+            if c not in fieldnames:
+                fieldnames.append(c)
+                changed = True
+        writer = csv.DictWriter(fout, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+
+        if args.jobs <= 1:
+            misses: Dict[str, str] = {}
+            for r in reader:
+                a, b = fill_row(r, args.fill_sent, cache, misses)
+                fixed_py += a
+                fixed_sent += b
+                writer.writerow(r)
+        else:
+            # 最多同时挂起 jobs*2 个块，保持内存有界并按原顺序写出
+            with ProcessPoolExecutor(args.jobs, initializer=_init_worker, initargs=(dict(cache),)) as pool:
+                pending: deque = deque()
+                chunks = chunked(reader, max(1, args.chunk_size))
+
+                def drain_one() -> None:
+                    nonlocal fixed_py, fixed_sent
+                    rows, new_entries, a, b = pending.popleft().result()
+                    cache.update(new_entries)
+                    fixed_py += a
+                    fixed_sent += b
+                    writer.writerows(rows)
+
+                for chunk in chunks:
+                    pending.append(pool.submit(fill_chunk, chunk, args.fill_sent))
+                    if len(pending) >= args.jobs * 2:
+                        drain_one()
+                while pending:
+                    drain_one()
+
+    changed = changed or fixed_py > 0 or fixed_sent > 0 or out_path != csv_path
+    if changed:
+        os.replace(tmp_path, out_path)
+    else:
+        tmp_path.unlink()
+    if not args.no_cache and len(cache) != cache_size:
+        save_cache(cache_path, cache)
+
+    where = f"已写回 {out_path}" if changed else f"无变化，未改写 {out_path}"
+    print(f"完成：拼音补全 {fixed_py} 条，短句/翻译补全 {fixed_sent} 条。{where}")
     return 0
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
-
@@ -0,0 +1,326 @@
+"""Merge a vocabulary list (data/words_import.csv) into data/words.csv in one pass.
+
+Usage (run each command separately on Windows PowerShell):
+  cd <project root>
+  python tools/import_words.py --dry-run                 # count new / duplicate rows only
+  python tools/import_words.py                           # pinyin + images, then one write
+  python tools/import_words.py --import big_list.csv --image-workers 8 --fill-sent
+  python tools/import_words.py --no-images               # pinyin only; fetch images later
+
+Behavior:
+- The import file is a CSV with at least an `en` column (`cn`, `pinyin`, `img`, `sent`, `sent_cn`
+  are taken over when present); blank lines and rows without `en` are skipped.
+- Rows are deduplicated against words.csv and against earlier rows of the import file. Keys are
+  normalized `en` (NFKC, case-folded, single spaces) and `cn` (NFKC, no spaces). A row is a
+  duplicate when its `en` is already present with the same `cn`, or when either side has no `cn`.
+- New rows get ids max(existing id) + 1, +2, ... in import order.
+- Stages run as a pipeline: the reader feeds a pinyin worker (fill_pinyin_sentences: phrase
+  cache data/pinyin_cache.json, optional --fill-sent), which feeds a pool of image workers
+  (download_images_and_update_csv: pooled HTTP, retries, data/image_manifest.json). Rows
+  leave the pipeline in import order, with only a bounded number in flight.
+- words.csv is written once: existing rows are copied to a temp file while the dedup index is
+  built, new rows are appended as they come out of the pipeline, and the temp file replaces
+  words.csv at the end. Nothing is written when there is nothing new; re-running is a no-op.
+
+Notes:
+- The pinyin stage needs pypinyin (python -m pip install pypinyin); --no-pinyin skips it.
+- Image downloads use the same sources and flags as download_images_and_update_csv.py.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import queue
+import re
+import sys
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+TOOLS = Path(__file__).resolve().parent
+ROOT = TOOLS.parent
+sys.path.insert(0, str(TOOLS))
+
+import download_images_and_update_csv as images  # noqa: E402
+
+NEED_COLS = ["id", "en", "cn", "pinyin", "img", "sent", "sent_cn", "img_flag"]
+IMPORT_COLS = ["en", "cn", "pinyin", "img", "sent", "sent_cn"]
+_STOP = object()
+
+
+def norm_en(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+def norm_cn(text: str) -> str:
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or ""))
+
+
+class CatalogIndex:
+    """normalized en -> set of normalized cn ("" when a row has no cn)."""
+
+    def __init__(self) -> None:
+        self.by_en: Dict[str, Set[str]] = {}
+        self.max_id = 0
+
+    def add(self, en: str, cn: str) -> None:
+        self.by_en.setdefault(norm_en(en), set()).add(norm_cn(cn))
+
+    def contains(self, en: str, cn: str) -> bool:
+        seen = self.by_en.get(norm_en(en))
+        if seen is None:
+            return False
+        key = norm_cn(cn)
+        return not key or "" in seen or key in seen
+
+    def note_id(self, value: str) -> None:
+        try:
+            self.max_id = max(self.max_id, int(str(value).strip()))
+        except ValueError:
+            pass
+
+
+def copy_catalog(src: Path, writer_for: Callable[[List[str]], csv.DictWriter], index: CatalogIndex) -> int:
+    """Stream words.csv into the output while indexing it; returns the number of rows copied."""
+    count = 0
+    with src.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        writer = writer_for(list(reader.fieldnames or []))
+        for row in reader:
+            index.note_id(row.get("id") or "")
+            if (row.get("en") or "").strip():
+                index.add(row.get("en") or "", row.get("cn") or "")
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def read_import(path: Path, index: CatalogIndex, counts: Dict[str, int]) -> Iterator[Dict[str, str]]:
+    """Yield new rows (with ids) from the import file; duplicates only update counts."""
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for raw in reader:
+            row = {c: (raw.get(c) or "").strip() for c in IMPORT_COLS}
+            if not row["en"]:
+                continue
+            if index.contains(row["en"], row["cn"]):
+                counts["duplicates"] += 1
+                continue
+            index.add(row["en"], row["cn"])
+            index.max_id += 1
+            row["id"] = str(index.max_id)
+            row["img_flag"] = ""
+            counts["new"] += 1
+            yield row
+
+
+def pinyin_stage(fill_sent: bool, cache_path: Optional[Path]):
+    """Returns (fill(row), finish()) using fill_pinyin_sentences; imported lazily (needs pypinyin)."""
+    import fill_pinyin_sentences as fp
+
+    cache = fp.load_cache(cache_path) if cache_path else {}
+    size = len(cache)
+    misses: Dict[str, str] = {}
+
+    def fill(row: Dict[str, str]) -> None:
+        fp.fill_row(row, fill_sent, cache, misses)
+
+    def finish() -> None:
+        if cache_path and len(cache) != size:
+            fp.save_cache(cache_path, cache)
+    return fill, finish
+
+
+class Pipeline:
+    """reader -> pinyin worker thread -> image worker pool -> ordered writer.
+
+    The pinyin worker submits each row to the image pool and queues the future; the writer
+    takes futures in submission order, so output order matches the import file. Both queues are
+    bounded, which caps the rows in flight regardless of the import size.
+    """
+
+    def __init__(self, fill_pinyin: Optional[Callable], fetch_image: Optional[Callable],
+                 image_workers: int, depth: int) -> None:
+        self.fill_pinyin = fill_pinyin
+        self.fetch_image = fetch_image
+        self.pool = ThreadPoolExecutor(max(1, image_workers)) if fetch_image else None
+        self.to_pinyin: "queue.Queue" = queue.Queue(maxsize=depth)
+        self.to_writer: "queue.Queue" = queue.Queue(maxsize=depth)
+        self.error: Optional[BaseException] = None
+
+    def _image(self, row: Dict[str, str]) -> Dict[str, str]:
+        if self.fetch_image:
+            self.fetch_image(row)
+        return row
+
+    def _pinyin_worker(self) -> None:
+        try:
+            for row in iter(self.to_pinyin.get, _STOP):
+                if self.error is None and self.fill_pinyin:
+                    self.fill_pinyin(row)
+                if self.pool:
+                    self.to_writer.put(self.pool.submit(self._image, row))
+                else:
+                    done: Future = Future()
+                    done.set_result(row)
+                    self.to_writer.put(done)
+        except BaseException as e:  # surface in the main thread
+            self.error = e
+            # keep draining so the reader never blocks on a full queue
+            for _ in iter(self.to_pinyin.get, _STOP):
+                pass
+        finally:
+            self.to_writer.put(_STOP)
+
+    def run(self, rows: Iterator[Dict[str, str]], write: Callable[[Dict[str, str]], None]) -> None:
+        worker = threading.Thread(target=self._pinyin_worker, name="import-pinyin", daemon=True)
+        writer_error: List[BaseException] = []
+
+        def drain() -> None:
+            try:
+                for fut in iter(self.to_writer.get, _STOP):
+                    if not writer_error:
+                        try:
+                            write(fut.result())
+                        except BaseException as e:
+                            writer_error.append(e)
+                            self.error = self.error or e
+            except BaseException as e:
+                writer_error.append(e)
+
+        writer = threading.Thread(target=drain, name="import-writer", daemon=True)
+        worker.start()
+        writer.start()
+        try:
+            for row in rows:
+                if self.error is not None:
+                    break
+                self.to_pinyin.put(row)
+        finally:
+            self.to_pinyin.put(_STOP)
+            worker.join()
+            writer.join()
+            if self.pool:
+                self.pool.shutdown(wait=True)
+        if self.error is not None:
+            raise self.error
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import a vocabulary list into data/words.csv")
+    parser.add_argument("--import", dest="import_path", type=Path, help="导入文件（默认 data/words_import.csv）")
+    parser.add_argument("--csv", type=Path, help="目标词表（默认 data/words.csv）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计新增/重复行，不补全也不写入")
+    parser.add_argument("--no-pinyin", action="store_true", help="跳过拼音补全")
+    parser.add_argument("--fill-sent", action="store_true", help="同时补全空缺的 sent/sent_cn")
+    parser.add_argument("--pinyin-cache", type=Path, help="拼音缓存文件（默认 data/pinyin_cache.json）")
+    parser.add_argument("--no-images", action="store_true", help="跳过图片下载")
+    parser.add_argument("--image-workers", type=int, default=4, help="并行下载图片的行数")
+    parser.add_argument("--per-host", type=int, default=4, help="每个主机的最大并发连接数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每个主机每秒最多请求数（0 不限）")
+    parser.add_argument("--retries", type=int, default=3, help="超时、429、5xx 的重试次数")
+    parser.add_argument("--fallback-parallel", type=int, default=2, help="每行同时尝试的图片来源数")
+    parser.add_argument("--manifest", type=Path, help="图片增量记录（默认 data/image_manifest.json）")
+    parser.add_argument("--assets-dir", type=Path, help="图片目录（默认 assets/words）")
+    parser.add_argument("--wiki-base", default=images.WIKI_SUMMARY_BASE, help="Wikipedia summary 接口（含 {lang}）")
+    parser.add_argument("--unsplash-base", default=images.UNSPLASH_SOURCE_BASE, help="Unsplash source 接口")
+    parser.add_argument("--depth", type=int, default=64, help="流水线每段最多排队的行数")
+    args = parser.parse_args(argv)
+
+    csv_path = args.csv or ROOT / "data" / "words.csv"
+    import_path = args.import_path or ROOT / "data" / "words_import.csv"
+    if not csv_path.exists():
+        print(f"CSV 不存在: {csv_path}")
+        return 2
+    if not import_path.exists():
+        print(f"导入文件不存在: {import_path}")
+        return 2
+
+    counts = {"existing": 0, "new": 0, "duplicates": 0, "images": 0, "image_failed": 0}
+    index = CatalogIndex()
+    if args.dry_run:
+        with open(os.devnull, "w", encoding="utf-8", newline="") as sink:
+            counts["existing"] = copy_catalog(csv_path, lambda names: csv.DictWriter(sink, fieldnames=names), index)
+        first = index.max_id + 1
+        for _ in read_import(import_path, index, counts):
+            pass
+        ids = f"，id {first}-{index.max_id}" if counts["new"] else ""
+        print(f"词表已有 {counts['existing']} 条；导入文件新增 {counts['new']} 条{ids}，重复 {counts['duplicates']} 条（未写入）")
+        return 0
+
+    fill_pinyin = finish_pinyin = None
+    if not args.no_pinyin:
+        try:
+            fill_pinyin, finish_pinyin = pinyin_stage(args.fill_sent, args.pinyin_cache or ROOT / "data" / "pinyin_cache.json")
+        except SystemExit as e:
+            print(f"{e}（或加 --no-pinyin 跳过拼音补全）")
+            return 2
+
+    fetch_image = None
+    manifest = client = None
+    if not args.no_images:
+        images.WIKI_SUMMARY_BASE = args.wiki_base
+        images.UNSPLASH_SOURCE_BASE = args.unsplash_base
+        assets_dir = args.assets_dir or ROOT / "assets" / "words"
+        assets_dir.mkdir(parents=True, exist_ok=True)
+        manifest = images.Manifest(args.manifest or ROOT / "data" / "image_manifest.json", assets_dir).load()
+        manifest.scan()
+        client = images.PooledHttpClient(per_host=args.per_host, rate=args.rate, retries=args.retries)
+        fallback_parallel = max(1, args.fallback_parallel)
+        fallback_pool = ThreadPoolExecutor(max(1, args.image_workers) * fallback_parallel)
+        lock = threading.Lock()
+
+        def fetch_image(row: Dict[str, str]) -> None:
+            result = images.process_row(row, assets_dir, client, manifest, False, fallback_pool, fallback_parallel)
+            status = images.apply_result(row, result)
+            with lock:
+                counts["images" if status != "failed" else "image_failed"] += 1
+
+    tmp_path = csv_path.with_name(csv_path.name + ".tmp")
+    writer: Optional[csv.DictWriter] = None
+
+    def writer_for(fieldnames: List[str]) -> csv.DictWriter:
+        nonlocal writer
+        for c in NEED_COLS:
+            if c not in fieldnames:
+                fieldnames.append(c)
+        writer = csv.DictWriter(fout, fieldnames=fieldnames, restval="", extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        return writer
+
+    ok = False
+    try:
+        with tmp_path.open("w", encoding="utf-8", newline="") as fout:
+            counts["existing"] = copy_catalog(csv_path, writer_for, index)
+            pipeline = Pipeline(fill_pinyin, fetch_image, args.image_workers, max(1, args.depth))
+            pipeline.run(read_import(import_path, index, counts), writer.writerow)
+            fout.flush()
+            os.fsync(fout.fileno())
+        ok = True
+    finally:
+        if client is not None:
+            fallback_pool.shutdown(wait=True)
+            client.close()
+        if manifest is not None:
+            manifest.save()  # 保留已下载的图片记录，即使中途失败
+        if finish_pinyin:
+            finish_pinyin()
+        if not ok or not counts["new"]:
+            tmp_path.unlink(missing_ok=True)
+
+    if counts["new"]:
+        os.replace(tmp_path, csv_path)
+        where = f"已写入 {csv_path}（一次写入）"
+    else:
+        where = f"没有新词，未改写 {csv_path}"
+    image_note = "" if args.no_images else f"；图片获取 {counts['images']} 条，未获取 {counts['image_failed']} 条"
+    print(f"完成：新增 {counts['new']} 条，重复跳过 {counts['duplicates']} 条{image_note}。{where}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Move flat recordings in assets/records/ into dated shard directories (YYYY/MM/DD/).
+
+Usage (run each command separately on Windows PowerShell):
+  cd <project root>
+  python tools/migrate_records_layout.py --dry-run
+  python tools/migrate_records_layout.py
+  python tools/migrate_records_layout.py --persist sqlite
+
+Behavior:
+- Files named "<word>_<YYYYmmdd>_<HHMMSS>_<hex>.<ext>" move to assets/records/YYYY/MM/DD/;
+  files without a date in their name stay where they are.
+- Recording urls (url / rawUrl) in every learner's progress are then rewritten to the new
+  paths, in small batches through the same cross-process locks the server uses.
+- Safe to run while the server is up (snapshot / sqlite): old urls keep resolving to the moved
+  files, and running the server picks up rewritten progress on its next read.
+- Re-runnable: already-moved files and already-rewritten urls are skipped.
+- Journal mode has a single writer; stop the server and pass --offline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from server import PROGRESS_DB_FILE, learner_stores, migrate_records_layout  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Shard assets/records by date")
+    parser.add_argument("--persist", default="snapshot", choices=["snapshot", "journal", "sqlite"],
+                        help="与服务端一致的进度存储方式")
+    parser.add_argument("--db", default=PROGRESS_DB_FILE, help="sqlite 模式的数据库文件")
+    parser.add_argument("--batch", type=int, default=200, help="每批改写的录音条目数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不移动文件也不改写进度")
+    parser.add_argument("--offline", action="store_true", help="确认服务已停止（journal 模式必需）")
+    args = parser.parse_args()
+
+    if args.persist == "journal" and not args.offline and not args.dry_run:
+        print("journal 模式只允许一个写入进程：请先停止服务，再加 --offline 运行")
+        return 2
+    learner_stores.set_persist(args.persist, args.db)
+    stats = migrate_records_layout(apply=not args.dry_run, batch=args.batch)
+    verb = "将" if args.dry_run else "已"
+    print(f"{verb}移动 {stats['moved']} 个录音，{verb}改写 {stats['rewritten']} 组进度地址；"
+          f"重复副本 {stats['duplicates']}，冲突 {stats['conflicts']}（需人工处理），无日期保持平铺 {stats['flat']}")
+    return 1 if stats["conflicts"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
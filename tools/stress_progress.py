@@ -0,0 +1,200 @@
+"""Stress test: concurrent progress writes against a multi-process server must not lose updates.
+
+Usage:
+  cd <project root>
+  python tools/stress_progress.py                       # spawns server.py --workers 4 in a temp dir
+  python tools/stress_progress.py --workers 8 --persist sqlite --threads 32 --requests 50
+  python tools/stress_progress.py --url http://127.0.0.1:8080   # against a running server
+  python tools/stress_progress.py --learners 8                   # spread clients over 8 learners
+
+Behavior:
+- Each client thread sends --requests writes, alternating POST /api/progress/submit-word and
+  POST /api/progress/recording, every one with a unique word id / recording url, all on one day.
+- Afterwards GET /api/progress/<day> must contain every submitted word and every recording.
+- With --learners N, client n writes as learner "stress<n % N>" (?learner=), so writes land in
+  N separately locked progress shards instead of the default learner's single file.
+- Prints throughput and latency percentiles; exits with status 1 if any update is missing.
+
+Notes:
+- No third-party dependencies required (uses urllib).
+- Spawn mode copies only server.py into a temp directory, so real data/ is never touched.
+- With --url, writes go to a far-future day (default 2099-01-01) of the target server's data;
+  start that server with --rate-limit 0, otherwise the per-client limiter answers 429.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def post_json(url: str, payload: Dict, timeout: float = 30.0) -> Tuple[int, Dict]:
+    req = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return e.code, {}
+
+
+def get_json(url: str, timeout: float = 30.0) -> Dict:
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def wait_ready(base: str, proc: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"server exited early with status {proc.returncode}")
+        try:
+            get_json(f"{base}/api/progress?since=0", timeout=2)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise SystemExit("server did not become ready")
+
+
+def spawn_server(workers: int, persist: str) -> Tuple[str, subprocess.Popen, Path]:
+    root = Path(__file__).resolve().parent.parent
+    tmp = Path(tempfile.mkdtemp(prefix="ww-stress-"))
+    shutil.copy2(root / "server.py", tmp / "server.py")
+    (tmp / "data").mkdir()
+    port = free_port()
+    cmd = [sys.executable, "server.py", "--port", str(port), "--workers", str(workers),
+           "--persist", persist, "--audio-workers", "0", "--rate-limit", "0"]
+    proc = subprocess.Popen(cmd, cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return f"http://127.0.0.1:{port}", proc, tmp
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(base: str, day: str, threads: int, requests: int, learners: int = 0) -> int:
+    latencies: List[float] = []
+    errors: List[str] = []
+    expected_words: List[Tuple[str, str]] = []
+    expected_recordings: Dict[Tuple[str, str], str] = {}
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def learner_of(n: int) -> str:
+        return f"stress{n % learners}" if learners > 0 else "default"
+
+    def client(n: int) -> None:
+        learner = learner_of(n)
+        start_gate.wait()
+        for i in range(requests):
+            word_id = f"s{n}-{i}"
+            if i % 2 == 0:
+                path, payload = "/api/progress/submit-word", {"day": day, "kind": "task", "wordId": word_id}
+            else:
+                url = f"assets/records/stress-{n}-{i}.webm"
+                path, payload = "/api/progress/recording", {
+                    "day": day, "kind": "task", "wordId": word_id, "url": url, "score": 80, "ts": i + 1}
+            t0 = time.perf_counter()
+            try:
+                status, body = post_json(f"{base}{path}?learner={learner}", payload)
+            except Exception as e:
+                status, body = -1, {"error": repr(e)}
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if status != 200 or not body.get("ok"):
+                    errors.append(f"{path} {word_id}: {status} {body}")
+                elif i % 2 == 0:
+                    expected_words.append((learner, word_id))
+                else:
+                    expected_recordings[(learner, word_id)] = payload["url"]
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    t0 = time.perf_counter()
+    start_gate.set()
+    for t in workers:
+        t.join()
+    total = time.perf_counter() - t0
+
+    have_words = set()
+    recordings: Dict[Tuple[str, str], List[Dict]] = {}
+    for learner in sorted({learner_of(n) for n in range(threads)}):
+        day_data = get_json(f"{base}/api/progress/{day}?learner={learner}")["day"]["task"]
+        have_words.update((learner, w) for w in day_data.get("submittedWordIds") or [])
+        for w, recs in (day_data.get("recordings") or {}).items():
+            recordings[(learner, w)] = recs
+    lost_words = [w for w in expected_words if w not in have_words]
+    lost_recordings = [w for w, url in expected_recordings.items()
+                       if url not in [r.get("url") for r in recordings.get(w, [])]]
+
+    sent = threads * requests
+    print(f"requests: {sent} in {total:.2f}s ({sent / total:.0f} req/s), errors: {len(errors)}")
+    print("latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+        *(percentile(latencies, p) * 1000 for p in (50, 95, 99, 100))))
+    print(f"submit-word: {len(expected_words)} acked, {len(lost_words)} lost")
+    print(f"recording:   {len(expected_recordings)} acked, {len(lost_recordings)} lost")
+    for line in errors[:5]:
+        print("  error:", line)
+    for w in (lost_words + lost_recordings)[:5]:
+        print("  lost:", w)
+    return 1 if errors or lost_words or lost_recordings else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent progress write stress test")
+    parser.add_argument("--url", help="target a running server instead of spawning one")
+    parser.add_argument("--workers", type=int, default=4, help="server worker processes (spawn mode)")
+    parser.add_argument("--persist", default="snapshot", choices=["snapshot", "sqlite"], help="server backend (spawn mode)")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=25, help="writes per client thread")
+    parser.add_argument("--day", default="2099-01-01", help="day key used for all writes")
+    parser.add_argument("--learners", type=int, default=0, help="spread clients over N learners (0: default learner)")
+    parser.add_argument("--keep", action="store_true", help="keep the spawned server's temp dir")
+    args = parser.parse_args()
+
+    proc = None
+    tmp = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        base, proc, tmp = spawn_server(args.workers, args.persist)
+        print(f"spawned server.py --workers {args.workers} --persist {args.persist} in {tmp}")
+    try:
+        wait_ready(base, proc)
+        return run(base, args.day, args.threads, args.requests, args.learners)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if tmp is not None and not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())